@@ -1,12 +1,25 @@
 # IBKR_Connection.py
 
-import json, threading, time
+import asyncio, json, queue, threading, time
+from concurrent.futures import FIRST_COMPLETED, Future, wait as wait_futures
+from datetime import datetime
 from pathlib import Path
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 import pandas as pd
-from core.ibkr_dispatcher import IBKRDispatcher
+from core.ibkr_dispatcher import (REQUEST_TIMEOUT_CODE, STREAM_OVERFLOW_CODE, IBKRDispatcher, IBKRRequestError,
+                                  chain_future, recover_future)
+from core.contract_key import contract_key
+from core.pacing import HistoricalPacer, is_pacing_violation, is_small_bar
+from core.memo import SingleFlightCache
+from core.bar_cache import BarCache, duration_for, format_end_datetime, merge_bars, requested_window
+from core.bar_ring import BarRingBuffer, bar_time
+from core.quote_cache import QuoteCache
+from core.greeks_store import MODEL_COMPUTATION, GreeksStore
+from core.telemetry import RequestTelemetry, TelemetryDumper
+from core.connection_pool import BULK_KINDS, ConnectionPool
+from core.reconnect import DEFAULT_RECONNECT_DELAYS, ReconnectSupervisor
 from typing import Set, List
 
 # ✅ 全局配置文件路径
@@ -15,43 +28,109 @@ CONFIG_FILE = Path(__file__).parent / "config/config.json"
 # ✅ 模块级变量：连接实例和 Dispatcher（类型注解）
 _ib_connection: 'IBApi | None' = None
 _dispatcher: IBKRDispatcher = IBKRDispatcher()
+_greeks_store: GreeksStore = GreeksStore()
+
+# ✅ 不终止请求的提示类错误码
+_WARNING_CODES = {10090, 10167}
+# ✅ 连接级错误码：504 未连接 / 502 无法连接 TWS（socket 已不可用，需要重连）
+_SOCKET_LOST_CODES = {502, 504}
+# 1100 TWS 与 IB 服务器断开；1101 恢复但行情订阅已丢失（需要重新订阅）；1102 恢复且数据保留
+_CONNECTIVITY_LOST, _RESTORED_DATA_LOST, _RESTORED_DATA_KEPT = 1100, 1101, 1102
 
 # ✅ 核心 IB 接口类（继承 EClient + EWrapper）
 class IBApi(EWrapper, EClient):
-    def __init__(self):
+    def __init__(self, dispatcher: IBKRDispatcher = None):
         EClient.__init__(self, self)
         self.connected_event = threading.Event()
-        self.dispatcher = _dispatcher  # ✅ 注入全局 dispatcher
+        self.dispatcher = dispatcher or _dispatcher  # ✅ 注入 dispatcher（默认为全局 dispatcher，连接池的工作连接各有一个）
+        self.greeks = _greeks_store    # ✅ 注入全局期权 Greeks 存储
+        self.supervisor = None         # ✅ 启用自动重连时为 ReconnectSupervisor
     
     def nextValidId(self, orderId, *_):
         print(f"✅ IBKR连接成功 (Order ID: {orderId})")
         self.connected_event.set()
 
+    def error(self, reqId, errorCode, errorString, *args):
+        # 2100-2199 为连接状态/数据农场提示，10167/10090 为延迟或部分行情提示，均不终止请求
+        if 2100 <= errorCode < 2200 or errorCode in _WARNING_CODES:
+            print(f"ℹ️ IBKR 提示 {errorCode}: {errorString}")
+            return
+        if errorCode in (_CONNECTIVITY_LOST, _RESTORED_DATA_LOST, _RESTORED_DATA_KEPT):
+            print(f"⚠️ IBKR 连接状态 {errorCode}: {errorString}")
+            if errorCode == _RESTORED_DATA_LOST and self.supervisor is not None:
+                self.supervisor.restored(self)
+            return
+        print(f"❌ IBKR Error {errorCode} (reqId={reqId}): {errorString}")
+        supervised = self.supervisor is not None and errorCode in _SOCKET_LOST_CODES
+        if supervised:
+            self.supervisor.connection_lost(self, f"error {errorCode}")
+        # ✅ 请求级错误：立即结束对应请求，等待方不必空等到超时（可重发的请求留给重连后重发）
+        if reqId is not None and reqId > 0 and not (supervised and self.dispatcher.is_replayable(reqId)):
+            self.dispatcher.set_error(reqId, errorCode, errorString)
+
+    def connectionClosed(self):
+        # socket 断开（TWS 重启、网络中断）时由 reader 线程调用；主动断开前已停止 supervisor
+        if self.supervisor is not None:
+            self.supervisor.connection_lost(self, "connectionClosed")
+
     def tickPrice(self, reqId, tickType, price, attrib):
+        # ✅ 流式报价（QuoteCache）直接原地更新报价记录
+        if self.dispatcher.dispatch(reqId, "price", tickType, price):
+            return
+        if self.greeks.update_price(reqId, tickType, price):
+            return
         if tickType in (1, 2, 4) and price > 0:
             self.dispatcher.set_result(reqId, price)
             self.dispatcher.signal_done(reqId)
 
+    def tickSize(self, reqId, tickType, size):
+        self.dispatcher.dispatch(reqId, "size", tickType, size)
+
+    def tickOptionComputation(self, reqId, tickType, *args):
+        # ibapi 9.81+ 在 tickType 之后多一个 tickAttrib 参数，这里兼容新旧两种签名
+        if len(args) == 9:
+            args = args[1:]
+        impliedVol, delta, optPrice, pvDividend, gamma, vega, theta, undPrice = args
+        if self.greeks.update_computation(reqId, tickType, impliedVol, delta, optPrice, gamma, vega, theta, undPrice):
+            return
+        if tickType in MODEL_COMPUTATION:
+            self.dispatcher.set_result(reqId, [impliedVol, delta, gamma, vega, theta])
+            self.dispatcher.signal_done(reqId)
+
     def historicalData(self, reqId, bar):
-        self.dispatcher.set_result(reqId, {
+        data = {
             "date": bar.date,
             "open": bar.open,
             "high": bar.high,
             "low": bar.low,
             "close": bar.close,
             "volume": bar.volume
-        })
+        }
+        # ✅ 流式请求（注册了 handler）直接交给消费者，不在 dispatcher 中缓冲
+        if not self.dispatcher.dispatch(reqId, data):
+            self.dispatcher.set_result(reqId, data)
 
     def historicalDataEnd(self, reqId, *_):
         self.dispatcher.signal_done(reqId)
 
+    def historicalDataUpdate(self, reqId, bar):
+        # keepUpToDate 订阅的增量K线（最后一根未完成K线会被反复推送）
+        self.dispatcher.dispatch(reqId, {
+            "date": bar.date,
+            "open": bar.open,
+            "high": bar.high,
+            "low": bar.low,
+            "close": bar.close,
+            "volume": bar.volume
+        })
+
     def contractDetails(self, reqId, contractDetails):
         self.dispatcher.set_result(reqId, contractDetails)
 
     def contractDetailsEnd(self, reqId, *_):
         self.dispatcher.signal_done(reqId)
 
-    def securityDefinitionOptionalParameter(
+    def securityDefinitionOptionParameter(
         self,
         reqId: int,
         exchange: str,
@@ -71,7 +150,7 @@ class IBApi(EWrapper, EClient):
             "strikes": list(strikes)
         })
 
-    def securityDefinitionOptionalParameterEnd(self, reqId):
+    def securityDefinitionOptionParameterEnd(self, reqId):
         print(f"[Callback Fired] SecDefParams: ")
         self.dispatcher.signal_done(reqId)
 
@@ -89,105 +168,665 @@ def load_ibkr_config(mode="paper"):
 
     return host, port, client_id
 
+def _resolve_endpoint(mode="paper", host=None, port=None, client_id=None):
+    # host / port / client_id 不为 None 时覆盖配置文件（如连接本地 sim/tws_simulator.py）
+    if host is None or port is None or client_id is None:
+        cfg_host, cfg_port, cfg_client_id = load_ibkr_config(mode=mode)
+        host = cfg_host if host is None else host
+        port = cfg_port if port is None else port
+        client_id = cfg_client_id if client_id is None else client_id
+    return host, port, client_id
+
+def _open_connection(host, port, client_id, timeout=10, dispatcher: IBKRDispatcher = None) -> 'IBApi | None':
+    # 建立一个连接并启动它自己的 reader 线程；失败返回 None
+    ib = IBApi(dispatcher)
+    try:
+        ib.connect(host, port, client_id)
+        api_thread = threading.Thread(target=ib.run, name=f"ibkr-reader-{client_id}", daemon=True)
+        api_thread.start()
+        if not ib.connected_event.wait(timeout):
+            raise ConnectionError("IBKR连接超时")
+        print(f"✅ IBKR 已连接 ({host}:{port}, Client ID={client_id})")
+    except Exception as e:
+        print(f"❌ IBKR连接失败: {e}")
+        ib.disconnect()
+        return None
+    ib.dispatcher.connection = ib
+    supervisor = _supervisors.get(ib.dispatcher)
+    if supervisor is not None:
+        ib.supervisor = supervisor
+        supervisor.watch(ib)
+    return ib
+
 # ✅ 连接 IBKR（全局连接单例）
-def connect_ibkr(timeout=10, mode="paper"):
-    global _ib_connection
-    if _ib_connection is None or not _ib_connection.isConnected():
-        host, port, client_id = load_ibkr_config(mode=mode)
-        _ib_connection = IBApi()
-        try:
-            _ib_connection.connect(host, port, client_id)
-            api_thread = threading.Thread(target=_ib_connection.run, daemon=True)
-            api_thread.start()
-            if not _ib_connection.connected_event.wait(timeout):
-                raise ConnectionError("IBKR连接超时")
-            print(f"✅ IBKR 已连接 ({host}:{port}, Client ID={client_id})")
-        except Exception as e:
-            print(f"❌ IBKR连接失败: {e}")
-            _ib_connection.disconnect()
-            _ib_connection = None
+# host / port / client_id 不为 None 时覆盖配置文件（如连接本地 sim/tws_simulator.py）
+_connect_lock = threading.Lock()
+_primary_endpoint = None        # 主连接最近一次使用的 (host, port, client_id, timeout)，自动重连时沿用
+
+def connect_ibkr(timeout=10, mode="paper", host=None, port=None, client_id=None):
+    global _ib_connection, _primary_endpoint
+    if _ib_connection is not None and _ib_connection.isConnected():
+        return _ib_connection
+    with _connect_lock:
+        if _ib_connection is None or not _ib_connection.isConnected():
+            host, port, client_id = _resolve_endpoint(mode, host, port, client_id)
+            _primary_endpoint = (host, port, client_id, timeout)
+            _ib_connection = _open_connection(host, port, client_id, timeout)
     return _ib_connection
 
 def disconnect_ibkr():
     global _ib_connection
+    stop_auto_reconnect()
+    stop_connection_pool()
     if _ib_connection and _ib_connection.isConnected():
+        _quote_cache.close_all()
         _ib_connection.disconnect()
         _ib_connection = None
         print("🔌 IBKR连接已断开")
 
+# ✅ 多连接池：主连接（connect_ibkr 单例）专门处理实时行情 / 下单，
+# 历史回补、合约详情、期权链等批量请求轮询分配到 clientId 依次 +1 的工作连接上，
+# 每个工作连接有独立的 reader 线程、dispatcher 和互不重叠的 reqId 区间（统计汇总到同一个 telemetry）
+_WORKER_ID_STRIDE = 100_000_000
+_pool: 'ConnectionPool | None' = None
+_pool_dispatchers: List[IBKRDispatcher] = []
+
+def start_connection_pool(size: int = 2, timeout=10, mode="paper", host=None, port=None, client_id=None,
+                          bulk_kinds=BULK_KINDS) -> ConnectionPool:
+    """
+    启动 size 个连接（1 个主连接 + size-1 个工作连接），之后 get_ib(kind) 按请求类型路由。
+    工作连接的 clientId 为 client_id+1 ... client_id+size-1，断开后在下次被选中时自动重连。
+    """
+    global _pool, _pool_dispatchers
+    stop_connection_pool()
+    host, port, client_id = _resolve_endpoint(mode, host, port, client_id)
+    dispatchers = [None] + [
+        IBKRDispatcher(_dispatcher.telemetry, first_id=1001 + i * _WORKER_ID_STRIDE) for i in range(1, size)
+    ]
+
+    def connect(index: int):
+        if index == 0:
+            return connect_ibkr(timeout, mode, host, port, client_id)
+        return _open_connection(host, port, client_id + index, timeout, dispatchers[index])
+
+    pool = ConnectionPool(connect, size, bulk_kinds)
+    if _reconnect_delays is not None:
+        for index in range(1, size):
+            _supervise(dispatchers[index], lambda index=index: pool.connection(index))
+    for index in range(size):
+        pool.connection(index)
+    _pool, _pool_dispatchers = pool, dispatchers[1:]
+    return pool
+
+def stop_connection_pool():
+    """
+    断开全部工作连接；主连接保留（由 disconnect_ibkr 断开）。
+    """
+    global _pool, _pool_dispatchers
+    pool, _pool = _pool, None
+    if pool is None:
+        return
+    for dispatcher in _pool_dispatchers:
+        supervisor = _supervisors.pop(dispatcher, None)
+        if supervisor is not None:
+            supervisor.stop()
+    pool.close(include_primary=False)
+    for dispatcher in _pool_dispatchers:
+        dispatcher.detach_telemetry()
+    _pool_dispatchers = []
+
+def get_connection_pool() -> 'ConnectionPool | None':
+    return _pool
+
+def get_ib(kind: str = "other") -> 'IBApi | None':
+    """
+    返回处理 kind 类请求的连接：连接池启用时按类型路由，否则即 connect_ibkr() 单例。
+    """
+    pool = _pool
+    return pool.get(kind) if pool is not None else connect_ibkr()
+
+# ✅ 自动重连：每个连接（主连接和连接池的工作连接）一个 ReconnectSupervisor，按 dispatcher 对应。
+# connectionClosed / 504 / 502 触发后台重连（退避间隔见 core.reconnect），断线时不可重发的请求立即以错误结束；
+# 重连成功（或 TWS 提示 1101 数据丢失）后，在途请求、实时报价、Greeks 与 keepUpToDate K线订阅以新的 reqId 重新发送，
+# 调用方持有的 Future / reqId / 订阅对象不变。
+_supervisors: dict = {}          # IBKRDispatcher -> ReconnectSupervisor
+_reconnect_delays = None         # 启用自动重连时的退避间隔
+
+def _on_connection_lost(conn):
+    aborted = conn.dispatcher.abort_unreplayable()
+    if aborted:
+        print(f"⚠️ {aborted} 个无法重发的请求已结束")
+
+def _on_reconnected(conn):
+    replayed = conn.dispatcher.replay(conn)
+    print(f"🔁 已重发 {replayed} 个请求 / 订阅")
+
+def _reconnect_primary():
+    host, port, client_id, timeout = _primary_endpoint
+    return connect_ibkr(timeout, host=host, port=port, client_id=client_id)
+
+def _supervise(dispatcher: IBKRDispatcher, connect) -> ReconnectSupervisor:
+    supervisor = ReconnectSupervisor(connect, _on_connection_lost, _on_reconnected, _reconnect_delays)
+    _supervisors[dispatcher] = supervisor
+    conn = dispatcher.connection
+    if conn is not None and conn.isConnected():
+        conn.supervisor = supervisor
+        supervisor.watch(conn)
+    return supervisor
+
+def start_auto_reconnect(delays=DEFAULT_RECONNECT_DELAYS) -> ReconnectSupervisor:
+    """
+    为主连接（以及已启动的连接池工作连接）启用自动重连，返回主连接的 supervisor（stats 可查看重连次数与恢复耗时）。
+    需先调用 connect_ibkr 建立主连接；之后启动的连接池自动继承该设置。
+    """
+    global _reconnect_delays
+    if _primary_endpoint is None:
+        raise RuntimeError("❌ 请先调用 connect_ibkr 建立主连接")
+    stop_auto_reconnect()
+    _reconnect_delays = tuple(delays)
+    primary = _supervise(_dispatcher, _reconnect_primary)
+    pool = _pool
+    for index, dispatcher in enumerate(_pool_dispatchers, start=1):
+        _supervise(dispatcher, lambda index=index: pool.connection(index))
+    return primary
+
+def stop_auto_reconnect():
+    global _reconnect_delays
+    _reconnect_delays = None
+    supervisors = list(_supervisors.items())
+    _supervisors.clear()
+    for dispatcher, supervisor in supervisors:
+        supervisor.stop()
+        conn = dispatcher.connection
+        if conn is not None and conn.supervisor is supervisor:
+            conn.supervisor = None
+
+# ✅ 请求延迟 / 结局统计（按请求类型），可定期写出 JSON 与 Prometheus 文本供本地抓取程序读取
+# 连接池的工作连接共用同一份统计
+def get_request_telemetry() -> RequestTelemetry:
+    return _dispatcher.telemetry
+
+def start_telemetry_dump(interval: float = 15.0, **paths) -> TelemetryDumper:
+    """
+    启动后台线程，每 interval 秒写出一次统计（paths 可覆盖 json_path / prom_path），返回的 dumper 用 stop() 结束。
+    """
+    dumper = TelemetryDumper(_dispatcher.telemetry, interval, **paths)
+    dumper.start()
+    return dumper
+
+# ✅ 非阻塞请求的公共部分：注册 future → 发送请求；未连接时直接以 default 完成
+# kind 为请求类型（tick / historical / contractDetails / secDef），用于 dispatcher 的延迟与结局统计
+def _request_future(send, timeout, transform=None, default=None, cancel=None, raise_on_error=False,
+                    kind="other", cancel_on_timeout=None) -> Future:
+    ib = get_ib(kind)
+    if ib is None:
+        future = Future()
+        future.set_result(default)
+        return future
+
+    # send 同时作为重连后的重发函数；cancel 在完成或超时后取消服务端订阅（如 cancelMktData），
+    # cancel_on_timeout 只在超时时取消（如 cancelHistoricalData）
+    req_id = ib.dispatcher.next_id()
+    future = ib.dispatcher.submit(req_id, timeout=timeout, transform=transform, raise_on_error=raise_on_error,
+                                  kind=kind, resend=send, cancel=cancel, cancel_on_timeout=cancel_on_timeout)
+    send(ib, req_id)
+    return future
+
+def _bars_to_dataframe(bars) -> pd.DataFrame:
+    if not bars:
+        print("❌ 没有接收到历史数据")
+        return pd.DataFrame()
+
+    df = pd.DataFrame(bars)
+    df["date"] = pd.to_datetime(df["date"])
+    df.set_index("date", inplace=True)
+    return df
+
 # 获取实时价格（支持回调超时 & 合约验证）
 # 注意：
-# 为避免 IBKR 限制和连接管理问题，这里使用 snapshot=True 获取一次性价格快照。
-# 不建议使用 snapshot=False（流式实时数据），除非你明确管理 cancelMktData 调用。
-# 如果在非交易时间 snapshot 失败，建议使用 fallback 方法 get_last_close_price 代替。
-def get_ibkr_price(contract: Contract, timeout: int = 5) -> float:
-    ib = connect_ibkr()
-    if ib is None:
-        return -1
+# 默认通过 QuoteCache 使用长期流式订阅（snapshot=False）：首次取价打开行情线路，
+# 之后 tickPrice 持续原地更新报价记录，重复取价直接读内存，不再每次 reqMktData + cancelMktData。
+# 线路数量受 QuoteCache.max_lines 限制，超出时按 LRU 关闭空闲线路；disconnect_ibkr 会关闭全部线路。
+# 如果在非交易时间获取失败，会 fallback 至 get_last_close_price。
+def get_ibkr_price(contract: Contract, timeout: int = 5, max_age: float = None, stream: bool = True) -> float:
+    return get_ibkr_price_future(contract, timeout, max_age, stream).result()
 
+# ✅ 实时报价缓存（进程内共享）
+def _subscribe_quote(contract: Contract, record) -> int:
+    ib = get_ib("tick")
+    if ib is None:
+        raise ConnectionError("IBKR 未连接")
     req_id = ib.dispatcher.next_id()
-    ib.dispatcher.register(req_id)
+    send = lambda conn, wire_id: conn.reqMktData(wire_id, contract, "", False, False, [])
+    ib.dispatcher.register(req_id, handler=record.on_tick, use_event=False, kind="tick", resend=send)
+    # 流式订阅只会因 error 回调而结束：标记线路失效并唤醒等待方
+    ib.dispatcher.add_done_callback(req_id, lambda _: record.on_error(ib.dispatcher.error_of(req_id)))
+    send(ib, req_id)
+    return req_id
 
-    ib.reqMktData(req_id, contract, "", False, False, [])
-    price_list = ib.dispatcher.wait(req_id, timeout)
-    ib.cancelMktData(req_id)
-    ib.dispatcher.clear(req_id)
+def _unsubscribe_quote(record):
+    ib = _ib_connection
+    if ib is None or record.req_id is None:
+        return
+    wire_id = ib.dispatcher.wire_id(record.req_id)     # 重连重发后服务端使用的是新的 reqId
+    ib.dispatcher.clear(record.req_id)
+    if record.error is None and ib.isConnected():
+        ib.cancelMktData(wire_id)
 
-    if price_list:
-        return price_list[0]
-    elif not verify_contract_internal(contract):
-        print("❌ 合约不存在")
-        return -1
-    else:
-        print("⚠️ snapshot 获取失败，尝试 fallback 至历史数据")
-        return get_last_close_price(contract)
+_quote_cache = QuoteCache(_subscribe_quote, _unsubscribe_quote)
 
-def get_last_close_price(contract: Contract, timeout: int = 5) -> float:
+def get_quote_cache() -> QuoteCache:
+    return _quote_cache
+
+def get_ibkr_price_future(contract: Contract, timeout: int = 5, max_age: float = None,
+                          stream: bool = True) -> Future:
     """
-    用于在非交易时间或 snapshot 获取失败时模拟当前价格。
-    获取最近一根 1 分钟 K 线的 close 值作为替代价格。
+    get_ibkr_price 的非阻塞版本，返回 Future[float]。
+    - stream=True：从 QuoteCache 读取；报价已存在且不超过 max_age 秒（None 表示不限）时立即完成，
+      否则等待下一个价格 tick，超时则使用已有报价
+    - stream=False 或行情线路已满：一次性 snapshot 请求，首个 tick 到达即完成
+    失败时依次串联合约验证和历史收盘价 fallback（均为非阻塞请求）。
     """
-    ib = connect_ibkr()
+    if not stream:
+        return chain_future(_snapshot_price_future(contract, timeout), lambda p: _price_or_fallback(contract, p, timeout))
+
+    ib = get_ib("tick")
+    try:
+        record = _quote_cache.acquire(contract_key(contract), contract) if ib is not None else None
+    except ConnectionError:
+        ib = None       # 取得连接后又断开：与未连接相同
     if ib is None:
-        return -1
+        future = Future()
+        future.set_result(-1)
+        return future
+    if record is None:
+        return get_ibkr_price_future(contract, timeout, stream=False)
 
-    req_id = ib.dispatcher.next_id()
-    ib.dispatcher.register(req_id)
+    since = record.updated
+    price = record.price()
+    if price == price and (max_age is None or record.age() <= max_age):
+        _quote_cache.release(record)
+        future = Future()
+        future.set_result(price)
+        return future
 
-    ib.reqHistoricalData(
-        reqId=req_id,
-        contract=contract,
-        endDateTime='',
-        durationStr='1 D', # 必须用1D级别才能返回数据
-        barSizeSetting='1 min',
-        whatToShow='MIDPOINT',  #也可以改为 "TRADES"
-        useRTH=0,
-        formatDate=1,
-        keepUpToDate=False,
-        chartOptions=[]
+    # 借用一个不发往 TWS 的 reqId，复用 dispatcher 的超时机制等待下一个 tick（不计入请求统计）
+    wait_id = ib.dispatcher.next_id()
+    waiter = ib.dispatcher.submit(wait_id, timeout=timeout, transform=lambda _: record.price(), kind=None)
+    waiter.add_done_callback(lambda _: _quote_cache.release(record))
+    record.add_waiter(lambda: ib.dispatcher.signal_done(wait_id), since)
+    return chain_future(waiter, lambda p: _price_or_fallback(contract, p, timeout))
+
+def _snapshot_price_future(contract: Contract, timeout: int) -> Future:
+    return _request_future(
+        send=lambda ib, req_id: ib.reqMktData(req_id, contract, "", False, False, []),
+        timeout=timeout,
+        transform=lambda price_list: price_list[0] if price_list else float("nan"),
+        default=-1,
+        cancel=lambda ib, req_id: ib.cancelMktData(req_id),
+        kind="tick",
     )
 
-    bars = ib.dispatcher.wait(req_id, timeout)
-    ib.dispatcher.clear(req_id)
+def _price_or_fallback(contract: Contract, price: float, timeout: int):
+    if price == price:      # 非 NaN（包括未连接时的 -1）
+        return price
 
-    if bars:
-        df = pd.DataFrame(bars)
-        df["date"] = pd.to_datetime(df["date"])
-        df.set_index("date", inplace=True)
-        return df["close"].iloc[-1]  # ✅ 返回最近一根K线的收盘价
-    else:
+    def on_verified(exists):
+        if not exists:
+            print("❌ 合约不存在")
+            return -1
+        print("⚠️ 实时报价获取失败，尝试 fallback 至历史数据")
+        return get_last_close_price_future(contract, timeout)
+
+    return chain_future(verify_contract_future(contract, timeout), on_verified)
+
+def get_ibkr_prices(contracts: List[Contract], timeout: int = 5, max_age: float = None,
+                    stream: bool = True) -> List[float]:
+    """
+    批量取价：一次性发出所有请求，返回与 contracts 对齐的价格列表。
+    相同合约只请求一次；个别合约的合约验证 / 历史收盘价 fallback 也同时进行，
+    N 个报价的总耗时约为一次往返，而不是 N 次。
+    整批共用一个 timeout 秒的截止时间（包括 fallback），最多阻塞 timeout 秒；
+    截止时仍未得到价格的合约以及失败的合约价格为 -1。
+    """
+    futures = {}
+    for contract in contracts:
+        key = contract_key(contract)
+        if key not in futures:
+            futures[key] = get_ibkr_price_future(contract, timeout, max_age, stream)
+
+    _, not_done = wait_futures(futures.values(), timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    if not_done:
+        print(f"⚠️ {len(not_done)} 个合约在截止时间内未获取到价格")
+
+    def price_of(future):
+        if future.cancelled() or future.exception() is not None:
+            return -1
+        return future.result()
+
+    return [price_of(futures[contract_key(contract)]) for contract in contracts]
+
+async def get_ibkr_price_async(contract: Contract, timeout: int = 5) -> float:
+    return await asyncio.wrap_future(get_ibkr_price_future(contract, timeout))
+
+def get_last_close_price(contract: Contract, timeout: int = 5) -> float:
+    """
+    用于在非交易时间或 snapshot 获取失败时模拟当前价格。
+    获取最近一根 1 分钟 K 线的 close 值作为替代价格。
+    """
+    return get_last_close_price_future(contract, timeout).result()
+
+def get_last_close_price_future(contract: Contract, timeout: int = 5) -> Future:
+    def on_bars(bars):
+        if bars:
+            return bars[-1]["close"]  # ✅ 返回最近一根K线的收盘价
         print("❌ 无法通过历史数据获取当前价格")
         return -1
 
+    return _request_future(
+        send=lambda ib, req_id: ib.reqHistoricalData(
+            reqId=req_id,
+            contract=contract,
+            endDateTime='',
+            durationStr='1 D', # 必须用1D级别才能返回数据
+            barSizeSetting='1 min',
+            whatToShow='MIDPOINT',  #也可以改为 "TRADES"
+            useRTH=0,
+            formatDate=1,
+            keepUpToDate=False,
+            chartOptions=[]
+        ),
+        timeout=timeout,
+        transform=on_bars,
+        default=-1,
+        kind="historical",
+    )
+
 
 # ✅ 获取历史数据（动态 reqId，返回 DataFrame）
-def fetch_historical_data(contract: Contract, end_datetime: str, duration: str, bar_size: str, what_to_show="TRADES") -> pd.DataFrame:
-    ib = connect_ibkr()
-    if ib is None:
+# use_cache=True 时先查本地K线缓存，只向 TWS 请求缺失的时间段
+def fetch_historical_data(contract: Contract, end_datetime: str, duration: str, bar_size: str, what_to_show="TRADES",
+                          use_cache: bool = False) -> pd.DataFrame:
+    if use_cache:
+        return _fetch_historical_cached(contract, end_datetime, duration, bar_size, what_to_show)
+    return fetch_historical_data_future(contract, end_datetime, duration, bar_size, what_to_show).result()
+
+_bar_cache: 'BarCache | None' = None
+
+def get_bar_cache() -> BarCache:
+    global _bar_cache
+    if _bar_cache is None:
+        _bar_cache = BarCache()
+    return _bar_cache
+
+def _is_no_data(error: IBKRRequestError, contract: Contract) -> bool:
+    """
+    错误是否为确定的空结果（可以把空结果写入K线缓存）：
+    - 162 "HMDS query returned no data"：缺口内本来就没有K线（周末、节假日）；
+    - 200 "No security definition" 且合约设置了 includeExpired：连同已到期合约一起查询仍不存在，
+      说明合约（如网格中不存在的执行价）确实不存在，重复回测不必再访问 TWS。
+    """
+    if error.error_code == 162:
+        return "returned no data" in error.error_string
+    return error.error_code == 200 and bool(getattr(contract, "includeExpired", False))
+
+# ✅ 其余的 200 可能只是合约字段不全（如过期期权缺 includeExpired），
+# 不写入持久化缓存，只在内存中短期记住（与 SingleFlightCache 的 negative_ttl 相同），避免同一轮回测反复请求
+_NO_DEFINITION_TTL = 300
+_no_definition = {}             # 缓存键 -> 过期时间（monotonic）
+_no_definition_lock = threading.Lock()
+
+def _remember_no_definition(error: IBKRRequestError, cache_key: tuple) -> bool:
+    if error.error_code != 200:
+        return False
+    with _no_definition_lock:
+        _no_definition[cache_key] = time.monotonic() + _NO_DEFINITION_TTL
+    return True
+
+def _known_no_definition(cache_key: tuple) -> bool:
+    with _no_definition_lock:
+        expires = _no_definition.get(cache_key)
+        if expires is not None and expires <= time.monotonic():
+            del _no_definition[cache_key]
+            expires = None
+    return expires is not None
+
+def _store_window(cache: BarCache, key: tuple, entry, fresh: list, start, end) -> pd.DataFrame:
+    """
+    把新拉取的 [start, end] 数据合并进缓存条目并写回；与原覆盖区间不相交时直接替换。
+    覆盖区间的结束时间不超过当前时间：请求未来的时间点（如今天 23:59:59）时，之后产生的K线仍会被补上。
+    """
+    end = max(start, min(end, datetime.now()))
+    if entry is None or end < entry[1] or start > entry[2]:
+        base, cov_start, cov_end = None, start, end
+    else:
+        base, cov_start, cov_end = entry[0], min(start, entry[1]), max(end, entry[2])
+    merged = merge_bars(base, fresh)
+    cache.store(key, merged, cov_start, cov_end)
+    return merged
+
+def _fetch_historical_cached(contract: Contract, end_datetime: str, duration: str, bar_size: str,
+                             what_to_show: str) -> pd.DataFrame:
+    cache = get_bar_cache()
+    key = cache.make_key(contract, bar_size, what_to_show, use_rth=1)
+    start, end = requested_window(end_datetime, duration)
+
+    with cache.lock(key):
+        entry = cache.load(key)
+        gaps = cache.missing_ranges(entry, start, end)
+        if not gaps:
+            merged = entry[0]
+        elif _known_no_definition(key):
+            merged = entry[0] if entry else None
+        elif get_ib("historical") is None:
+            merged = entry[0] if entry else None   # 离线时仅返回已缓存部分，不更新覆盖区间
+        else:
+            futures = [
+                fetch_historical_data_future(
+                    contract,
+                    "" if not end_datetime and gap_end == end else format_end_datetime(gap_end),
+                    duration_for(gap_start, gap_end, bar_size),
+                    bar_size,
+                    what_to_show,
+                    raise_on_error=True,
+                )
+                for gap_start, gap_end in gaps
+            ]
+            fresh, complete = [], True
+            for future in futures:
+                try:
+                    fresh.append(future.result())
+                except IBKRRequestError as e:
+                    if _is_no_data(e, contract):
+                        continue
+                    _remember_no_definition(e, key)
+                    complete = False
+
+            if entry is None or len(gaps) == 1 and gaps[0] == (start, end):
+                entry = None
+            if complete:
+                merged = _store_window(cache, key, entry, fresh, start, end)
+            else:
+                merged = merge_bars(entry[0] if entry else None, fresh)
+
+    if merged is None or merged.empty:
+        print("❌ 没有接收到历史数据")
         return pd.DataFrame()
+    return merged[(merged.index >= start) & (merged.index <= end)]
+
+def fetch_historical_data_future(contract: Contract, end_datetime: str, duration: str, bar_size: str,
+                                 what_to_show="TRADES", timeout: int = 15, raise_on_error=False) -> Future:
+    """
+    fetch_historical_data 的非阻塞版本，historicalDataEnd 到达时以 DataFrame 完成。
+    """
+    return _request_future(
+        send=lambda ib, req_id: ib.reqHistoricalData(
+            reqId=req_id,
+            contract=contract,
+            endDateTime=end_datetime,
+            durationStr=duration,
+            barSizeSetting=bar_size,
+            whatToShow=what_to_show,
+            useRTH=1,
+            formatDate=1,
+            keepUpToDate=False,
+            chartOptions=[]
+        ),
+        timeout=timeout,
+        transform=_bars_to_dataframe,
+        default=pd.DataFrame(),
+        raise_on_error=raise_on_error,
+        kind="historical",
+        # 超时的请求在 TWS 侧仍计入历史数据并发限制：先取消，HistoricalPacer 再释放名额
+        cancel_on_timeout=lambda ib, req_id: ib.cancelHistoricalData(req_id),
+    )
+
+async def fetch_historical_data_async(contract: Contract, end_datetime: str, duration: str, bar_size: str,
+                                      what_to_show="TRADES", timeout: int = 15) -> pd.DataFrame:
+    return await asyncio.wrap_future(
+        fetch_historical_data_future(contract, end_datetime, duration, bar_size, what_to_show, timeout)
+    )
+
+# ✅ 批量并发获取历史数据（遵守 IBKR 历史数据限速规则）
+_historical_pacer = HistoricalPacer()
+
+def fetch_historical_many(contracts: List[Contract], end_datetime: str = "", duration: str = "30 D",
+                          bar_size: str = "1 day", what_to_show="TRADES", timeout: int = 60,
+                          max_retries: int = 3, pacer: HistoricalPacer = None,
+                          use_cache: bool = False) -> List[pd.DataFrame]:
+    """
+    并发拉取一组合约的历史数据，返回与 contracts 顺序一致的 DataFrame 列表（失败为空 DataFrame）。
+
+    - 由 HistoricalPacer 控制发送节奏：同时在途请求数、相同请求 15 秒间隔、
+      同一合约 2 秒内请求数、小周期K线 10 分钟 60 个请求、API 消息速率；
+    - 收到限速违规（error 162 pacing violation）时全局冷却并自动重试，最多 max_retries 次；
+    - 完全相同的合约只请求一次，结果共享；
+    - use_cache=True 时先查本地K线缓存，完全覆盖的合约不发请求（全部命中时不会连接 TWS），
+      拉取结果（包括确定的空结果：区间内没有K线，或带 includeExpired 的合约不存在）写回缓存；
+      其它 200 只在内存中记住 5 分钟。
+    """
+    pacer = pacer or _historical_pacer
+    small_bar = is_small_bar(bar_size)
+    results = [pd.DataFrame() for _ in contracts]
+
+    # 相同合约合并为一个请求
+    groups = {}
+    for idx, contract in enumerate(contracts):
+        groups.setdefault(contract_key(contract), []).append(idx)
+
+    cache, entries = (get_bar_cache(), {}) if use_cache else (None, None)
+    if cache is not None:
+        start, end = requested_window(end_datetime, duration)
+        for key in list(groups):
+            cache_key = cache.make_key(contracts[groups[key][0]], bar_size, what_to_show, use_rth=1)
+            entry = cache.load(cache_key)
+            if _known_no_definition(cache_key):
+                df = pd.DataFrame()
+            elif cache.missing_ranges(entry, start, end):
+                entries[key] = (cache_key, entry)
+                continue
+            else:
+                df = entry[0][(entry[0].index >= start) & (entry[0].index <= end)]
+            for idx in groups.pop(key):
+                results[idx] = df
+
+    pending = [(0.0, key, 0) for key in groups]     # (最早可发送时间, 合约键, 已重试次数)
+    in_flight = {}
+
+    while pending or in_flight:
+        now = time.monotonic()
+        # 逐个尝试所有已到时间的请求：某个请求被限速（如相同请求 15 秒间隔）时跳过它，
+        # 不阻塞其它可以立即发出的合约；之后只等待到最早可以重试的时间
+        waits, deferred = [], []
+        for ready_at, key, attempt in sorted(pending, key=lambda item: item[0]):
+            if ready_at > now:
+                waits.append(ready_at - now)
+                deferred.append((ready_at, key, attempt))
+                continue
+            request_key = (key, end_datetime, duration, bar_size, what_to_show)
+            delay = pacer.reserve(request_key, key, small_bar)
+            if delay > 0:
+                waits.append(delay)
+                deferred.append((ready_at, key, attempt))
+                continue
+            contract = contracts[groups[key][0]]
+            future = fetch_historical_data_future(
+                contract, end_datetime, duration, bar_size, what_to_show,
+                timeout=timeout, raise_on_error=True
+            )
+            in_flight[future] = (key, attempt)
+        pending = deferred
+        wait_for = min(waits) if waits else None
+
+        if not in_flight:
+            time.sleep(wait_for or 0.05)
+            continue
+        done, _ = wait_futures(list(in_flight), timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            key, attempt = in_flight.pop(future)
+            pacer.release()
+            try:
+                df = future.result()
+                definitive = True
+            except IBKRRequestError as e:
+                if is_pacing_violation(e.error_code, e.error_string) and attempt < max_retries:
+                    backoff = 10 * (2 ** attempt)
+                    print(f"⚠️ 触发历史数据限速，{backoff}s 后重试: {key}")
+                    pacer.penalize(backoff)
+                    pending.append((time.monotonic() + backoff, key, attempt + 1))
+                    continue
+                df, definitive = pd.DataFrame(), _is_no_data(e, contracts[groups[key][0]])
+                if cache is not None and not definitive:
+                    _remember_no_definition(e, entries[key][0])
+            if cache is not None and definitive:
+                cache_key, entry = entries[key]
+                merged = _store_window(cache, cache_key, entry, [df], start, end)
+                df = merged[(merged.index >= start) & (merged.index <= end)]
+            for idx in groups[key]:
+                results[idx] = df
+
+    return results
+
+# ✅ 流式获取历史数据：边接收边产出，不等 historicalDataEnd
+_STREAM_END = object()
+
+def stream_historical_data(contract: Contract, end_datetime: str, duration: str, bar_size: str,
+                           what_to_show="TRADES", chunk_size: int = None,
+                           timeout: int = 15, max_buffered: int = 50000):
+    """
+    以生成器形式逐根（chunk_size=None，产出 bar dict）或按块（产出 DataFrame）返回历史K线。
+    基于 dispatcher.register(handler=...) / dispatch() 路径，K线不在 dispatcher 中累积。
+
+    - timeout：相邻两根K线之间的最长等待时间（秒），超时则取消请求并抛出 IBKRRequestError
+    - max_buffered：接收队列上限。reader 线程从不阻塞（否则同一连接上的所有请求都会卡住）：
+      消费者过慢导致积压超过上限时取消请求，生成器抛出 STREAM_OVERFLOW_CODE 错误
+    - TWS 返回错误（如 162 / 200）或连接断开时，生成器在产出已收到的K线后抛出对应的 IBKRRequestError，
+      不会把被截断的数据当作正常结束
+    - 提前 break 时会自动 cancelHistoricalData
+    """
+    ib = get_ib("historical")
+    if ib is None:
+        return
 
+    bars = queue.SimpleQueue()      # 无界队列，put 永不阻塞；积压上限由 on_bar 自行检查
     req_id = ib.dispatcher.next_id()
-    ib.dispatcher.register(req_id)
+    overflowed = False
+
+    def on_bar(bar):
+        nonlocal overflowed
+        if overflowed:
+            return
+        if bars.qsize() >= max_buffered:
+            overflowed = True
+            ib.cancelHistoricalData(ib.dispatcher.wire_id(req_id))
+            ib.dispatcher.set_error(req_id, STREAM_OVERFLOW_CODE, f"stream buffer exceeded {max_buffered} bars")
+            return
+        bars.put(bar)
+
+    ib.dispatcher.register(req_id, handler=on_bar, use_event=False, kind="historical")
+    ib.dispatcher.add_done_callback(req_id, lambda _: bars.put((_STREAM_END, ib.dispatcher.error_of(req_id))))
 
     ib.reqHistoricalData(
         reqId=req_id,
@@ -202,47 +841,229 @@ def fetch_historical_data(contract: Contract, end_datetime: str, duration: str,
         chartOptions=[]
     )
 
-    bars = ib.dispatcher.wait(req_id, timeout=15)
-    ib.dispatcher.clear(req_id)
+    finished = False
+    chunk = []
+    try:
+        while True:
+            try:
+                bar = bars.get(timeout=timeout)
+            except queue.Empty:
+                raise IBKRRequestError(req_id, REQUEST_TIMEOUT_CODE, f"no bar received within {timeout}s")
+            if type(bar) is tuple and bar[0] is _STREAM_END:
+                finished = True
+                error = bar[1]
+                break
+            if chunk_size is None:
+                yield bar
+                continue
+            chunk.append(bar)
+            if len(chunk) >= chunk_size:
+                yield _bars_to_dataframe(chunk)
+                chunk = []
+        if chunk:
+            yield _bars_to_dataframe(chunk)
+        if error is not None:
+            raise error
+    finally:
+        wire_id = ib.dispatcher.wire_id(req_id)
+        ib.dispatcher.clear(req_id)
+        if not finished and not overflowed:
+            ib.cancelHistoricalData(wire_id)
 
-    if not bars:
-        print("❌ 没有接收到历史数据")
-        return pd.DataFrame()
+# ✅ keepUpToDate 实时K线订阅：相同 (合约, 周期, whatToShow, useRTH) 共享一个订阅，引用计数
+class BarSubscription:
+    """
+    一个 keepUpToDate 历史K线订阅。回补K线和后续增量更新都写入定长环形缓冲区，
+    通过 view(n) 零拷贝读取最近 n 根；add_listener(fn) 可在每次更新时收到 bar dict。
+    """
+    def __init__(self, key: tuple, req_id: int, capacity: int):
+        self.key = key
+        self.req_id = req_id
+        self.buffer = BarRingBuffer(capacity)
+        self.ready = threading.Event()    # 回补数据接收完毕（historicalDataEnd）
+        self.refcount = 1
+        self._listeners = []
 
-    df = pd.DataFrame(bars)
-    df["date"] = pd.to_datetime(df["date"])
-    df.set_index("date", inplace=True)
-    return df
+    def on_bar(self, bar: dict):
+        # 重连后重新回补的旧K线不会写入缓冲区，也不再通知 listener
+        if not self.buffer.upsert(bar_time(bar["date"]), bar["open"], bar["high"], bar["low"],
+                                  bar["close"], float(bar["volume"])):
+            return
+        for listener in self._listeners:
+            listener(bar)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def view(self, n: int = None):
+        return self.buffer.view(n)
+
+    def to_dataframe(self, n: int = None) -> pd.DataFrame:
+        return self.buffer.to_dataframe(n)
+
+_bar_subscriptions = {}     # key -> BarSubscription
+_bar_subscriptions_lock = threading.Lock()
+
+def subscribe_bars(contract: Contract, bar_size: str = "1 min", duration: str = "1 D",
+                   what_to_show="TRADES", use_rth: int = 1, capacity: int = 10000) -> 'BarSubscription | None':
+    """
+    打开（或复用）一个 keepUpToDate 实时K线订阅；用完后调用 unsubscribe_bars。
+    bar_size 最小为 5 secs；duration 为初始回补长度。
+    """
+    key = (contract_key(contract), bar_size, what_to_show, int(use_rth))
+    with _bar_subscriptions_lock:
+        subscription = _bar_subscriptions.get(key)
+        if subscription is not None:
+            subscription.refcount += 1
+            return subscription
+
+        # keepUpToDate 是实时数据：路由键 "bars" 不属于批量类型，连接池启用时固定走主连接
+        ib = get_ib("bars")
+        if ib is None:
+            return None
+        req_id = ib.dispatcher.next_id()
+        subscription = BarSubscription(key, req_id, capacity)
+
+        # 重连后以新的 reqId 重新订阅：早于缓冲区最后一根的回补K线被 upsert 忽略，
+        # 最后一根原地更新，断线期间缺失的K线按时间追加，不会重复
+        def send(conn, wire_id):
+            conn.reqHistoricalData(
+                reqId=wire_id,
+                contract=contract,
+                endDateTime='',         # keepUpToDate 要求 endDateTime 为空
+                durationStr=duration,
+                barSizeSetting=bar_size,
+                whatToShow=what_to_show,
+                useRTH=use_rth,
+                formatDate=2,           # epoch 秒，便于写入环形缓冲区
+                keepUpToDate=True,
+                chartOptions=[]
+            )
+
+        ib.dispatcher.register(req_id, handler=subscription.on_bar, use_event=False, kind="historical", resend=send)
+        ib.dispatcher.add_done_callback(req_id, lambda _: subscription.ready.set())
+        _bar_subscriptions[key] = subscription
+
+    send(ib, req_id)
+    return subscription
+
+def unsubscribe_bars(subscription: BarSubscription):
+    """
+    释放一次引用；最后一个使用者退订时取消服务端订阅并清理。
+    """
+    with _bar_subscriptions_lock:
+        subscription.refcount -= 1
+        if subscription.refcount > 0:
+            return
+        _bar_subscriptions.pop(subscription.key, None)
+
+    ib = get_ib("bars")
+    if ib is not None:
+        ib.cancelHistoricalData(ib.dispatcher.wire_id(subscription.req_id))
+        ib.dispatcher.clear(subscription.req_id)
 
 # ✅ 获取合约详情（如验证或补全参数用）
-def fetch_contract_details(contract: Contract, timeout=5):
-    ib = connect_ibkr()
-    req_id = ib.dispatcher.next_id()
-    ib.dispatcher.register(req_id)
+def fetch_contract_details(contract: Contract, timeout=5, use_cache=True):
+    return fetch_contract_details_future(contract, timeout, use_cache).result()
+
+# ✅ 合约详情记忆化：TTL + LRU + single-flight，相同合约的并发请求只发一次
+_contract_details_cache = SingleFlightCache()
 
-    ib.reqContractDetails(req_id, contract)
-    details = ib.dispatcher.wait(req_id, timeout)
-    ib.dispatcher.clear(req_id)
+def get_contract_details_cache() -> SingleFlightCache:
+    return _contract_details_cache
+
+def fetch_contract_details_future(contract: Contract, timeout=5, use_cache=True) -> Future:
+    """
+    fetch_contract_details 的非阻塞版本，contractDetailsEnd 到达时以详情列表完成。
+    一个线程即可同时发出数百个请求，再用 concurrent.futures.as_completed 收集。
+    use_cache=True 时经过记忆化层：命中直接返回，"合约不存在" 也会短暂缓存，
+    超时或断线等临时失败不缓存。
+    """
+    if not use_cache:
+        return _request_future(
+            send=lambda ib, req_id: ib.reqContractDetails(req_id, contract),
+            timeout=timeout,
+            default=[],
+            kind="contractDetails",
+        )
+
+    def load() -> Future:
+        raw = _request_future(
+            send=lambda ib, req_id: ib.reqContractDetails(req_id, contract),
+            timeout=timeout,
+            raise_on_error=True,
+            kind="contractDetails",
+        )
+        return recover_future(chain_future(raw, _require_connected), _details_error_as_result)
+
+    return recover_future(
+        _contract_details_cache.get_or_load(contract_key(contract), load),
+        lambda _: [],
+    )
 
+def _require_connected(details):
+    if details is None:
+        raise ConnectionError("IBKR 未连接")
     return details
 
+def _details_error_as_result(error: Exception):
+    # error 200 = 合约不存在，属于确定的结果，可以作为空列表缓存；其它错误向上抛出，不缓存
+    if isinstance(error, IBKRRequestError) and error.error_code == 200:
+        return []
+    raise error
+
+async def fetch_contract_details_async(contract: Contract, timeout=5):
+    return await asyncio.wrap_future(fetch_contract_details_future(contract, timeout))
+
 # ✅ 合约验证工具（避免循环导入）
 def verify_contract_internal(contract: Contract, timeout: int = 5) -> bool:
-    ib = connect_ibkr()
-    if ib is None:
-        return False
+    return verify_contract_future(contract, timeout).result()
 
-    req_id = ib.dispatcher.next_id()
-    ib.dispatcher.register(req_id)
+def verify_contract_future(contract: Contract, timeout: int = 5) -> Future:
+    return chain_future(fetch_contract_details_future(contract, timeout), bool)
 
-    ib.reqContractDetails(req_id, contract)
-    result = ib.dispatcher.wait(req_id, timeout)
-    ib.dispatcher.clear(req_id)
+async def verify_contract_async(contract: Contract, timeout: int = 5) -> bool:
+    return await asyncio.wrap_future(verify_contract_future(contract, timeout))
 
-    return bool(result)
+# ✅ 期权 Greeks 流式订阅：写入列式存储 GreeksStore（按 conId 一行）
+def get_greeks_store() -> GreeksStore:
+    return _greeks_store
 
-def tickOptionComputation(self, reqId, tickType, impliedVol, delta, optPrice,
-                           pvDividend, gamma, vega, theta, undPrice):
-    if tickType == 10:  # MODEL_OPTION
-        self.dispatcher.set_result(reqId, [impliedVol, delta, gamma, vega, theta])
-        self.dispatcher.signal_done(reqId)
+def subscribe_option_greeks(contracts: List[Contract]) -> List[int]:
+    """
+    为一组已确认（带 conId）的期权合约打开流式行情，tickOptionComputation 与买卖价
+    持续写入 GreeksStore。返回 reqId 列表，用于 unsubscribe_option_greeks。
+    """
+    ib = get_ib("tick")
+    if ib is None:
+        return []
+    req_ids = []
+    for contract in contracts:
+        ib.greeks.add(contract)
+        req_id = ib.dispatcher.next_id()
+        # 登记到 dispatcher（不计入统计）仅用于断线重连后以新的 reqId 重新订阅并绑定到同一行
+        send = _greeks_sender(contract)
+        ib.dispatcher.register(req_id, use_event=False, kind=None, resend=send)
+        send(ib, req_id)
+        req_ids.append(req_id)
+    return req_ids
+
+def _greeks_sender(contract: Contract):
+    def send(conn, wire_id):
+        _greeks_store.bind(wire_id, contract.conId)
+        conn.reqMktData(wire_id, contract, "", False, False, [])
+    return send
+
+def unsubscribe_option_greeks(req_ids: List[int]):
+    ib = _ib_connection
+    for req_id in req_ids:
+        wire_id = _dispatcher.wire_id(req_id)
+        _greeks_store.unbind(req_id)
+        _greeks_store.unbind(wire_id)
+        _dispatcher.clear(req_id)
+        if ib is not None and ib.isConnected():
+            ib.cancelMktData(wire_id)
@@ -1,25 +1,44 @@
-from IBKR_Connection import fetch_historical_data
+from IBKR_Connection import fetch_historical_data, fetch_historical_many
 from ibapi.contract import Contract
 
-def fetch_stock_data(symbol, duration="30 D", bar_size="1 day"):
-    """
-    快速获取某个股票的历史数据，返回 DataFrame。
-    """
+def _stock_contract(symbol):
     contract = Contract()
     contract.symbol = symbol
     contract.secType = "STK" # 股票,将来可以拓展成其他类型
     contract.exchange = "SMART"
     contract.currency = "USD"
+    return contract
+
+def fetch_stock_data(symbol, duration="30 D", bar_size="1 day", use_cache=True):
+    """
+    快速获取某个股票的历史数据，返回 DataFrame。
+    默认走本地K线缓存，只向 TWS 请求缓存中缺失的时间段。
+    """
+    contract = _stock_contract(symbol)
 
     return fetch_historical_data(
         contract=contract,
         end_datetime="",  # 默认当前时间
         duration=duration,
         bar_size=bar_size,
-        what_to_show="TRADES" # 低流动性：what_to_show="MIDPOINT"
+        what_to_show="TRADES", # 低流动性：what_to_show="MIDPOINT"
+        use_cache=use_cache
+    )
+
+def fetch_stock_data_many(symbols, duration="30 D", bar_size="1 day"):
+    """
+    并发获取一组股票的历史数据（自动遵守限速），返回 {symbol: DataFrame}。
+    """
+    frames = fetch_historical_many(
+        [_stock_contract(symbol) for symbol in symbols],
+        end_datetime="",
+        duration=duration,
+        bar_size=bar_size,
+        what_to_show="TRADES"
     )
+    return dict(zip(symbols, frames))
 
-def fetch_index_data(symbol, duration="30 D", bar_size="1 day"):
+def fetch_index_data(symbol, duration="30 D", bar_size="1 day", use_cache=True):
     contract = Contract()
     contract.symbol = symbol
     contract.secType = "IND"
@@ -32,5 +51,6 @@ def fetch_index_data(symbol, duration="30 D", bar_size="1 day"):
         end_datetime="",
         duration=duration,
         bar_size=bar_size,
-        what_to_show="TRADES"
+        what_to_show="TRADES",
+        use_cache=use_cache
     )
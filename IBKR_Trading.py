@@ -1,11 +1,11 @@
 # IBKR_Trading.py
-from IBKR_Connection import connect_ibkr
+from IBKR_Connection import get_ib
 from ibapi.contract import Contract
 from ibapi.order import Order
 import time
 
 def place_stock_order(symbol, action, quantity, order_type="MKT", limit_price=None):
-    app = connect_ibkr()
+    app = get_ib("order")    # 下单固定走主连接，不受连接池中批量请求影响
     if app is None:
         print("❌ 无法连接到IBKR，取消下单")
         return None
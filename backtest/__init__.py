@@ -0,0 +1,2 @@
+from .engine import BacktestResult, run_backtest
+from .sweep import run_sweep
@@ -0,0 +1,191 @@
+# backtest/engine.py
+
+import numpy as np
+import pandas as pd
+
+from config.constants import TRADING_DAYS_PER_YEAR
+
+ENTRY_RULES = ("next_open", "signal_close")
+STOP_RULES = (None, "signal_extreme")
+
+
+class BacktestResult:
+    """
+    回测结果：
+    - trades：每笔交易一行（信号/入场/出场位置、时间、价格、方向、出场原因、盈亏）
+    - equity / drawdown：按K线对齐的已实现权益曲线与回撤
+    - position：每根K线的持仓方向（1 多头，-1 空头，0 空仓）
+    - stats：汇总统计
+    """
+    def __init__(self, trades: pd.DataFrame, equity: pd.Series, drawdown: pd.Series, position: pd.Series,
+                 stats: dict):
+        self.trades = trades
+        self.equity = equity
+        self.drawdown = drawdown
+        self.position = position
+        self.stats = stats
+
+    def __repr__(self):
+        return f"BacktestResult({self.stats})"
+
+
+def _candidate_trades(open_, high, low, close, signal_idx, side, entry, stop, hold_bars):
+    """
+    为每个信号独立计算一笔候选交易（不考虑持仓重叠），全部为数组运算。
+    持有窗口为入场后的 hold_bars 根K线；窗口内先触发止损则以止损价（跳空时以开盘价）出场，
+    否则在窗口最后一根K线收盘出场。数据末尾不足 hold_bars 的窗口在最后一根K线收盘出场。
+    """
+    n = len(close)
+    first = signal_idx + 1                                  # 持有窗口的第一根K线（调用方保证 < n）
+    entry_price = open_[first] if entry == "next_open" else close[signal_idx]
+
+    offsets = np.arange(hold_bars)
+    window = np.minimum(first[:, None] + offsets[None, :], n - 1)     # (交易数, hold_bars)
+    last = window[:, -1]
+    exit_bar = last.copy()
+    exit_price = close[last]
+    stopped = np.zeros(len(signal_idx), dtype=bool)
+
+    if stop == "signal_extreme":
+        stop_price = np.where(side > 0, low[signal_idx], high[signal_idx])
+        hit = np.where(side[:, None] > 0, low[window] <= stop_price[:, None], high[window] >= stop_price[:, None])
+        stopped = hit.any(axis=1)
+        hit_bar = window[np.arange(len(signal_idx)), hit.argmax(axis=1)]
+        # 跳空越过止损价时按开盘价成交
+        gap_price = open_[hit_bar]
+        fill = np.where(side > 0, np.minimum(gap_price, stop_price), np.maximum(gap_price, stop_price))
+        exit_bar = np.where(stopped, hit_bar, exit_bar)
+        exit_price = np.where(stopped, fill, exit_price)
+
+    entry_bar = first if entry == "next_open" else signal_idx
+    return entry_bar, entry_price, exit_bar, exit_price, stopped
+
+
+def _non_overlapping(signal_idx: np.ndarray, earliest_next: np.ndarray) -> np.ndarray:
+    """
+    只保留不重叠的交易：持仓期间出现的信号被忽略（earliest_next 为下一笔信号最早允许的位置）。
+    每笔交易的 "下一笔" 由 searchsorted 一次性求出，之后只需沿链条跳转（循环次数 = 实际成交笔数）。
+    """
+    if len(signal_idx) == 0:
+        return np.empty(0, dtype=np.int64)
+    next_trade = np.searchsorted(signal_idx, earliest_next, side="left")
+    taken = []
+    j = 0
+    while j < len(signal_idx):
+        taken.append(j)
+        j = next_trade[j]
+    return np.asarray(taken, dtype=np.int64)
+
+
+def run_backtest(df: pd.DataFrame, direction: str = "long", long_signal: str = "BullTrendBar",
+                 short_signal: str = "BearTrendBar", entry: str = "next_open", stop: str | None = "signal_extreme",
+                 hold_bars: int = 5, quantity: float = 100, commission: float = 1.0, slippage: float = 0.0,
+                 initial_capital: float = 100000.0) -> BacktestResult:
+    """
+    向量化回测趋势柱信号（apply_bull_trend_bar / apply_bear_trend_bar 产生的列）。
+
+    参数:
+        direction: "long"（做多 long_signal）、"short"（做空 short_signal）或 "both"
+        entry: "next_open" 信号下一根K线开盘入场；"signal_close" 信号K线收盘入场
+        stop: "signal_extreme" 以信号K线最低价（多头）/ 最高价（空头）止损；None 不设止损
+        hold_bars: 最多持有的K线数量，到期按收盘价出场
+        quantity: 每笔交易数量（股）
+        commission: 每次成交（单边）的固定佣金
+        slippage: 每股滑点，入场和出场都按不利方向计
+    同一时间只持有一笔仓位，持仓期间出现的新信号被忽略。
+    """
+    if entry not in ENTRY_RULES:
+        raise ValueError(f"未知的入场规则: {entry}")
+    if stop not in STOP_RULES:
+        raise ValueError(f"未知的止损规则: {stop}")
+    if hold_bars < 1:
+        raise ValueError("hold_bars 至少为 1")
+
+    open_ = df["open"].to_numpy(dtype=np.float64)
+    high = df["high"].to_numpy(dtype=np.float64)
+    low = df["low"].to_numpy(dtype=np.float64)
+    close = df["close"].to_numpy(dtype=np.float64)
+    n = len(df)
+
+    signal = np.zeros(n, dtype=np.int8)
+    if direction in ("long", "both"):
+        signal[df[long_signal].to_numpy(dtype=bool)] = 1
+    if direction in ("short", "both"):
+        signal[df[short_signal].to_numpy(dtype=bool)] = -1
+    if direction not in ("long", "short", "both"):
+        raise ValueError(f"未知的方向: {direction}")
+    signal[-1:] = 0             # 最后一根K线的信号之后没有可持有的K线
+
+    signal_idx = np.flatnonzero(signal)
+    side = signal[signal_idx].astype(np.int64)
+    entry_bar, entry_price, exit_bar, exit_price, stopped = _candidate_trades(
+        open_, high, low, close, signal_idx, side, entry, stop, hold_bars
+    )
+
+    # 下一根开盘入场时，出场K线上的信号可以接续；收盘入场则必须在出场K线之后
+    keep = _non_overlapping(signal_idx, exit_bar if entry == "next_open" else exit_bar + 1)
+    signal_idx, side, entry_bar, entry_price, exit_bar, exit_price, stopped = (
+        a[keep] for a in (signal_idx, side, entry_bar, entry_price, exit_bar, exit_price, stopped)
+    )
+    entry_price = entry_price + side * slippage
+    exit_price = exit_price - side * slippage
+    pnl = side * (exit_price - entry_price) * quantity - 2 * commission
+
+    # 已实现权益：盈亏记在出场K线上
+    realized = np.bincount(exit_bar, weights=pnl, minlength=n) if n else np.zeros(0)
+    equity_values = initial_capital + np.cumsum(realized)
+    peak = np.maximum.accumulate(equity_values) if n else equity_values
+    drawdown_values = equity_values / peak - 1 if n else equity_values
+
+    # 持仓：入场K线 +side，出场K线之后 -side，累加得到每根K线的持仓方向
+    change = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(change, entry_bar, side)
+    np.add.at(change, exit_bar + 1, -side)
+    position_values = np.cumsum(change[:n])
+
+    index = df.index
+    trades = pd.DataFrame({
+        "signal_time": index[signal_idx],
+        "entry_time": index[entry_bar],
+        "exit_time": index[exit_bar],
+        "side": side,
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "bars_held": exit_bar - entry_bar + 1,
+        "exit_reason": np.where(stopped, "stop", "time"),
+        "pnl": pnl,
+    })
+    equity = pd.Series(equity_values, index=index, name="equity")
+    drawdown = pd.Series(drawdown_values, index=index, name="drawdown")
+    position = pd.Series(position_values, index=index, name="position")
+    return BacktestResult(trades, equity, drawdown, position, _statistics(trades, equity, drawdown, initial_capital))
+
+
+def _statistics(trades: pd.DataFrame, equity: pd.Series, drawdown: pd.Series, initial_capital: float) -> dict:
+    pnl = trades["pnl"].to_numpy()
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl < 0]
+    gross_loss = -losses.sum()
+    final = float(equity.iloc[-1]) if len(equity) else initial_capital
+
+    # 按交易日聚合的已实现收益，用于年化夏普
+    sharpe = np.nan
+    if len(equity) > 1 and isinstance(equity.index, pd.DatetimeIndex):
+        daily = equity.groupby(equity.index.normalize()).last().pct_change().dropna()
+        if len(daily) > 1 and daily.std() > 0:
+            sharpe = float(daily.mean() / daily.std() * np.sqrt(TRADING_DAYS_PER_YEAR))
+
+    return {
+        "trades": int(len(pnl)),
+        "win_rate": float(len(wins) / len(pnl)) if len(pnl) else np.nan,
+        "total_pnl": float(pnl.sum()),
+        "total_return": final / initial_capital - 1,
+        "avg_trade": float(pnl.mean()) if len(pnl) else np.nan,
+        "avg_win": float(wins.mean()) if len(wins) else np.nan,
+        "avg_loss": float(losses.mean()) if len(losses) else np.nan,
+        "profit_factor": float(wins.sum() / gross_loss) if gross_loss > 0 else np.inf if len(wins) else np.nan,
+        "max_drawdown": float(drawdown.min()) if len(drawdown) else 0.0,
+        "avg_bars_held": float(trades["bars_held"].mean()) if len(pnl) else np.nan,
+        "stop_rate": float((trades["exit_reason"] == "stop").mean()) if len(pnl) else np.nan,
+        "sharpe": sharpe,
+    }
@@ -0,0 +1,114 @@
+# backtest/sweep.py
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import run_backtest
+from logic.trend_bar_engine import compute_trend_bar_flags
+
+_FIELDS = ("open", "high", "low", "close")
+
+# ✅ 工作进程内的共享K线视图：symbol -> (时间, open, high, low, close)，进程启动时挂载一次
+_worker_bars = {}
+_worker_shm = None
+
+
+class SharedBars:
+    """
+    把多个标的的 OHLC 一次性写入一块共享内存：
+    [时间 int64 × N][open × N][high × N][low × N][close × N]（N 为所有标的K线总数），
+    每个标的占其中一段 [start, end)。工作进程按名称挂载，直接得到零拷贝的 NumPy 视图。
+    """
+    def __init__(self, frames: dict):
+        lengths = {symbol: len(df) for symbol, df in frames.items()}
+        total = sum(lengths.values())
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * total * (1 + len(_FIELDS))))
+        self.total = total
+        self.segments = {}
+        times, values = self._views(self.shm.buf, total)
+        start = 0
+        for symbol, df in frames.items():
+            end = start + lengths[symbol]
+            times[start:end] = pd.DatetimeIndex(df.index).asi8
+            for row, field in enumerate(_FIELDS):
+                values[row, start:end] = df[field].to_numpy(dtype=np.float64)
+            self.segments[symbol] = (start, end)
+            start = end
+
+    @staticmethod
+    def _views(buf, total: int):
+        times = np.ndarray((total,), dtype=np.int64, buffer=buf)
+        values = np.ndarray((len(_FIELDS), total), dtype=np.float64, buffer=buf, offset=8 * total)
+        return times, values
+
+    def spec(self) -> tuple:
+        # 传给工作进程的挂载信息（可 pickle）
+        return self.shm.name, self.total, self.segments
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(spec: tuple):
+    global _worker_shm
+    name, total, segments = spec
+    _worker_shm = shared_memory.SharedMemory(name=name)
+    times, values = SharedBars._views(_worker_shm.buf, total)
+    _worker_bars.clear()
+    for symbol, (start, end) in segments.items():
+        _worker_bars[symbol] = (times[start:end], *(values[row, start:end] for row in range(len(_FIELDS))))
+
+
+def _detach():
+    global _worker_shm
+    _worker_bars.clear()
+    if _worker_shm is not None:
+        _worker_shm.close()
+        _worker_shm = None
+
+
+def _run_cell(task: tuple) -> dict:
+    symbol, body_ratio, lookback, backtest_kwargs = task
+    times, open_, high, low, close = _worker_bars[symbol]
+    bull, bear = compute_trend_bar_flags(open_, high, low, close, body_ratio, body_ratio, lookback, lookback)
+    df = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close,
+                       "BullTrendBar": bull, "BearTrendBar": bear},
+                      index=pd.DatetimeIndex(times.view("datetime64[ns]")), copy=False)
+    stats = run_backtest(df, **backtest_kwargs).stats
+    return {"symbol": symbol, "body_ratio": body_ratio, "lookback": lookback, **stats}
+
+
+def run_sweep(frames: dict, body_ratios, lookbacks, processes: int = None, **backtest_kwargs) -> pd.DataFrame:
+    """
+    在 symbols × body_ratio × lookback_period 网格上并行回测，返回每个格点一行的结果表。
+
+    - frames：{symbol: 带 open/high/low/close 的 DataFrame}，只在主进程写入共享内存一次；
+    - 每个格点直接用参数计算趋势柱标识（等价于 apply_bull_trend_bar / apply_bear_trend_bar 的参数覆盖），
+      不需要修改 definitions.json；
+    - backtest_kwargs 原样传给 run_backtest（如 direction、hold_bars、commission）；
+    - processes=1 时在当前进程内顺序执行，便于调试。
+    """
+    tasks = [
+        (symbol, float(body_ratio), int(lookback), backtest_kwargs)
+        for symbol, body_ratio, lookback in itertools.product(frames, body_ratios, lookbacks)
+    ]
+    shared = SharedBars(frames)
+    try:
+        if processes == 1:
+            _attach(shared.spec())
+            rows = [_run_cell(task) for task in tasks]
+        else:
+            processes = processes or os.cpu_count()
+            chunksize = max(1, len(tasks) // (processes * 4))
+            with ProcessPoolExecutor(max_workers=processes, initializer=_attach, initargs=(shared.spec(),)) as pool:
+                rows = list(pool.map(_run_cell, tasks, chunksize=chunksize))
+    finally:
+        _detach()
+        shared.close()
+    return pd.DataFrame(rows)
@@ -0,0 +1,129 @@
+# benchmarks/bench_dispatcher.py
+"""
+IBKRDispatcher 多线程压力测试。
+
+模拟真实运行方式：多个策略线程并发 register → 发送请求 → wait → clear，
+单个 "reader" 线程（模拟 EClient.run）按顺序回填 set_result / signal_done。
+运行结束后校验：reqId 无重复、结果无丢失、注册表无残留。
+
+用法：
+    python benchmarks/bench_dispatcher.py --threads 8 --requests 5000
+"""
+import argparse
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.ibkr_dispatcher import IBKRDispatcher
+
+
+def run_round_trip(dispatcher: IBKRDispatcher, threads: int, requests: int, results_per_req: int) -> dict:
+    """
+    调用方线程 + 单 reader 线程的完整往返压测。
+    """
+    wire = queue.SimpleQueue()
+    seen_ids = [[] for _ in range(threads)]
+    lost = [0] * threads
+
+    def reader():
+        while True:
+            req_id = wire.get()
+            if req_id is None:
+                return
+            for i in range(results_per_req):
+                dispatcher.set_result(req_id, i)
+            dispatcher.signal_done(req_id)
+
+    def caller(slot: int):
+        for _ in range(requests):
+            req_id = dispatcher.next_id()
+            dispatcher.register(req_id)
+            wire.put(req_id)
+            result = dispatcher.wait(req_id, timeout=10)
+            if len(result) != results_per_req:
+                lost[slot] += 1
+            dispatcher.clear(req_id)
+            seen_ids[slot].append(req_id)
+
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+    workers = [threading.Thread(target=caller, args=(i,)) for i in range(threads)]
+
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    wire.put(None)
+    reader_thread.join()
+
+    all_ids = [i for ids in seen_ids for i in ids]
+    return {
+        "total": len(all_ids),
+        "elapsed_s": elapsed,
+        "req_per_s": len(all_ids) / elapsed,
+        "duplicate_ids": len(all_ids) - len(set(all_ids)),
+        "lost_results": sum(lost),
+        "leaked_slots": dispatcher.pending_count(),
+    }
+
+
+def run_registry_churn(dispatcher: IBKRDispatcher, threads: int, requests: int) -> dict:
+    """
+    纯注册表吞吐：每个线程独立完成 register / set_result / signal_done / clear，不等待。
+    """
+    def churn():
+        for _ in range(requests):
+            req_id = dispatcher.next_id()
+            dispatcher.register(req_id)
+            dispatcher.set_result(req_id, req_id)
+            dispatcher.signal_done(req_id)
+            dispatcher.wait(req_id, timeout=0)
+            dispatcher.clear(req_id)
+
+    workers = [threading.Thread(target=churn) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * requests
+    return {
+        "total": total,
+        "elapsed_s": elapsed,
+        "req_per_s": total / elapsed,
+        "leaked_slots": dispatcher.pending_count(),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="IBKRDispatcher stress benchmark")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent caller threads")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per thread")
+    parser.add_argument("--results", type=int, default=3, help="Results delivered per request")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    churn = run_registry_churn(IBKRDispatcher(), args.threads, args.requests)
+    print(f"📊 Registry churn : {churn['total']} req in {churn['elapsed_s']:.3f}s "
+          f"→ {churn['req_per_s']:,.0f} req/s, leaked={churn['leaked_slots']}")
+
+    trip = run_round_trip(IBKRDispatcher(), args.threads, args.requests, args.results)
+    print(f"📊 Round trip     : {trip['total']} req in {trip['elapsed_s']:.3f}s "
+          f"→ {trip['req_per_s']:,.0f} req/s, dup_ids={trip['duplicate_ids']}, "
+          f"lost={trip['lost_results']}, leaked={trip['leaked_slots']}")
+
+    ok = churn["leaked_slots"] == 0 and trip["duplicate_ids"] == 0 \
+        and trip["lost_results"] == 0 and trip["leaked_slots"] == 0
+    print("✅ 压测通过" if ok else "❌ 压测发现问题")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,270 @@
+# benchmarks/run_benchmarks.py
+"""
+生产热点路径的基准测试套件（输入全部为固定种子的合成数据，结果可重复）：
+- dispatcher.*：IBKRDispatcher 多线程 register / set_result / wait 往返与注册表吞吐
+- bars_to_dataframe.*：fetch_historical_data 由 N 根 bar dict 构建 DataFrame
+- trend_bars.*：apply_bull_trend_bar + apply_bear_trend_bar，10k / 1M / 10M 根K线
+- calculate_hv.*：历史波动率
+- option_chain.*：与 main_ib_insync.get_option_chain 相同的到期日筛选 + assemble_option_chain + 执行价排序
+
+结果写入 JSON；指定 --baseline 时与基线逐项比较，中位耗时变慢超过 --threshold 即判定为退化并以非 0 退出。
+
+用法：
+    python benchmarks/run_benchmarks.py --output benchmarks/results/latest.json
+    python benchmarks/run_benchmarks.py --save-baseline                # 写入 benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.2
+    python benchmarks/run_benchmarks.py --only trend_bars --sizes 10000 1000000
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_dispatcher import run_registry_churn, run_round_trip
+from core.ibkr_dispatcher import IBKRDispatcher
+from IBKR_Connection import _bars_to_dataframe
+from logic import apply_bear_trend_bar, apply_bull_trend_bar
+from options.chain_table import assemble_option_chain
+from utils.volatility_data import calculate_hv
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCH_DIR / "results" / "latest.json"
+TREND_BAR_SIZES = (10_000, 1_000_000, 10_000_000)
+SEED = 42
+
+
+def measure(fn, repeat: int = 5, warmup: int = 1) -> dict:
+    """
+    运行 fn（无参数）warmup + repeat 次，返回每次耗时的中位数 / 最小值（秒）。
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeat": repeat}
+
+
+# ---------- 合成输入 ----------
+def synthetic_ohlc(n: int, seed: int = SEED) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # 几何随机游走，10M 根K线也不会出现负价格
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = close * (1 + rng.normal(0, 0.0008, n))
+    high = np.maximum(open_, close) * (1 + rng.exponential(0.0004, n))
+    low = np.minimum(open_, close) * (1 - rng.exponential(0.0004, n))
+    index = pd.date_range("2020-01-02 09:30", periods=n, freq="min", name="date")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": 1000.0}, index=index)
+
+
+def synthetic_bar_dicts(n: int, seed: int = SEED) -> list:
+    # 与 IBApi.historicalData 回填到 dispatcher 的结构相同（date 为 TWS 的 "YYYYMMDD  HH:MM:SS" 字符串）
+    df = synthetic_ohlc(n, seed)
+    dates = df.index.strftime("%Y%m%d  %H:%M:%S")
+    return [
+        {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": 1000}
+        for d, o, h, l, c in zip(dates, df["open"].tolist(), df["high"].tolist(), df["low"].tolist(),
+                                 df["close"].tolist())
+    ]
+
+
+def synthetic_chain(expiries: int, strikes: int, seed: int = SEED):
+    """
+    ib_insync 风格的期权链：reqSecDefOptParams 的到期日列表 + 每个 (执行价, C/P) 一个 ticker，
+    约 5% 的 ticker 缺少报价或 greeks（被 assemble_option_chain 跳过）。
+    """
+    rng = np.random.default_rng(seed)
+    today = datetime(2025, 1, 2)
+    expirations = [(today + timedelta(days=7 * i)).strftime("%Y%m%d") for i in range(expiries)]
+    strike_grid = 500.0 + np.arange(-(strikes // 2), strikes - strikes // 2)
+    tickers = []
+    for strike in strike_grid:
+        for right in ("C", "P"):
+            missing = rng.random() < 0.05
+            delta = float(rng.uniform(0, 1)) * (1 if right == "C" else -1)
+            greeks = None if missing else SimpleNamespace(
+                delta=delta, gamma=0.01, theta=-0.05, vega=0.1, impliedVol=float(rng.uniform(0.1, 0.4)))
+            bid = float(rng.uniform(0.05, 20))
+            tickers.append(SimpleNamespace(
+                contract=SimpleNamespace(strike=float(strike), right=right),
+                bid=bid, ask=bid + 0.05, modelGreeks=greeks))
+    return today, expirations, tickers
+
+
+def chain_pipeline(today: datetime, expirations: list, tickers: list):
+    # main_ib_insync.get_option_chain 第 6 / 9 / 10 步：30 天内最近到期日 → 组装 → 按执行价排序
+    valid = [e for e in sorted(expirations) if datetime.strptime(e, "%Y%m%d") - today < pd.Timedelta(days=30)]
+    chain = assemble_option_chain(tickers)
+    return valid[0], [(k, chain[k].get("C"), chain[k].get("P")) for k in sorted(chain)]
+
+
+# ---------- 基准项 ----------
+def bench_dispatcher(threads: int = 8, requests: int = 2000) -> dict:
+    # 多线程压测自身已足够长，不再重复多次；以总耗时作为比较指标
+    results = {}
+    churn = run_registry_churn(IBKRDispatcher(), threads, requests)
+    results["dispatcher.registry_churn"] = {"median_s": churn["elapsed_s"], "min_s": churn["elapsed_s"], "repeat": 1,
+                                            "n": churn["total"], "per_s": churn["req_per_s"]}
+    trip = run_round_trip(IBKRDispatcher(), threads, requests, 3)
+    if trip["duplicate_ids"] or trip["lost_results"] or trip["leaked_slots"]:
+        raise RuntimeError(f"dispatcher 往返压测结果不一致: {trip}")
+    results["dispatcher.round_trip"] = {"median_s": trip["elapsed_s"], "min_s": trip["elapsed_s"], "repeat": 1,
+                                        "n": trip["total"], "per_s": trip["req_per_s"]}
+    return results
+
+
+def bench_bars_to_dataframe(sizes=(1_000, 10_000, 100_000)) -> dict:
+    results = {}
+    for n in sizes:
+        bars = synthetic_bar_dicts(n)
+        results[f"bars_to_dataframe.{n}"] = {**measure(lambda: _bars_to_dataframe(bars)), "n": n}
+    return results
+
+
+def bench_trend_bars(sizes=TREND_BAR_SIZES) -> dict:
+    results = {}
+    for n in sizes:
+        df = synthetic_ohlc(n)
+        repeat = 5 if n <= 1_000_000 else 3
+        stats = measure(lambda: apply_bear_trend_bar(apply_bull_trend_bar(df)), repeat=repeat)
+        results[f"trend_bars.{n}"] = {**stats, "n": n, "per_s": n / stats["median_s"]}
+        del df
+    return results
+
+
+def bench_calculate_hv(sizes=(252 * 5, 1_000_000)) -> dict:
+    results = {}
+    for n in sizes:
+        df = synthetic_ohlc(n)
+        results[f"calculate_hv.{n}"] = {**measure(lambda: calculate_hv(df)), "n": n}
+    return results
+
+
+def bench_option_chain(shapes=((12, 200), (52, 1000))) -> dict:
+    results = {}
+    for expiries, strikes in shapes:
+        today, expirations, tickers = synthetic_chain(expiries, strikes)
+        stats = measure(lambda: chain_pipeline(today, expirations, tickers))
+        results[f"option_chain.{len(tickers)}"] = {**stats, "n": len(tickers)}
+    return results
+
+
+def run_suite(only=None, sizes=None, threads: int = 8, requests: int = 2000) -> dict:
+    """
+    运行全部（或 only 指定前缀的）基准项，返回 {"meta": ..., "results": {名称: 指标}}。
+    sizes 覆盖 trend_bars 的K线数量。
+    """
+    suites = {
+        "dispatcher": lambda: bench_dispatcher(threads, requests),
+        "bars_to_dataframe": bench_bars_to_dataframe,
+        "trend_bars": lambda: bench_trend_bars(sizes or TREND_BAR_SIZES),
+        "calculate_hv": bench_calculate_hv,
+        "option_chain": bench_option_chain,
+    }
+    results = {}
+    for name, run in suites.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        print(f"⏱️ 运行 {name} ...")
+        results.update(run())
+    return {"meta": _metadata(), "results": results}
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    逐项比较中位耗时，返回 [(名称, 基线秒, 当前秒, 比值, 是否退化)]；只比较两边都有的项目。
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] > 0 else float("inf")
+        rows.append((name, base["median_s"], result["median_s"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_results(report: dict):
+    print(f"\n{'基准项':<32}{'中位耗时':>12}{'最小耗时':>12}{'吞吐/s':>16}")
+    for name, r in report["results"].items():
+        per_s = f"{r['per_s']:,.0f}" if "per_s" in r else ""
+        print(f"{name:<32}{r['median_s'] * 1000:>10.2f}ms{r['min_s'] * 1000:>10.2f}ms{per_s:>16}")
+
+
+def print_comparison(rows: list, threshold: float):
+    print(f"\n{'基准项':<32}{'基线':>12}{'当前':>12}{'比值':>8}")
+    for name, base, current, ratio, regressed in rows:
+        flag = "❌" if regressed else "✅"
+        print(f"{name:<32}{base * 1000:>10.2f}ms{current * 1000:>10.2f}ms{ratio:>8.2f} {flag}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"❌ {len(regressions)} 项变慢超过 {threshold:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"✅ 没有超过 {threshold:.0%} 的性能退化")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="热点路径基准测试（JSON 输出 + 基线比较）")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="结果 JSON 路径")
+    parser.add_argument("--baseline", type=Path, help="与该基线 JSON 比较")
+    parser.add_argument("--save-baseline", action="store_true", help=f"同时把结果写入 {DEFAULT_BASELINE.name}")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的中位耗时增幅（0.2 = 20%%）")
+    parser.add_argument("--only", nargs="*", help="只运行名称以这些前缀开头的基准组")
+    parser.add_argument("--sizes", nargs="*", type=int, help="trend_bars 的K线数量（默认 10k 1M 10M）")
+    parser.add_argument("--threads", type=int, default=8, help="dispatcher 压测线程数")
+    parser.add_argument("--requests", type=int, default=2000, help="dispatcher 每线程请求数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run_suite(args.only, args.sizes, args.threads, args.requests)
+    print_results(report)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\n💾 结果已写入 {args.output}")
+    if args.save_baseline:
+        DEFAULT_BASELINE.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"💾 基线已更新 {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        rows = compare(report, baseline, args.threshold)
+        print_comparison(rows, args.threshold)
+        return 1 if any(row[4] for row in rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# core/bar_cache.py
+
+import hashlib
+import math
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+from core.contract_key import contract_key
+
+# ✅ 默认缓存目录和容量上限
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[1] / "data" / "bar_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# ✅ 尾部缺口小于该秒数时视为已覆盖（避免连续运行时重复请求最新一根K线）
+FRESH_SECONDS = 60
+
+_COLUMNS = ("open", "high", "low", "close", "volume")
+_DURATION_UNITS = {"S": timedelta(seconds=1), "D": timedelta(days=1), "W": timedelta(weeks=1),
+                   "M": timedelta(days=31), "Y": timedelta(days=365)}
+
+
+def to_local(moment: datetime) -> datetime:
+    """
+    带时区的时间换算为不带时区的本地时间（缓存中的K线时间与覆盖区间统一使用本地时间）。
+    """
+    return moment.astimezone(tzlocal()).replace(tzinfo=None)
+
+
+def parse_end_datetime(end_datetime: str) -> datetime:
+    """
+    解析 IB endDateTime，返回不带时区的本地时间：
+    - '' 表示当前时间；
+    - 'YYYYMMDD HH:MM:SS' 为本地时间，末尾带时区名（如 'US/Eastern'）时按该时区换算；
+    - 'YYYYMMDD-HH:MM:SS' 按 IB 约定为 UTC。
+    """
+    if not end_datetime:
+        return datetime.now()
+    parts = end_datetime.split()
+    if "-" in parts[0]:
+        return to_local(datetime.strptime(parts[0], "%Y%m%d-%H:%M:%S").replace(tzinfo=timezone.utc))
+    moment = datetime.strptime(f"{parts[0]} {parts[1]}", "%Y%m%d %H:%M:%S")
+    if len(parts) > 2:
+        moment = to_local(moment.replace(tzinfo=ZoneInfo(parts[2])))
+    return moment
+
+
+def requested_window(end_datetime: str, duration: str):
+    """
+    把 (endDateTime, durationStr) 转换为请求覆盖的时间区间 [start, end]。
+    """
+    end = parse_end_datetime(end_datetime)
+    count, unit = duration.split()
+    return end - int(count) * _DURATION_UNITS[unit.upper()], end
+
+
+def is_daily_bar(bar_size: str) -> bool:
+    """
+    判断 barSizeSetting 是否为日线或更长周期（1 day / 1 week / 1 month）。
+    """
+    return bool(re.match(r"\s*\d+\s*(day|week|month)s?\b", bar_size or ""))
+
+
+def duration_for(start: datetime, end: datetime, bar_size: str = None) -> str:
+    """
+    为缺口 [start, end] 生成足够覆盖的 durationStr。
+    日线及以上周期 IB 不接受以秒为单位的 duration，短缺口至少请求 "1 D"。
+    """
+    seconds = (end - start).total_seconds()
+    if seconds <= 86400:
+        if is_daily_bar(bar_size):
+            return "1 D"
+        return f"{max(60, math.ceil(seconds))} S"
+    days = math.ceil(seconds / 86400) + 1
+    if days > 365:
+        return f"{math.ceil(days / 365)} Y"
+    return f"{days} D"
+
+
+def format_end_datetime(end: datetime) -> str:
+    return end.strftime("%Y%m%d %H:%M:%S")
+
+
+class BarCache:
+    """
+    本地持久化K线缓存：每个 (合约, barSize, whatToShow, useRTH) 一个 .npz 文件，
+    按列存储 date/open/high/low/close/volume，并记录已覆盖的时间区间 [cov_start, cov_end]。
+
+    - missing_ranges() 计算请求区间中尚未覆盖的首尾缺口，调用方只需向 TWS 请求这些缺口
+    - 文件总大小超过 max_bytes 时按最近访问时间淘汰（LRU）
+    - hits / partial_hits / misses 计数可通过 stats() 查看
+    """
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @staticmethod
+    def make_key(contract, bar_size: str, what_to_show: str, use_rth: int) -> tuple:
+        return (contract_key(contract), bar_size, what_to_show, int(use_rth))
+
+    def _path(self, key: tuple) -> Path:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        return self.root / f"{digest}.npz"
+
+    def lock(self, key: tuple) -> threading.Lock:
+        """
+        每个缓存键一把锁，同一键的 "读取 → 补缺口 → 写回" 串行执行。
+        """
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def load(self, key: tuple):
+        """
+        返回 (df, cov_start, cov_end)；无缓存时返回 None。
+        """
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                df = pd.DataFrame({col: data[col] for col in _COLUMNS},
+                                  index=pd.DatetimeIndex(data["date"].astype("datetime64[ns]"), name="date"))
+                cov_start = pd.Timestamp(int(data["coverage"][0])).to_pydatetime()
+                cov_end = pd.Timestamp(int(data["coverage"][1])).to_pydatetime()
+        except Exception as e:
+            print(f"⚠️ K线缓存文件损坏，已忽略: {path.name} ({e})")
+            return None
+        os.utime(path)  # 刷新访问时间，供 LRU 淘汰使用
+        return df, cov_start, cov_end
+
+    def missing_ranges(self, entry, start: datetime, end: datetime) -> list:
+        """
+        计算 [start, end] 中缓存未覆盖的区间，同时更新命中计数。
+        为保证最新一根（可能未收盘的）K线被刷新，尾部缺口从缓存中最后一根K线开始。
+        """
+        if entry is None:
+            self.misses += 1
+            return [(start, end)]
+        df, cov_start, cov_end = entry
+        if end < cov_start or start > cov_end:
+            self.misses += 1
+            return [(start, end)]
+
+        gaps = []
+        if start < cov_start:
+            gaps.append((start, cov_start))
+        if end > cov_end + timedelta(seconds=FRESH_SECONDS):
+            tail_start = cov_end
+            if not df.empty:
+                tail_start = min(tail_start, df.index[-1].to_pydatetime())
+            gaps.append((tail_start, end))
+
+        if gaps:
+            self.partial_hits += 1
+        else:
+            self.hits += 1
+        return gaps
+
+    def store(self, key: tuple, df: pd.DataFrame, cov_start: datetime, cov_end: datetime):
+        """
+        写入（覆盖）缓存文件：先写临时文件再原子替换，写入后按容量淘汰。
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        dates = df.index.values.astype("datetime64[ns]").astype(np.int64)
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                date=dates,
+                coverage=np.array([pd.Timestamp(cov_start).value, pd.Timestamp(cov_end).value], dtype=np.int64),
+                key=np.array(repr(key)),
+                **{col: df[col].to_numpy(dtype=np.float64) for col in _COLUMNS},
+            )
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def evict(self, keep: Path = None):
+        files = [(p, p.stat()) for p in self.root.glob("*.npz")]
+        total = sum(st.st_size for _, st in files)
+        for path, st in sorted(files, key=lambda item: item[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= st.st_size
+
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.root.glob("*.npz")) if self.root.exists() else 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "bytes": self.size_bytes(),
+        }
+
+
+def merge_bars(cached: pd.DataFrame, fresh: list) -> pd.DataFrame:
+    """
+    合并缓存K线与新拉取的K线，日期相同时以新数据为准（刷新未收盘K线）。
+    """
+    frames = []
+    for df in [cached, *fresh]:
+        if df is None or df.empty:
+            continue
+        df = df[list(_COLUMNS)].astype(np.float64)
+        if df.index.tz is not None:
+            df.index = df.index.tz_convert(tzlocal()).tz_localize(None)   # 缓存统一使用不带时区的本地时间
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=list(_COLUMNS), index=pd.DatetimeIndex([], name="date"))
+    merged = pd.concat(frames)
+    merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+    merged.index.name = "date"
+    return merged
+
@@ -0,0 +1,87 @@
+# core/bar_ring.py
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# ✅ K线记录格式：time 为 UTC epoch 秒（日线为当日 00:00）
+BAR_DTYPE = np.dtype([
+    ("time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+])
+
+
+def bar_time(date_str) -> int:
+    """
+    把 IB 返回的 bar.date 转为 epoch 秒：formatDate=2 时为秒数字符串，日线为 'YYYYMMDD'。
+    """
+    text = str(date_str).strip()
+    if len(text) == 8 and text.isdigit():
+        return int(datetime.strptime(text, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp())
+    return int(text)
+
+
+class BarRingBuffer:
+    """
+    定长 NumPy 环形K线缓冲区（镜像写入技巧）：
+    底层数组长度为 2 * capacity，每根K线同时写入 i 和 i + capacity 两个位置，
+    因此最近 n 根K线总是一段连续内存，view(n) 直接返回零拷贝切片，不需要拼接。
+
+    写入方（EClient reader 线程）与读取方并发时，view 可能读到正在更新的最后一根K线；
+    需要一致快照时请比较前后两次 version 或对 view 调用 .copy()。
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=BAR_DTYPE)
+        self._last = -1         # 最近一次写入的位置（0..capacity-1）
+        self._size = 0
+        self.version = 0        # 每次写入后递增
+
+    def __len__(self):
+        return self._size
+
+    def _write(self, pos: int, record: tuple):
+        self._data[pos] = record
+        self._data[pos + self.capacity] = record
+        self.version += 1
+
+    def upsert(self, time: int, open_: float, high: float, low: float, close: float, volume: float) -> bool:
+        """
+        时间与最后一根相同则原地更新（keepUpToDate 对未完成K线的刷新），更晚则追加；
+        早于最后一根的K线（如断线重连后重新回补的历史部分）已在缓冲区中，直接忽略并返回 False。
+        """
+        record = (time, open_, high, low, close, volume)
+        if self._size:
+            last_time = self._data[self._last]["time"]
+            if time == last_time:
+                self._write(self._last, record)
+                return True
+            if time < last_time:
+                return False
+        self._last = (self._last + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._write(self._last, record)
+        return True
+
+    def view(self, n: int = None) -> np.ndarray:
+        """
+        最近 n 根K线（默认全部）的零拷贝结构化数组视图，按时间升序。
+        """
+        n = self._size if n is None else min(n, self._size)
+        end = self._last + self.capacity + 1
+        return self._data[end - n:end]
+
+    def last(self):
+        return self._data[self._last] if self._size else None
+
+    def to_dataframe(self, n: int = None) -> pd.DataFrame:
+        data = self.view(n).copy()
+        df = pd.DataFrame({name: data[name] for name in BAR_DTYPE.names if name != "time"},
+                          index=pd.to_datetime(data["time"], unit="s"))
+        df.index.name = "date"
+        return df
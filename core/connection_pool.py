@@ -0,0 +1,70 @@
+# core/connection_pool.py
+
+import itertools
+import threading
+
+# ✅ 批量类请求：可以排队、可以慢，分发到工作连接，不占用主连接的 socket 和解码线程
+BULK_KINDS = frozenset({"historical", "contractDetails", "secDef"})
+
+
+class ConnectionPool:
+    """
+    N 个 TWS 连接（各自独立的 clientId、reader 线程、dispatcher 和 reqId 空间）的路由表：
+    - 槽位 0 为主连接，实时行情、下单等延迟敏感的请求固定走主连接；
+    - 槽位 1..N-1 为工作连接，bulk_kinds 中的请求（历史回补、合约详情、期权链）在其间轮询分配，
+      因此大批量回补永远不会阻塞主连接上的实时数据；
+    - 没有工作连接（size=1）或工作连接全部不可用时回退到主连接。
+
+    connect(index) 负责建立第 index 个连接并返回（失败返回 None）；连接对象只需提供 isConnected() / disconnect()。
+    断开的连接在下次被选中时按需重连。
+    """
+    def __init__(self, connect, size: int = 2, bulk_kinds=BULK_KINDS):
+        if size < 1:
+            raise ValueError("size 至少为 1")
+        self._connect = connect
+        self.size = size
+        self.bulk_kinds = frozenset(bulk_kinds)
+        self._connections = [None] * size
+        self._locks = [threading.Lock() for _ in range(size)]
+        self._round_robin = itertools.count()
+
+    def connection(self, index: int):
+        """
+        返回第 index 个连接，未连接或已断开时（在该槽位的锁内）重连。
+        """
+        conn = self._connections[index]
+        if conn is not None and conn.isConnected():
+            return conn
+        with self._locks[index]:
+            conn = self._connections[index]
+            if conn is None or not conn.isConnected():
+                conn = self._connections[index] = self._connect(index)
+        return conn
+
+    def get(self, kind: str = "other"):
+        """
+        按请求类型选择连接：bulk 类型轮询工作连接，其余类型固定走主连接。
+        """
+        if kind in self.bulk_kinds and self.size > 1:
+            workers = self.size - 1
+            start = next(self._round_robin)
+            for offset in range(workers):
+                conn = self.connection(1 + (start + offset) % workers)
+                if conn is not None:
+                    return conn
+        return self.connection(0)
+
+    @property
+    def primary(self):
+        return self.connection(0)
+
+    def connections(self) -> list:
+        # 当前已建立的连接（不触发重连）
+        return [conn for conn in self._connections if conn is not None]
+
+    def close(self, include_primary: bool = True):
+        for index in range(0 if include_primary else 1, self.size):
+            with self._locks[index]:
+                conn, self._connections[index] = self._connections[index], None
+            if conn is not None and conn.isConnected():
+                conn.disconnect()
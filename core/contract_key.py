@@ -0,0 +1,18 @@
+# core/contract_key.py
+
+from ibapi.contract import Contract
+
+# ✅ 能唯一确定一个合约的字段（conId 存在时已足够，其余字段用于未补全的合约）
+_KEY_FIELDS = (
+    "conId", "symbol", "secType", "exchange", "primaryExchange", "currency",
+    "lastTradeDateOrContractMonth", "strike", "right", "multiplier",
+    "tradingClass", "localSymbol",
+)
+
+def contract_key(contract: Contract) -> tuple:
+    """
+    生成可哈希的合约键，用于请求去重、缓存和限速统计。
+    """
+    if getattr(contract, "conId", 0):
+        return ("conId", contract.conId)
+    return tuple(getattr(contract, field, None) for field in _KEY_FIELDS[1:])
@@ -0,0 +1,182 @@
+# core/greeks_store.py
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# ✅ tickOptionComputation 的 tickType（含延迟行情）
+BID_COMPUTATION = (10, 80)
+ASK_COMPUTATION = (11, 81)
+LAST_COMPUTATION = (12, 82)
+MODEL_COMPUTATION = (13, 83)
+
+# ✅ 每个期权一行的数值列
+GREEK_FIELDS = ("bid", "ask", "iv", "delta", "gamma", "vega", "theta", "opt_price", "und_price")
+
+# IB 以 Double.MAX_VALUE 表示 "未设置"，以 -1 / -2 表示 "不可用 / 未计算"
+_UNSET = 1e300
+
+
+def _clean(value, allow_negative: bool = True) -> float:
+    if value is None or abs(value) >= _UNSET or value == -2 or (not allow_negative and value < 0):
+        return np.nan
+    return float(value)
+
+
+class GreeksStore:
+    """
+    期权 Greeks 列式存储：按 conId 分配行号，每个字段一列预分配的 NumPy 数组，容量不足时翻倍扩容。
+    tickOptionComputation / tickPrice 通过 reqId -> 行号 映射原地写入，
+    整条期权链的筛选（如 delta 区间）是对整列的一次向量化比较。
+    扩容会替换列数组，因此 add / bind / unbind 与 reader 线程的 update_* 都在同一把锁内执行，
+    扩容期间到达的 tick 写入新数组，不会丢失。
+    """
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self._rows = {}         # conId -> 行号
+        self._req_rows = {}     # reqId -> 行号
+        self._lock = threading.Lock()
+        self.size = 0
+        self.con_id = np.zeros(capacity, dtype=np.int64)
+        self.expiry = np.zeros(capacity, dtype=np.int64)        # YYYYMMDD
+        self.strike = np.full(capacity, np.nan)
+        self.right = np.zeros(capacity, dtype="U1")
+        self.updated = np.zeros(capacity, dtype=np.float64)     # 最近一次写入的 epoch 秒
+        self.columns = {name: np.full(capacity, np.nan) for name in GREEK_FIELDS}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        new_capacity = self._capacity * 2
+
+        def grown(array, fill):
+            out = np.full(new_capacity, fill, dtype=array.dtype)
+            out[:self._capacity] = array
+            return out
+
+        self.con_id = grown(self.con_id, 0)
+        self.expiry = grown(self.expiry, 0)
+        self.strike = grown(self.strike, np.nan)
+        self.right = grown(self.right, "")
+        self.updated = grown(self.updated, 0.0)
+        self.columns = {name: grown(col, np.nan) for name, col in self.columns.items()}
+        self._capacity = new_capacity
+
+    def add(self, contract) -> int:
+        """
+        登记一个期权合约（需已有 conId），返回行号；重复登记返回原行号。
+        """
+        with self._lock:
+            row = self._rows.get(contract.conId)
+            if row is not None:
+                return row
+            if self.size == self._capacity:
+                self._grow()
+            row = self.size
+            self.con_id[row] = contract.conId
+            expiry = str(contract.lastTradeDateOrContractMonth or "")[:8]
+            self.expiry[row] = int(expiry) if expiry.isdigit() else 0
+            self.strike[row] = contract.strike
+            self.right[row] = (contract.right or "")[:1]
+            self._rows[contract.conId] = row
+            self.size += 1
+            return row
+
+    def bind(self, req_id: int, con_id: int):
+        with self._lock:
+            self._req_rows[req_id] = self._rows[con_id]
+
+    def unbind(self, req_id: int):
+        with self._lock:
+            self._req_rows.pop(req_id, None)
+
+    def row_of(self, con_id: int) -> int | None:
+        return self._rows.get(con_id)
+
+    def is_bound(self, req_id: int) -> bool:
+        return req_id in self._req_rows
+
+    def update_computation(self, req_id: int, tick_type: int, implied_vol, delta, opt_price,
+                           gamma, vega, theta, und_price) -> bool:
+        """
+        写入一条 tickOptionComputation；reqId 未绑定时返回 False。
+        MODEL 写入全部 Greeks；BID / ASK 只记录对应的期权价格。
+        """
+        with self._lock:
+            row = self._req_rows.get(req_id)
+            if row is None:
+                return False
+            cols = self.columns
+            if tick_type in MODEL_COMPUTATION:
+                cols["iv"][row] = _clean(implied_vol, allow_negative=False)
+                cols["delta"][row] = _clean(delta)
+                cols["gamma"][row] = _clean(gamma)
+                cols["vega"][row] = _clean(vega)
+                cols["theta"][row] = _clean(theta)
+                cols["opt_price"][row] = _clean(opt_price, allow_negative=False)
+                cols["und_price"][row] = _clean(und_price, allow_negative=False)
+            elif tick_type in BID_COMPUTATION:
+                cols["bid"][row] = _clean(opt_price, allow_negative=False)
+            elif tick_type in ASK_COMPUTATION:
+                cols["ask"][row] = _clean(opt_price, allow_negative=False)
+            else:
+                return True
+            self.updated[row] = time.time()
+        return True
+
+    def update_price(self, req_id: int, tick_type: int, price: float) -> bool:
+        """
+        写入期权自身的买卖价 tick（tickPrice 1=bid, 2=ask 及延迟行情 66/67）。
+        """
+        with self._lock:
+            row = self._req_rows.get(req_id)
+            if row is None:
+                return False
+            if tick_type in (1, 66):
+                self.columns["bid"][row] = price if price > 0 else np.nan
+            elif tick_type in (2, 67):
+                self.columns["ask"][row] = price if price > 0 else np.nan
+            else:
+                return True
+            self.updated[row] = time.time()
+        return True
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        某一列已登记部分的视图（零拷贝）。
+        """
+        if name in self.columns:
+            return self.columns[name][:self.size]
+        return getattr(self, name)[:self.size]
+
+    def delta_mask(self, low: float, high: float, absolute: bool = True, right: str = None,
+                   max_age: float = None) -> np.ndarray:
+        """
+        delta 落在 [low, high] 的布尔掩码（absolute=True 时比较 |delta|）；
+        可按 right（'C' / 'P'）和报价新鲜度（max_age 秒）进一步过滤。无 delta 的行为 False。
+        """
+        delta = self.column("delta")
+        if absolute:
+            delta = np.abs(delta)
+        with np.errstate(invalid="ignore"):
+            mask = (delta >= low) & (delta <= high)
+        if right is not None:
+            mask &= self.column("right") == right
+        if max_age is not None:
+            mask &= self.column("updated") >= time.time() - max_age
+        return mask
+
+    def to_dataframe(self, mask: np.ndarray = None) -> pd.DataFrame:
+        with self._lock:    # 与扩容、写入互斥，得到一致的副本
+            n = self.size
+            data = {
+                "conId": self.con_id[:n], "expiry": self.expiry[:n], "strike": self.strike[:n],
+                "right": self.right[:n], **{name: col[:n] for name, col in self.columns.items()},
+                "updated": self.updated[:n],
+            }
+            data = {k: v.copy() for k, v in data.items()}
+        df = pd.DataFrame(data)
+        return df[mask] if mask is not None else df
@@ -1,54 +1,466 @@
 # core/ibkr_dispatcher.py
 
+import heapq
+import itertools
 import threading
-from collections import defaultdict
+import time
+from concurrent.futures import Future, InvalidStateError
+
+from core.telemetry import (OUTCOME_CLOSED, OUTCOME_EMPTY, OUTCOME_ERROR, OUTCOME_OK, OUTCOME_TIMEOUT,
+                            RequestTelemetry)
+
+# ✅ 请求超时时 IBKRRequestError 使用的错误码（TWS 本身不会返回负数错误码）
+REQUEST_TIMEOUT_CODE = -1
+# ✅ 连接断开且请求无法重发时使用的错误码
+CONNECTION_LOST_CODE = -2
+# ✅ 流式请求的接收缓冲区溢出（消费者过慢）时使用的错误码
+STREAM_OVERFLOW_CODE = -3
+
+
+class IBKRRequestError(Exception):
+    """
+    TWS 针对某个 reqId 返回的错误（error 回调）。
+    """
+    def __init__(self, req_id: int, error_code: int, error_string: str):
+        super().__init__(f"reqId={req_id} error {error_code}: {error_string}")
+        self.req_id = req_id
+        self.error_code = error_code
+        self.error_string = error_string
+
+
+# ✅ 注册表分片数量：reqId 按取模落到不同分片，每个分片一把小锁，避免全局锁争用
+_SHARD_COUNT = 32
+
+
+class _RequestSlot:
+    """
+    单个请求的全部状态（一次创建，请求结束时整体移除）。
+    results.append 在 CPython 下是原子操作，填充结果时无需加锁。
+    """
+    __slots__ = ("event", "results", "handler", "callbacks", "done", "error", "kind", "registered", "first",
+                 "req_id", "wire_id", "resend")
+
+    def __init__(self, req_id: int, handler=None, use_event=True, kind=None, resend=None):
+        self.event = threading.Event() if use_event else None
+        self.results = []
+        self.handler = handler
+        self.callbacks = None   # 完成回调列表，仅 future / 流式请求才会创建
+        self.done = False
+        self.error = None       # IBKRRequestError，收到 error 回调时设置
+        self.kind = kind        # 请求类型（统计用）；结局记录后置为 None，保证每个请求只统计一次
+        self.registered = time.monotonic()
+        self.first = None       # 第一条结果到达的时间
+        self.req_id = req_id
+        self.wire_id = req_id   # 当前发往 TWS 的 reqId（重连重发后指向新的 reqId，注册表中同时登记两者）
+        self.resend = resend    # resend(connection, req_id)：重连后用新的 reqId 重新发送；None 表示不可重发
+
+
+class _DeadlineTimer:
+    """
+    单线程超时调度器：所有 future 请求共用一个 daemon 线程 + 最小堆，
+    避免每个请求各起一个 threading.Timer。
+    """
+    def __init__(self, on_expire):
+        self._on_expire = on_expire
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, req_id: int, timeout: float):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + timeout, next(self._seq), req_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ibkr-deadlines", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, req_id = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            self._on_expire(req_id)
+
 
 class IBKRDispatcher:
     """
     用于统一管理 IBKR 回调响应和请求编号。
     支持多类型请求（tick、contract、historical）的一致回调注册和同步等待。
+
+    线程模型：
+    - EClient reader 线程调用 set_result / signal_done / dispatch
+    - 调用方线程调用 next_id / register / wait / clear
+    reqId 由 itertools.count 原子分配；注册表按 reqId 分片，
+    写操作只锁对应分片，读操作（回调热路径）直接无锁查表。
+
+    每个请求按 kind（tick / historical / contractDetails / secDef ...）记录 register → 首条结果 → 结束的
+    延迟与结局（见 core.telemetry），通过 dispatcher.telemetry.snapshot() 读取；kind=None 的请求不统计。
+    统计按注册表分片保存，在结束请求的同一次分片加锁内写入，不引入额外的全局锁。
+    多个连接各用一个 dispatcher 时可以共用同一个 telemetry，并用 first_id 给每个连接分配互不重叠的 reqId 区间。
+
+    断线恢复：register / submit 时提供 resend 的请求在重连后由 replay() 以新的 reqId 重新发送，
+    新旧 reqId 指向同一个请求，调用方继续使用原 reqId；不可重发的请求由 abort_unreplayable() 立即以错误结束。
+    connection 为当前使用本 dispatcher 的连接（由连接方在连接建立后设置），submit 的 cancel 通过它发送。
     """
-    def __init__(self):
-        self._req_id = 1000
-        self._handlers = {}         # reqId -> callback
-        self._events = {}           # reqId -> threading.Event
-        self._results = defaultdict(list)  # reqId -> collected data list
+    def __init__(self, telemetry: RequestTelemetry = None, first_id: int = 1001):
+        self.first_id = first_id
+        self._id_counter = itertools.count(first_id)
+        self._shards = [{} for _ in range(_SHARD_COUNT)]      # reqId -> _RequestSlot
+        self._locks = [threading.Lock() for _ in range(_SHARD_COUNT)]
+        self._deadlines = _DeadlineTimer(self._expire)
+        self.telemetry = telemetry or RequestTelemetry()
+        self.telemetry.attach_in_flight(self._in_flight_by_kind)
+        self._stats = self.telemetry.add_shards(self._locks)    # 与 _locks 一一对应的统计分片
+        self.connection = None
 
     def next_id(self) -> int:
-        self._req_id += 1
-        return self._req_id
+        # next() 作用于 itertools.count 在持有 GIL 时一次完成，多线程下不会产生重复 id
+        return next(self._id_counter)
+
+    def _slot(self, req_id: int):
+        return self._shards[req_id % _SHARD_COUNT].get(req_id)
 
-    def register(self, req_id: int, handler=None, use_event=True):
-        if handler:
-            self._handlers[req_id] = handler
-        if use_event:
-            self._events[req_id] = threading.Event()
+    def register(self, req_id: int, handler=None, use_event=True, kind: str | None = "other", resend=None):
+        slot = _RequestSlot(req_id, handler, use_event, kind, resend)
+        idx = req_id % _SHARD_COUNT
+        with self._locks[idx]:
+            self._shards[idx][req_id] = slot
 
     def set_result(self, req_id: int, data):
-        self._results[req_id].append(data)
+        slot = self._slot(req_id)
+        if slot is not None:
+            # ⚠️ 未注册或已 clear 的 reqId（如 cancel 之后迟到的 tick）直接丢弃，避免泄漏
+            slot.results.append(data)
+            if slot.first is None:
+                slot.first = time.monotonic()
+
+    def _record_outcome(self, req_id: int, slot: _RequestSlot, outcome: str):
+        idx = slot.req_id % _SHARD_COUNT
+        with self._locks[idx]:
+            kind, slot.kind = slot.kind, None
+            if kind is not None:
+                self._report(idx, kind, slot, outcome)
+
+    def _report(self, idx: int, kind: str, slot: _RequestSlot, outcome: str = None):
+        """
+        上报请求结局：调用方持有分片锁 idx，并已把 slot.kind 置为 None（保证每个请求只上报一次）；
+        outcome 为 None 时按 error / 是否收到结果推断。缓冲型请求的首条结果延迟在这里一并上报。
+        """
+        if outcome is None:
+            if slot.error is not None:
+                outcome = OUTCOME_TIMEOUT if slot.error.error_code == REQUEST_TIMEOUT_CODE else OUTCOME_ERROR
+            else:
+                outcome = OUTCOME_OK if slot.first is not None else OUTCOME_EMPTY
+        first = slot.first - slot.registered if slot.first is not None and slot.handler is None else None
+        self._stats[idx].on_outcome(kind, outcome, time.monotonic() - slot.registered, first)
 
     def wait(self, req_id: int, timeout: int = 10) -> list:
-        event = self._events.get(req_id)
-        if event:
-            event.wait(timeout)
-        return self._results.get(req_id, [])
+        slot = self._slot(req_id)
+        if slot is None:
+            return []
+        if slot.event and not slot.event.wait(timeout):
+            # 同步等待超时：调用方拿到的是部分（通常为空）结果
+            self._record_outcome(req_id, slot, OUTCOME_TIMEOUT)
+        return slot.results
 
     def signal_done(self, req_id: int):
-        if req_id in self._events:
-            self._events[req_id].set()
+        slot = self._slot(req_id)
+        if slot is None:
+            return
+        if slot.event:
+            slot.event.set()
+        self._fire(req_id, slot)
+
+    def set_error(self, req_id: int, error_code: int, error_string: str) -> bool:
+        """
+        记录请求级错误并结束该请求（等待方立即返回，不必等到超时）。
+        返回 False 表示该 reqId 未注册（例如订单 id 或已结束的请求）。
+        """
+        slot = self._slot(req_id)
+        if slot is None:
+            return False
+        slot.error = IBKRRequestError(req_id, error_code, error_string)
+        self.signal_done(req_id)
+        return True
+
+    def error_of(self, req_id: int):
+        slot = self._slot(req_id)
+        return slot.error if slot is not None else None
+
+    def _fire(self, req_id: int, slot: _RequestSlot):
+        # ✅ 只在分片锁内做 "done" 状态切换和统计，回调在锁外执行
+        idx = slot.req_id % _SHARD_COUNT
+        with self._locks[idx]:
+            if slot.done:
+                return
+            slot.done = True
+            callbacks, slot.callbacks = slot.callbacks or [], []
+            kind, slot.kind = slot.kind, None
+            if kind is not None:
+                self._report(idx, kind, slot)
+        for callback in callbacks:
+            callback(slot.results)
+
+    def _expire(self, req_id: int):
+        slot = self._slot(req_id)
+        if slot is not None and not slot.done:
+            if slot.error is None:
+                slot.error = IBKRRequestError(req_id, REQUEST_TIMEOUT_CODE, "request timed out")
+            self._fire(req_id, slot)
+
+    def add_done_callback(self, req_id: int, callback):
+        """
+        注册完成回调 callback(results)：在 signal_done（或超时）时调用一次。
+        注意回调通常运行在 EClient reader 线程中，不能在回调里阻塞等待其它请求。
+        """
+        slot = self._slot(req_id)
+        if slot is None:
+            return
+        with self._locks[slot.req_id % _SHARD_COUNT]:
+            if not slot.done:
+                if slot.callbacks is None:
+                    slot.callbacks = []
+                slot.callbacks.append(callback)
+                return
+        callback(slot.results)
+
+    def submit(self, req_id: int, timeout: float = None, transform=None, raise_on_error=False,
+               kind: str | None = "other", resend=None, cancel=None, cancel_on_timeout=None) -> Future:
+        """
+        非阻塞注册请求，返回 concurrent.futures.Future。
+        - signal_done 时以 transform(results)（默认为 results 列表本身）完成 future，并自动 clear；
+        - 超过 timeout 秒仍未完成时，与 wait() 一致，以已收到的部分结果完成；
+        - raise_on_error=True 时，error 回调或超时会以 IBKRRequestError 完成 future；
+        - cancel(connection, wire_id)：结束后取消服务端请求（如 cancelMktData），重发过的请求使用最新的 reqId；
+        - cancel_on_timeout(connection, wire_id)：只在超时时取消（如 cancelHistoricalData，正常结束的请求无需取消，
+          超时的请求在 TWS 侧仍占用并发名额）。
+        """
+        future = Future()
+        self.register(req_id, use_event=False, kind=kind, resend=resend)
+        slot = self._slot(req_id)
 
-    def dispatch(self, req_id: int, *args):
-        handler = self._handlers.get(req_id)
-        if handler:
-            handler(*args)
+        def resolve(results):
+            self.clear(req_id)
+            if cancel is not None:
+                self._cancel(slot, cancel)
+            elif cancel_on_timeout is not None and slot.error is not None \
+                    and slot.error.error_code == REQUEST_TIMEOUT_CODE:
+                self._cancel(slot, cancel_on_timeout)
+            if raise_on_error and slot.error is not None:
+                _set_future(future, exception=slot.error)
+                return
+            try:
+                value = transform(results) if transform else results
+            except Exception as e:
+                _set_future(future, exception=e)
+            else:
+                _set_future(future, value)
+
+        self.add_done_callback(req_id, resolve)
+        if timeout is not None:
+            self._deadlines.schedule(req_id, timeout)
+        return future
+
+    def dispatch(self, req_id: int, *args) -> bool:
+        """
+        若该请求注册了 handler（流式模式），把回调数据直接交给 handler 并返回 True；
+        否则返回 False，由调用方走 set_result 缓冲路径。
+        """
+        slot = self._slot(req_id)
+        if slot is not None and slot.handler:
+            if slot.first is None:
+                # 流式请求可能长期不结束，首条数据的延迟立即记录（每个请求只加锁一次）
+                slot.first = time.monotonic()
+                idx = slot.req_id % _SHARD_COUNT
+                with self._locks[idx]:
+                    if slot.kind is not None:
+                        self._stats[idx].on_first_result(slot.kind, slot.first - slot.registered)
+            slot.handler(*args)
+            return True
+        return False
+
+    def _cancel(self, slot: _RequestSlot, cancel):
+        # 因断线失败的请求在新连接上并不存在，不需要取消
+        conn = self.connection
+        lost = slot.error is not None and slot.error.error_code == CONNECTION_LOST_CODE
+        if conn is not None and conn.isConnected() and not lost:
+            cancel(conn, slot.wire_id)
+
+    def wire_id(self, req_id: int) -> int:
+        """
+        请求当前在 TWS 上使用的 reqId（用于 cancelMktData 等）；未重发过或未注册时即 req_id 本身。
+        """
+        slot = self._slot(req_id)
+        return slot.wire_id if slot is not None else req_id
+
+    def is_replayable(self, req_id: int) -> bool:
+        slot = self._slot(req_id)
+        return slot is not None and _replayable(slot)
+
+    def abort_unreplayable(self) -> int:
+        """
+        连接断开时调用：已发往 TWS 但不可重发的请求立即以 CONNECTION_LOST_CODE 错误结束，
+        等待方不必空等到超时。kind=None 且没有 resend 的本地请求（如报价等待）不受影响。返回结束的请求数。
+        """
+        aborted = 0
+        for req_id, slot in self._iter_slots():
+            if req_id == slot.req_id and not slot.done and slot.resend is None and slot.kind is not None:
+                if self.set_error(req_id, CONNECTION_LOST_CODE, "connection lost"):
+                    aborted += 1
+        return aborted
+
+    def replay(self, connection) -> int:
+        """
+        连接重建（或 TWS 提示数据丢失）后调用：所有未结束的可重发请求分配新的 reqId 并调用 resend 重新发送。
+        新 reqId 登记到同一个请求上，回调照常找到它；缓冲型请求丢弃已收到的部分结果，避免与重发的数据重复。
+        已结束但仍在接收推送的流式请求（如回补完成后的 keepUpToDate 订阅）也会重发。
+        返回重发的请求数。
+        """
+        self.connection = connection
+        replayed = 0
+        for req_id, slot in self._iter_slots():
+            if req_id != slot.req_id or not _replayable(slot):
+                continue
+            new_id = self.next_id()
+            idx = new_id % _SHARD_COUNT
+            with self._locks[idx]:
+                self._shards[idx][new_id] = slot
+            old_id, slot.wire_id = slot.wire_id, new_id
+            if old_id != req_id:
+                self._unlink(old_id)
+            if slot.handler is None:
+                slot.results.clear()
+            slot.resend(connection, new_id)
+            replayed += 1
+        return replayed
+
+    def _unlink(self, req_id: int):
+        idx = req_id % _SHARD_COUNT
+        with self._locks[idx]:
+            self._shards[idx].pop(req_id, None)
 
     def clear(self, req_id: int):
-        self._handlers.pop(req_id, None)
-        self._events.pop(req_id, None)
-        self._results.pop(req_id, None)
+        idx = req_id % _SHARD_COUNT
+        with self._locks[idx]:
+            slot = self._shards[idx].pop(req_id, None)
+        if slot is not None and slot.wire_id != req_id:
+            self._unlink(slot.wire_id)
+        if slot is not None and slot.kind is not None:
+            # 未结束即被移除：流式订阅被取消
+            self._record_outcome(req_id, slot, OUTCOME_CLOSED)
+
+    def _in_flight_by_kind(self) -> dict:
+        counts = {}
+        for req_id, slot in self._iter_slots():
+            kind = slot.kind
+            if kind is not None and req_id == slot.req_id:
+                counts[kind] = counts.get(kind, 0) + 1
+        return counts
+
+    def detach_telemetry(self):
+        # 不再使用的 dispatcher（如连接池关闭）从共用的 telemetry 中移除在途统计，已有的计数并入 telemetry 保留
+        self.telemetry.detach_in_flight(self._in_flight_by_kind)
+        self.telemetry.remove_shards(self._stats)
+
+    def pending_count(self) -> int:
+        """
+        当前仍在注册表中的请求数量（用于监控和压测校验；重发过的请求只计一次）。
+        """
+        return sum(1 for shard in self._shards for req_id, slot in list(shard.items()) if req_id == slot.req_id)
+
+    def _iter_slots(self):
+        for idx, shard in enumerate(self._shards):
+            with self._locks[idx]:
+                items = list(shard.items())
+            yield from items
 
     def reset(self):
-        self._handlers.clear()
-        self._events.clear()
-        self._results.clear()
-        self._req_id = 1000
+        for idx, shard in enumerate(self._shards):
+            with self._locks[idx]:
+                shard.clear()
+        self._id_counter = itertools.count(self.first_id)
+
+
+def _replayable(slot: _RequestSlot) -> bool:
+    # 未结束的请求，或已正常结束但仍通过 handler 接收推送的流式订阅
+    return slot.resend is not None and (not slot.done or (slot.handler is not None and slot.error is None))
+
+
+def _set_future(future: Future, value=None, exception=None):
+    """
+    完成 future；调用方已 cancel 的 future 直接忽略。
+    """
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(value)
+    except InvalidStateError:
+        pass
+
+
+def chain_future(future: Future, fn) -> Future:
+    """
+    在 future 完成后以 fn(result) 生成新的 future。
+    fn 可以返回普通值，也可以返回另一个 Future（自动展开），用于串联 fallback 请求。
+    """
+    chained = Future()
+
+    def on_done(f: Future):
+        if f.cancelled():
+            chained.cancel()
+            return
+        if f.exception() is not None:
+            _set_future(chained, exception=f.exception())
+            return
+        try:
+            value = fn(f.result())
+        except Exception as e:
+            _set_future(chained, exception=e)
+            return
+        if isinstance(value, Future):
+            value.add_done_callback(on_inner_done)
+        else:
+            _set_future(chained, value)
+
+    def on_inner_done(inner: Future):
+        if inner.cancelled():
+            chained.cancel()
+        elif inner.exception() is not None:
+            _set_future(chained, exception=inner.exception())
+        else:
+            _set_future(chained, inner.result())
+
+    future.add_done_callback(on_done)
+    return chained
+
+
+def recover_future(future: Future, fn) -> Future:
+    """
+    future 以异常结束时用 fn(exception) 的返回值完成新的 future（fn 也可以继续抛出）；
+    正常结果原样透传。
+    """
+    recovered = Future()
+
+    def on_done(f: Future):
+        if f.cancelled():
+            recovered.cancel()
+            return
+        error = f.exception()
+        if error is None:
+            _set_future(recovered, f.result())
+            return
+        try:
+            _set_future(recovered, fn(error))
+        except Exception as e:
+            _set_future(recovered, exception=e)
+
+    future.add_done_callback(on_done)
+    return recovered
@@ -0,0 +1,92 @@
+# core/memo.py
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class SingleFlightCache:
+    """
+    进程内记忆化缓存：TTL + LRU 容量上限 + single-flight 合并。
+
+    - 同一 key 的并发请求只触发一次 loader，其余调用方共享同一个 Future
+    - 成功结果缓存 ttl 秒；空结果（如合约不存在）只缓存 negative_ttl 秒
+    - loader 的 Future 以异常结束时不缓存（超时、断线等临时失败下次重试）
+    注意：缓存的值在调用方之间共享，不要原地修改。
+    """
+    def __init__(self, maxsize: int = 4096, ttl: float = 6 * 3600, negative_ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._in_flight = {}            # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_load(self, key, loader) -> Future:
+        """
+        loader() 必须返回 Future；返回的 Future 以缓存值或 loader 结果完成。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    future = Future()
+                    future.set_result(entry[1])
+                    return future
+                del self._entries[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            self.misses += 1
+            future = self._in_flight[key] = Future()
+
+        try:
+            source = loader()
+        except Exception as e:
+            self._settle(key, future, exception=e)
+            return future
+
+        def on_done(f: Future):
+            if f.exception() is not None:
+                self._settle(key, future, exception=f.exception())
+            else:
+                self._settle(key, future, f.result())
+
+        source.add_done_callback(on_done)
+        return future
+
+    def _settle(self, key, future: Future, value=None, exception=None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if exception is None:
+                ttl = self.ttl if value else self.negative_ttl
+                self._entries[key] = (time.monotonic() + ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(value)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,151 @@
+# core/pacing.py
+
+import re
+import threading
+import time
+from collections import deque
+
+# ✅ IBKR 历史数据限速规则（参见 TWS API 文档 "Historical Data Limitations"）
+MAX_OPEN_HISTORICAL_REQUESTS = 50       # 同时未完成的历史数据请求上限
+IDENTICAL_REQUEST_INTERVAL = 15         # 相同请求（合约+参数完全一致）的最小间隔（秒）
+SAME_CONTRACT_REQUESTS = 5              # 同一合约 2 秒内最多 5 个请求（第 6 个即违规）
+SAME_CONTRACT_WINDOW = 2
+SMALL_BAR_WINDOW_REQUESTS = 60          # 30 秒及以下的小周期K线：10 分钟内最多 60 个请求
+SMALL_BAR_WINDOW_SECONDS = 600
+API_MESSAGES_PER_SECOND = 45            # API 全局消息速率上限为 50/s，留一点余量
+
+# ✅ 错误码 162 的文本中包含此片段时表示触发了限速
+PACING_VIOLATION_TEXT = "pacing violation"
+
+
+def is_small_bar(bar_size: str) -> bool:
+    """
+    判断 barSizeSetting 是否属于严格限速的小周期（<= 30 secs）。
+    """
+    match = re.match(r"\s*(\d+)\s*secs?\b", bar_size)
+    return bool(match) and int(match.group(1)) <= 30
+
+
+def is_pacing_violation(error_code: int, error_string: str) -> bool:
+    return error_code == 162 and PACING_VIOLATION_TEXT in (error_string or "").lower()
+
+
+class TokenBucket:
+    """
+    令牌桶：容量 capacity，每秒补充 rate 个令牌。
+    任意 W 秒窗口内最多放行 capacity + rate * W 个请求。
+    """
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def delay(self, now: float) -> float:
+        """
+        距离下一个令牌可用还需等待的秒数（0 表示立即可用）。
+        """
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+
+class SlidingWindowLimiter:
+    """
+    严格的滑动窗口计数：任意 window 秒内最多 limit 次。
+    用于 "10 分钟 60 个请求" 这种不允许突发叠加的硬性规则。
+    """
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._stamps = deque()
+
+    def delay(self, now: float) -> float:
+        while self._stamps and now - self._stamps[0] >= self.window:
+            self._stamps.popleft()
+        if len(self._stamps) < self.limit:
+            return 0.0
+        return self._stamps[0] + self.window - now
+
+    def take(self, now: float):
+        self._stamps.append(now)
+
+
+class HistoricalPacer:
+    """
+    历史数据请求调度器：综合所有限速规则，告诉调用方某个请求现在能否发出。
+
+    用法：
+        delay = pacer.reserve(request_key, contract_key, small_bar)
+        if delay == 0: 发送请求 ... 完成后 pacer.release()
+        else: delay 秒后再试
+    """
+    def __init__(self, max_open: int = MAX_OPEN_HISTORICAL_REQUESTS):
+        self.max_open = max_open
+        self._open = 0
+        self._lock = threading.Lock()
+        self._global = TokenBucket(API_MESSAGES_PER_SECOND, API_MESSAGES_PER_SECOND)
+        self._small_bar_window = SlidingWindowLimiter(SMALL_BAR_WINDOW_REQUESTS, SMALL_BAR_WINDOW_SECONDS)
+        # 同一合约 2 秒内 <= 5 个：容量 3、每秒补 1 个，满足 3 + 1 * 2 <= 5
+        self._per_contract = {}
+        self._last_identical = {}
+        self._cooldown_until = 0.0
+
+    def _contract_bucket(self, contract_key) -> TokenBucket:
+        bucket = self._per_contract.get(contract_key)
+        if bucket is None:
+            bucket = self._per_contract[contract_key] = TokenBucket(3, 1.0)
+        return bucket
+
+    def reserve(self, request_key, contract_key, small_bar: bool = False) -> float:
+        """
+        尝试为请求占用一个发送名额。返回 0 表示已占用（必须在完成后 release），
+        否则返回建议的等待秒数，此时不占用任何名额。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._open >= self.max_open:
+                return 0.05     # 等待某个在途请求完成
+            bucket = self._contract_bucket(contract_key)
+            last = self._last_identical.get(request_key)
+            delay = max(
+                self._cooldown_until - now,
+                (last + IDENTICAL_REQUEST_INTERVAL - now) if last is not None else 0.0,
+                self._global.delay(now),
+                bucket.delay(now),
+                self._small_bar_window.delay(now) if small_bar else 0.0,
+            )
+            if delay > 0:
+                return delay
+
+            self._global.take(now)
+            bucket.take(now)
+            if small_bar:
+                self._small_bar_window.take(now)
+            self._last_identical[request_key] = now
+            self._open += 1
+            return 0.0
+
+    def release(self):
+        with self._lock:
+            self._open = max(0, self._open - 1)
+
+    def penalize(self, seconds: float):
+        """
+        收到限速违规后全局冷却一段时间，避免继续触发。
+        """
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    @property
+    def open_requests(self) -> int:
+        return self._open
@@ -0,0 +1,183 @@
+# core/quote_cache.py
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# ✅ IB tick 类型（含延迟行情对应的 tick 类型）
+_PRICE_FIELDS = {1: "bid", 2: "ask", 4: "last", 9: "close", 66: "bid", 67: "ask", 68: "last", 75: "close"}
+_SIZE_FIELDS = {0: "bid_size", 3: "ask_size", 5: "last_size", 69: "bid_size", 70: "ask_size", 71: "last_size"}
+
+# ✅ 默认最多同时占用的行情线路数（IB 默认账户为 100 条，给其它订阅留余量）
+DEFAULT_MAX_LINES = 80
+
+
+class QuoteRecord:
+    """
+    单个合约的实时报价记录，由 tickPrice / tickSize 原地更新。
+    updated 为最近一次有效价格 tick 的 time.monotonic()，用于判断报价是否陈旧。
+    """
+    __slots__ = ("key", "req_id", "bid", "ask", "last", "close", "bid_size", "ask_size", "last_size",
+                 "updated", "refcount", "error", "closed", "_waiters", "_lock")
+
+    def __init__(self, key):
+        self.key = key
+        self.req_id = None      # 订阅返回前为 None（pending）
+        self.closed = False     # 已从缓存移除；订阅返回时发现已关闭则立即退订
+        self.bid = self.ask = self.last = self.close = math.nan
+        self.bid_size = self.ask_size = self.last_size = math.nan
+        self.updated = 0.0
+        self.refcount = 0
+        self.error = None
+        self._waiters = []      # 等待下一个价格 tick 的回调
+        self._lock = threading.Lock()
+
+    def on_tick(self, kind: str, tick_type: int, value):
+        if kind == "price":
+            field = _PRICE_FIELDS.get(tick_type)
+            if field is None or value <= 0:
+                return
+            setattr(self, field, value)
+            if field != "close":    # 收盘价不代表当前价格，不刷新时间戳
+                with self._lock:
+                    self.updated = time.monotonic()
+                    waiters, self._waiters = self._waiters, []
+                for waiter in waiters:
+                    waiter()
+        elif kind == "size":
+            field = _SIZE_FIELDS.get(tick_type)
+            if field is not None:
+                setattr(self, field, float(value))
+
+    def on_error(self, error):
+        with self._lock:
+            self.error = error
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def add_waiter(self, callback, since: float):
+        """
+        在 updated 晚于 since 的下一个价格 tick（或出错）时调用 callback()；
+        若此后已经有新 tick 到达则立即调用。
+        """
+        with self._lock:
+            if self.updated <= since and self.error is None:
+                self._waiters.append(callback)
+                return
+        callback()
+
+    def price(self) -> float:
+        """
+        当前价格：优先成交价，其次买卖中间价，再次单边报价；都没有时返回 NaN。
+        """
+        if self.last > 0:
+            return self.last
+        if self.bid > 0 and self.ask > 0:
+            return (self.bid + self.ask) / 2
+        if self.bid > 0:
+            return self.bid
+        if self.ask > 0:
+            return self.ask
+        return math.nan
+
+    def age(self) -> float:
+        return time.monotonic() - self.updated if self.updated else math.inf
+
+
+class QuoteCache:
+    """
+    基于长期流式订阅（reqMktData snapshot=False）的报价缓存。
+
+    - acquire(key, contract)：引用计数 +1，首次使用时打开行情线路
+    - release(record)：引用计数 -1；线路保持打开（空闲），后续读取直接命中内存
+    - 线路数达到 max_lines 时按 LRU 关闭空闲线路；全部在用时 acquire 返回 None
+    - 订阅出错（如无行情权限、合约不存在）时线路自动关闭，下次 acquire 重新订阅
+
+    subscribe(contract, record) -> req_id 与 unsubscribe(record) 由连接层注入。
+    记录在订阅返回前就已放入缓存（pending，req_id 为 None）：这期间被 close / LRU 淘汰的记录
+    只标记 closed，由 acquire 在订阅返回后退订，线路不会泄漏。
+    """
+    def __init__(self, subscribe, unsubscribe, max_lines: int = DEFAULT_MAX_LINES):
+        self._subscribe = subscribe
+        self._unsubscribe = unsubscribe
+        self.max_lines = max_lines
+        self._records = OrderedDict()   # key -> QuoteRecord（按最近使用排序）
+        self._lock = threading.Lock()
+
+    def acquire(self, key, contract) -> QuoteRecord | None:
+        to_close = []
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record.error is None:
+                record.refcount += 1
+                self._records.move_to_end(key)
+                return record
+            if record is not None:
+                to_close.append(self._detach(key))
+            while len(self._records) >= self.max_lines:
+                idle = next((r for r in self._records.values() if r.refcount == 0), None)
+                if idle is None:
+                    break
+                to_close.append(self._detach(idle.key))
+            if len(self._records) >= self.max_lines:
+                record = None
+            else:
+                record = QuoteRecord(key)
+                record.refcount = 1
+                self._records[key] = record
+
+        for old in to_close:
+            if old is not None:
+                self._unsubscribe(old)
+        if record is None:
+            print(f"⚠️ 行情线路已达上限 {self.max_lines}，且全部在使用中")
+            return None
+        try:
+            req_id = self._subscribe(contract, record)
+        except BaseException:
+            with self._lock:
+                if self._records.get(key) is record:
+                    self._detach(key)
+            raise
+        with self._lock:
+            record.req_id = req_id
+            closed = record.closed
+        if closed:
+            # 订阅期间已被 close / 淘汰：此时才有 req_id，可以退订
+            self._unsubscribe(record)
+        return record
+
+    def _detach(self, key) -> QuoteRecord | None:
+        """
+        调用方持有 self._lock：从缓存移除并标记 closed。返回需要由调用方退订的记录；
+        pending 的记录返回 None，由 acquire 在订阅返回后退订（同一把锁内判定，只会退订一次）。
+        """
+        record = self._records.pop(key)
+        record.closed = True
+        return record if record.req_id is not None else None
+
+    def release(self, record: QuoteRecord):
+        with self._lock:
+            record.refcount = max(0, record.refcount - 1)
+
+    def get(self, key) -> QuoteRecord | None:
+        return self._records.get(key)
+
+    def close(self, key):
+        with self._lock:
+            record = self._detach(key) if key in self._records else None
+        if record is not None:
+            self._unsubscribe(record)
+
+    def close_all(self):
+        with self._lock:
+            records = [self._detach(key) for key in list(self._records)]
+        for record in records:
+            if record is not None:
+                self._unsubscribe(record)
+
+    @property
+    def open_lines(self) -> int:
+        return len(self._records)
@@ -0,0 +1,95 @@
+# core/reconnect.py
+
+import threading
+import time
+
+# ✅ 默认重连退避间隔（秒）：第一次立即重试，之后逐步放慢，最后固定为 10 秒一次
+DEFAULT_RECONNECT_DELAYS = (0.0, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+class ReconnectSupervisor:
+    """
+    监控一个连接，断线后在后台线程中按退避间隔重连：
+    - connection_lost(conn)：连接断开（connectionClosed 回调或 504 等错误码）时调用，可重复调用，只触发一次重连；
+      先同步调用 on_lost(conn)（如立即结束不可重发的请求），再启动重连线程；
+    - connect()：建立新连接，失败返回 None 或抛出异常，按 delays 退避后重试，直到成功或 stop()；
+    - 成功后调用 on_reconnected(conn)（如以新的 reqId 重发请求和订阅）；
+    - restored(conn)：socket 未断但服务端数据已丢失（TWS 1101）时直接调用 on_reconnected。
+    stats 记录断线次数、重连次数和最近一次恢复耗时。
+    """
+    def __init__(self, connect, on_lost=None, on_reconnected=None, delays=DEFAULT_RECONNECT_DELAYS,
+                 name: str = "ibkr-reconnect"):
+        self._connect = connect
+        self._on_lost = on_lost
+        self._on_reconnected = on_reconnected
+        self.delays = tuple(delays) or (0.0,)
+        self.name = name
+        self._current = None
+        self._reconnecting = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.disconnects = 0
+        self.reconnects = 0
+        self.last_recovery = None      # 最近一次从断线到重连完成的耗时（秒）
+
+    def watch(self, conn):
+        # 登记当前连接；只有当前连接的断线通知才会触发重连
+        with self._lock:
+            self._current = conn
+
+    @property
+    def reconnecting(self) -> bool:
+        return self._reconnecting
+
+    def connection_lost(self, conn=None, reason: str = ""):
+        with self._lock:
+            if self._stop.is_set() or self._reconnecting or (conn is not None and conn is not self._current):
+                return
+            self._reconnecting = True
+            self._current = None
+            self.disconnects += 1
+        print(f"⚠️ IBKR 连接断开（{reason or '未知原因'}），开始自动重连")
+        if self._on_lost is not None:
+            self._on_lost(conn)
+        self._thread = threading.Thread(target=self._run, args=(time.monotonic(),), name=self.name, daemon=True)
+        self._thread.start()
+
+    def restored(self, conn):
+        if self._on_reconnected is not None and not self._stop.is_set():
+            self._on_reconnected(conn)
+
+    def _run(self, lost_at: float):
+        attempt = 0
+        while not self._stop.wait(self.delays[min(attempt, len(self.delays) - 1)]):
+            attempt += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                print(f"❌ 第 {attempt} 次重连失败: {e}")
+                conn = None
+            if conn is None:
+                continue
+            if self._stop.is_set():
+                return
+            with self._lock:
+                self._current = conn
+                self._reconnecting = False
+                self.reconnects += 1
+                self.last_recovery = time.monotonic() - lost_at
+            print(f"✅ IBKR 已重连（第 {attempt} 次尝试，耗时 {self.last_recovery:.2f}s）")
+            if self._on_reconnected is not None:
+                self._on_reconnected(conn)
+            return
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+
+    @property
+    def stats(self) -> dict:
+        return {"disconnects": self.disconnects, "reconnects": self.reconnects, "reconnecting": self._reconnecting,
+                "last_recovery": self.last_recovery}
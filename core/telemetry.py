@@ -0,0 +1,319 @@
+# core/telemetry.py
+
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# ✅ 延迟直方图的桶上界（秒）：1ms 起按 √2 倍递增到约 65s，共 33 个桶 + 1 个 +Inf 桶，内存固定
+LATENCY_BOUNDS = tuple(0.001 * 2 ** (i / 2) for i in range(33))
+
+# ✅ 请求结局
+OUTCOME_OK = "ok"               # 正常结束且至少收到一条结果
+OUTCOME_EMPTY = "empty"         # 正常结束但没有任何结果（如 wait 返回空列表）
+OUTCOME_ERROR = "error"         # error 回调结束
+OUTCOME_TIMEOUT = "timeout"     # 超时（wait 超时或 submit 的 deadline 到期）
+OUTCOME_CLOSED = "closed"       # 未结束即被 clear（流式订阅取消）
+OUTCOMES = (OUTCOME_OK, OUTCOME_EMPTY, OUTCOME_ERROR, OUTCOME_TIMEOUT, OUTCOME_CLOSED)
+
+# 默认导出目录（data/ 不纳入版本控制）
+DEFAULT_TELEMETRY_DIR = Path(__file__).resolve().parents[1] / "data" / "telemetry"
+
+
+class LatencyHistogram:
+    """
+    对数分桶的流式延迟直方图：每次 observe 只做一次二分查找和计数，分位数由桶边界估算（误差不超过一个桶，约 ±41%）。
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        估算分位数：返回第一个累计计数达到 q 的桶的上界（最后一个桶返回观测到的最大值）。
+        """
+        if self.count == 0:
+            return float("nan")
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= target and n:
+                return min(LATENCY_BOUNDS[i], self.max) if i < len(LATENCY_BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        # 没有样本时统计值为 None（JSON 中为 null，而不是非标准的 NaN）
+        empty = self.count == 0
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": None if empty else self.total / self.count,
+            "max": self.max,
+            "p50": None if empty else self.quantile(0.5),
+            "p90": None if empty else self.quantile(0.9),
+            "p99": None if empty else self.quantile(0.99),
+            "buckets": list(self.counts),
+        }
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+
+class _KindStats:
+    __slots__ = ("outcomes", "first_result", "done")
+
+    def __init__(self):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.first_result = LatencyHistogram()     # register → 第一条结果
+        self.done = LatencyHistogram()             # register → 结束（不含超时与 closed）
+
+    def merge(self, other: "_KindStats"):
+        for outcome, n in other.outcomes.items():
+            self.outcomes[outcome] += n
+        self.first_result.merge(other.first_result)
+        self.done.merge(other.done)
+
+
+class TelemetryShard:
+    """
+    一个分片的统计（kind -> _KindStats）。on_outcome / on_first_result 本身不加锁，
+    调用方必须持有 lock：IBKRDispatcher 的每个注册表分片对应一个 TelemetryShard，共用该分片的锁，
+    请求结束时的统计与 done 状态切换在同一次加锁内完成，不同分片之间没有共享的锁。
+    """
+    __slots__ = ("lock", "kinds")
+
+    def __init__(self, lock: threading.Lock = None):
+        self.lock = lock or threading.Lock()
+        self.kinds = {}
+
+    def _stats(self, kind: str) -> _KindStats:
+        stats = self.kinds.get(kind)
+        if stats is None:
+            stats = self.kinds[kind] = _KindStats()
+        return stats
+
+    def on_first_result(self, kind: str, latency: float):
+        self._stats(kind).first_result.observe(latency)
+
+    def on_outcome(self, kind: str, outcome: str, latency: float, first_latency: float = None):
+        stats = self._stats(kind)
+        stats.outcomes[outcome] += 1
+        if first_latency is not None:
+            stats.first_result.observe(first_latency)
+        if outcome not in (OUTCOME_TIMEOUT, OUTCOME_CLOSED):
+            stats.done.observe(latency)
+
+    def merge_into(self, kinds: dict):
+        with self.lock:
+            for kind, stats in self.kinds.items():
+                target = kinds.get(kind)
+                if target is None:
+                    target = kinds[kind] = _KindStats()
+                target.merge(stats)
+
+    def clear(self):
+        with self.lock:
+            self.kinds.clear()
+
+
+class RequestTelemetry:
+    """
+    按请求类型（tick / historical / contractDetails / secDef ...）统计：
+    - 各结局计数（ok / empty / error / timeout / closed）与当前在途数量
+    - register → 首条结果、register → 结束 的延迟直方图
+    每个类型占用固定大小的内存，与请求数量无关。
+
+    计数和直方图按分片保存（add_shards 为每个 dispatcher 分片创建一个 TelemetryShard），
+    IBKRDispatcher 在请求结束时于自己的分片锁内写入，没有全局统计锁；snapshot() / to_prometheus() 时再合并。
+    在途数量由 attach_in_flight 注册的回调（返回 {kind: 在途数量}）汇总，多个 dispatcher 可以共用一个实例。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()           # 只保护分片列表的增删，不在请求路径上
+        self._shards = []
+        self._direct = TelemetryShard()         # 不经过 dispatcher 的直接上报（on_outcome / on_first_result）
+        self._retired = TelemetryShard()        # 已移除的 dispatcher 留下的统计
+        self.started_at = time.time()
+        self._in_flight_sources = []
+
+    def add_shards(self, locks: list) -> list:
+        """
+        为一组分片锁各创建一个 TelemetryShard 并登记，返回与 locks 对齐的列表。
+        """
+        shards = [TelemetryShard(lock) for lock in locks]
+        with self._lock:
+            self._shards.extend(shards)
+        return shards
+
+    def remove_shards(self, shards: list):
+        # 移除不再使用的分片，已有的统计并入 _retired，不会丢失
+        with self._lock:
+            self._shards = [shard for shard in self._shards if shard not in shards]
+        retired = {}
+        for shard in shards:
+            shard.merge_into(retired)
+        with self._retired.lock:
+            for kind, stats in retired.items():
+                self._retired._stats(kind).merge(stats)
+
+    def attach_in_flight(self, source):
+        self._in_flight_sources.append(source)
+
+    def detach_in_flight(self, source):
+        if source in self._in_flight_sources:
+            self._in_flight_sources.remove(source)
+
+    def _in_flight(self) -> dict:
+        total = {}
+        for source in list(self._in_flight_sources):
+            for kind, n in source().items():
+                total[kind] = total.get(kind, 0) + n
+        return total
+
+    def on_first_result(self, kind: str, latency: float):
+        with self._direct.lock:
+            self._direct.on_first_result(kind, latency)
+
+    def on_outcome(self, kind: str, outcome: str, latency: float, first_latency: float = None):
+        with self._direct.lock:
+            self._direct.on_outcome(kind, outcome, latency, first_latency)
+
+    def _all_shards(self) -> list:
+        with self._lock:
+            return [self._direct, self._retired, *self._shards]
+
+    def reset(self):
+        for shard in self._all_shards():
+            shard.clear()
+        self.started_at = time.time()
+
+    def snapshot(self) -> dict:
+        """
+        合并所有分片后的统计：{"started_at", "timestamp", "bucket_bounds", "kinds": {kind: {...}}}。
+        每个分片在自己的锁内复制，分片之间不要求同一时刻。
+        """
+        in_flight = self._in_flight()
+        merged = {}
+        for shard in self._all_shards():
+            shard.merge_into(merged)
+        for kind in in_flight:
+            merged.setdefault(kind, _KindStats())
+        kinds = {
+            kind: {
+                "in_flight": in_flight.get(kind, 0),
+                "outcomes": dict(stats.outcomes),
+                "first_result": stats.first_result.snapshot(),
+                "done": stats.done.snapshot(),
+            }
+            for kind, stats in merged.items()
+        }
+        return {"started_at": self.started_at, "timestamp": time.time(), "bucket_bounds": list(LATENCY_BOUNDS),
+                "kinds": kinds}
+
+    def to_prometheus(self, prefix: str = "ibkr") -> str:
+        """
+        Prometheus 文本格式（node_exporter textfile collector 可直接读取）。
+        """
+        snap = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_requests_in_flight Requests registered and not yet finished.",
+            f"# TYPE {prefix}_requests_in_flight gauge",
+        ]
+        for kind, stats in snap["kinds"].items():
+            lines.append(f'{prefix}_requests_in_flight{{kind="{kind}"}} {stats["in_flight"]}')
+        lines += [
+            f"# HELP {prefix}_requests_total Finished requests by outcome.",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for kind, stats in snap["kinds"].items():
+            for outcome, n in stats["outcomes"].items():
+                lines.append(f'{prefix}_requests_total{{kind="{kind}",outcome="{outcome}"}} {n}')
+        lines += [
+            f"# HELP {prefix}_request_latency_seconds Latency from register to first result / done.",
+            f"# TYPE {prefix}_request_latency_seconds histogram",
+        ]
+        for kind, stats in snap["kinds"].items():
+            for stage in ("first_result", "done"):
+                hist = stats[stage]
+                labels = f'kind="{kind}",stage="{stage}"'
+                cumulative = 0
+                for bound, n in zip(LATENCY_BOUNDS, hist["buckets"]):
+                    cumulative += n
+                    lines.append(f'{prefix}_request_latency_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{prefix}_request_latency_seconds_bucket{{{labels},le="+Inf"}} {hist["count"]}')
+                lines.append(f"{prefix}_request_latency_seconds_sum{{{labels}}} {hist['sum']:.6f}")
+                lines.append(f"{prefix}_request_latency_seconds_count{{{labels}}} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, json_path: Path = None, prom_path: Path = None):
+        """
+        写出 JSON 快照和 / 或 Prometheus 文本；先写临时文件再替换，抓取方不会读到半个文件。
+        """
+        if json_path is not None:
+            _atomic_write(Path(json_path), json.dumps(self.snapshot(), indent=2))
+        if prom_path is not None:
+            _atomic_write(Path(prom_path), self.to_prometheus())
+
+
+def _atomic_write(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+class TelemetryDumper:
+    """
+    每 interval 秒把 RequestTelemetry 写到 json_path / prom_path（默认 data/telemetry/ 下），
+    供本地抓取程序读取；stop() 时再写一次最终结果。
+    """
+    def __init__(self, telemetry: RequestTelemetry, interval: float = 15.0,
+                 json_path: Path = DEFAULT_TELEMETRY_DIR / "ibkr_requests.json",
+                 prom_path: Path = DEFAULT_TELEMETRY_DIR / "ibkr_requests.prom"):
+        self.telemetry = telemetry
+        self.interval = interval
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self._stop = threading.Event()
+        self._thread = None
+
+    def dump_once(self):
+        self.telemetry.dump(self.json_path, self.prom_path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump_once()
+            except OSError as e:
+                print(f"❌ 请求统计写出失败: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ibkr-telemetry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.dump_once()
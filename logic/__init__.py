@@ -1,2 +1,4 @@
 from .bear_trend_bar_static import apply_bear_trend_bar
-from .bull_trend_bar_static import apply_bull_trend_bar
\ No newline at end of file
+from .bull_trend_bar_static import apply_bull_trend_bar
+from .bear_trend_bar_realtime import BearTrendBarDetector
+from .bull_trend_bar_realtime import BullTrendBarDetector
@@ -1,5 +1,5 @@
-from IBKR_Connection import connect_ibkr
 from utils.definitions import load_definitions
+from logic.trend_bar_engine import compute_trend_bar_flags
 import pandas as pd
 import numpy as np
 
@@ -9,28 +9,18 @@ BEAR_CONFIG = config["BearTrendBar"]
 BODY_RATIO_THRESHOLD = BEAR_CONFIG["conditions"]["body_ratio"]["value"]
 LOOKBACK_BARS = BEAR_CONFIG["conditions"]["total_range_comparison"]["lookback_period"]
 
-def is_bear_trend_bar(idx, row, df):
-    if idx < LOOKBACK_BARS:
-        return False  
-
-    body = row["open"] - row["close"]  # Bearish body
-    total_range = row["high"] - row["low"]
-
-    if total_range == 0:
-        return False  
-
-    body_ratio = abs(body) / total_range
-
-    avg_total_range = (df.loc[idx-LOOKBACK_BARS:idx-1, "high"] - df.loc[idx-LOOKBACK_BARS:idx-1, "low"]).mean()
-
-    return (
-        row["close"] < row["open"] and
-        body_ratio >= BODY_RATIO_THRESHOLD and 
-        total_range > avg_total_range
+def apply_bear_trend_bar(df, body_ratio=None, lookback=None):
+    """
+    在DataFrame上应用Bear Trend Bar标识（向量化，不修改传入的 df）
+    body_ratio / lookback 默认取 definitions.json 中的配置，可在参数扫描时覆盖。
+    """
+    _, bear = compute_trend_bar_flags(
+        df["open"].to_numpy(), df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy(),
+        bull_body_ratio=np.inf,
+        bear_body_ratio=BODY_RATIO_THRESHOLD if body_ratio is None else body_ratio,
+        bull_lookback=LOOKBACK_BARS if lookback is None else lookback,
+        bear_lookback=LOOKBACK_BARS if lookback is None else lookback,
     )
-
-def apply_bear_trend_bar(df):
-    df = df.reset_index(drop=False)
-    df["BearTrendBar"] = [is_bear_trend_bar(i, row, df) for i, row in df.iterrows()]
-    df.set_index("date", inplace=True)
+    df = df.copy()
+    df["BearTrendBar"] = bear
     return df
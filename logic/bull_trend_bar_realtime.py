@@ -0,0 +1,39 @@
+from utils.definitions import load_definitions
+from logic.trend_bar_engine import RangeWindow
+
+# ✅ Load Configuration
+config = load_definitions()
+BULL_CONFIG = config["BullTrendBar"]
+BODY_RATIO_THRESHOLD = BULL_CONFIG["conditions"]["body_ratio"]["value"]
+LOOKBACK_BARS = BULL_CONFIG["conditions"]["total_range_comparison"]["lookback_period"]
+
+class BullTrendBarDetector:
+    """
+    实时 Bull Trend Bar 检测器：每次输入一根K线，O(1) 计算、固定内存。
+    与 apply_bull_trend_bar 在同一序列上的结果一致。每个标的 / 周期使用一个实例。
+    """
+    __slots__ = ("body_ratio", "_window")
+
+    def __init__(self, body_ratio=None, lookback=None):
+        self.body_ratio = BODY_RATIO_THRESHOLD if body_ratio is None else body_ratio
+        self._window = RangeWindow(LOOKBACK_BARS if lookback is None else lookback)
+
+    def update(self, open_: float, high: float, low: float, close: float) -> bool:
+        """
+        输入一根已完成的K线，返回它是否为 Bull Trend Bar。
+        """
+        total_range = high - low
+        avg_total_range = self._window.mean()
+        self._window.push(total_range)
+
+        if total_range == 0:
+            return False
+        body = close - open_
+        return (
+            body > 0
+            and body / total_range >= self.body_ratio
+            and total_range > avg_total_range
+        )
+
+    def reset(self):
+        self._window.reset()
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from utils.definitions import load_definitions
+from logic.trend_bar_engine import compute_trend_bar_flags
 
 # ✅ Load Configuration
 config = load_definitions()
@@ -8,47 +9,20 @@ BULL_CONFIG = config["BullTrendBar"]
 BODY_RATIO_THRESHOLD = BULL_CONFIG["conditions"]["body_ratio"]["value"]
 LOOKBACK_BARS = BULL_CONFIG["conditions"]["total_range_comparison"]["lookback_period"]
 
-def is_bull_trend_bar(idx, row, df):
+def apply_bull_trend_bar(df, body_ratio=None, lookback=None):
     """
-    根据定义识别单根Bull Trend Bar (多头趋势柱)
+    在DataFrame上应用Bull Trend Bar标识（向量化，不修改传入的 df）
+    body_ratio / lookback 默认取 definitions.json 中的配置，可在参数扫描时覆盖。
     """
-    if idx < LOOKBACK_BARS:
-        return False  # 前面数据不足时不处理
-
-    body = row["close"] - row["open"]
-    total_range = row["high"] - row["low"]
-
-    if total_range == 0:
-        return False
-
-    body_ratio = abs(body) / total_range
-
-    avg_total_range = (
-        df.loc[idx - LOOKBACK_BARS:idx - 1, "high"] - 
-        df.loc[idx - LOOKBACK_BARS:idx - 1, "low"]
-    ).mean()
-
-    return (
-        row["close"] > row["open"]
-        and body_ratio >= BODY_RATIO_THRESHOLD
-        and total_range > avg_total_range
+    bull, _ = compute_trend_bar_flags(
+        df["open"].to_numpy(), df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy(),
+        bull_body_ratio=BODY_RATIO_THRESHOLD if body_ratio is None else body_ratio,
+        bear_body_ratio=np.inf,
+        bull_lookback=LOOKBACK_BARS if lookback is None else lookback,
+        bear_lookback=LOOKBACK_BARS if lookback is None else lookback,
     )
-
-def apply_bull_trend_bar(df):
-    """
-    在DataFrame上应用Bull Trend Bar标识
-    """
-    # 为避免索引问题，首先重置索引为整数，日期变成列
-    df = df.reset_index(drop=False)
-
-    df["BullTrendBar"] = [
-        is_bull_trend_bar(idx, row, df)
-        for idx, row in df.iterrows()
-    ]
-
-    # 重新设置日期为索引
-    df.set_index("date", inplace=True)
-    
+    df = df.copy()
+    df["BullTrendBar"] = bull
     return df
 
 #直接运行 测试#
@@ -0,0 +1,170 @@
+# logic/rule_compiler.py
+
+import ast
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+from logic.trend_bar_engine import prior_mean
+from utils.definitions import load_definitions
+
+# ✅ 公式中可直接使用的派生序列（名称 -> 表达式）
+DERIVED_SERIES = {
+    "total_range": "high - low",
+    "body": "close - open",
+}
+
+# avg_<序列名>_last_N_bars：前 N 根K线（不含当前）的平均值，N 取该条件的 lookback_period
+_ROLLING_AVG = re.compile(r"^avg_(\w+)_last_N_bars$")
+
+_COMPARE_OPS = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne,
+}
+_AST_COMPARE = {ast.Gt: ">", ast.GtE: ">=", ast.Lt: "<", ast.LtE: "<=", ast.Eq: "==", ast.NotEq: "!="}
+
+
+def _safe_divide(a, b):
+    # 分母为 0 时结果为 NaN，任何比较都为 False（等价于原实现 "振幅为 0 不判定"）
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b != 0, np.divide(a, b), np.nan)
+
+
+_BIN_OPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: _safe_divide}
+_FUNCTIONS = {"abs": np.abs, "max": np.maximum, "min": np.minimum}
+
+
+class EvalContext:
+    """
+    一次求值过程的共享上下文：列数组 + 子表达式缓存。
+    所有规则共用同一个上下文，像 high - low、滚动均值这类公共子表达式只计算一次。
+    """
+    def __init__(self, df: pd.DataFrame):
+        self.columns = {col: df[col].to_numpy(dtype=np.float64) for col in ("open", "high", "low", "close", "volume")
+                        if col in df.columns}
+        self.length = len(df)
+        self.cache = {}
+        self.evaluations = 0    # 实际计算（未命中缓存）的子表达式数量
+
+    def evaluate(self, node: ast.AST, lookback: int = None):
+        key = (ast.dump(node), lookback if _uses_rolling(node) else None)
+        if key not in self.cache:
+            self.evaluations += 1
+            self.cache[key] = self._compute(node, lookback)
+        return self.cache[key]
+
+    def _compute(self, node: ast.AST, lookback: int):
+        if isinstance(node, ast.Expression):
+            return self.evaluate(node.body, lookback)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return self._name(node.id, lookback)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self.evaluate(node.operand, lookback)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            return _BIN_OPS[type(node.op)](self.evaluate(node.left, lookback), self.evaluate(node.right, lookback))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS:
+            return _FUNCTIONS[node.func.id](*(self.evaluate(arg, lookback) for arg in node.args))
+        if isinstance(node, ast.Compare):
+            result = np.ones(self.length, dtype=bool)
+            left = self.evaluate(node.left, lookback)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self.evaluate(comparator, lookback)
+                with np.errstate(invalid="ignore"):
+                    result &= _COMPARE_OPS[_AST_COMPARE[type(op)]](left, right)
+                left = right
+            return result
+        raise ValueError(f"不支持的表达式: {ast.unparse(node)}")
+
+    def _name(self, name: str, lookback: int):
+        if name in self.columns:
+            return self.columns[name]
+        if name in DERIVED_SERIES:
+            return self.evaluate(_parse(DERIVED_SERIES[name]))
+        match = _ROLLING_AVG.match(name)
+        if match:
+            if lookback is None:
+                raise ValueError(f"{name} 需要在条件中配置 lookback_period")
+            # 与趋势柱引擎共用同一个实现（total_range 时即 prior_range_mean），两条路径的结果不会出现偏差
+            base = self.evaluate(ast.Name(id=match.group(1), ctx=ast.Load()))
+            return prior_mean(base, lookback)
+        raise ValueError(f"未知的变量: {name}")
+
+
+def _parse(formula: str) -> ast.AST:
+    return ast.parse(formula, mode="eval").body
+
+
+def _uses_rolling(node: ast.AST) -> bool:
+    return any(isinstance(n, ast.Name) and _ROLLING_AVG.match(n.id) for n in ast.walk(node))
+
+
+def compile_condition(name: str, spec: dict):
+    """
+    把单个 condition 编译成 (AST, lookback)：
+    - {"operator", "target"}：条件名本身是列/派生序列，与 target 比较，例如 close > open
+    - {"formula", "operator", "value"}：formula 的值与常数比较
+    - {"formula"（自带比较）, "lookback_period"}：formula 本身就是布尔表达式
+    """
+    lookback = spec.get("lookback_period")
+    if "formula" in spec:
+        node = _parse(spec["formula"])
+        if not isinstance(node, ast.Compare):
+            if "value" not in spec:
+                raise ValueError(f"条件 {name} 缺少 value")
+            node = _parse(f"({spec['formula']}) {spec['operator']} {spec['value']!r}")
+    elif "target" in spec:
+        node = _parse(f"{name} {spec['operator']} {spec['target']}")
+    elif "value" in spec:
+        node = _parse(f"{name} {spec['operator']} {spec['value']!r}")
+    else:
+        raise ValueError(f"无法识别的条件定义: {name}")
+    return node, lookback
+
+
+class CompiledRule:
+    """
+    由 definitions.json 中某个形态的 conditions 编译得到的向量化谓词（所有条件 AND）。
+    """
+    def __init__(self, name: str, conditions: list):
+        self.name = name
+        self.conditions = conditions
+
+    def evaluate(self, context: EvalContext) -> np.ndarray:
+        result = np.ones(context.length, dtype=bool)
+        for node, lookback in self.conditions:
+            result &= context.evaluate(node, lookback)
+        return result
+
+
+def compile_definitions(config: dict = None) -> dict:
+    """
+    编译全部形态定义，返回 {形态名: CompiledRule}。
+    """
+    config = config if config is not None else load_definitions()
+    return {
+        name: CompiledRule(name, [compile_condition(cond, spec) for cond, spec in definition["conditions"].items()])
+        for name, definition in config.items()
+    }
+
+
+def evaluate_rules(df: pd.DataFrame, rules: dict) -> pd.DataFrame:
+    """
+    在一个共享上下文中对 df 求值所有规则，返回与 df 同索引的 bool DataFrame（每个形态一列）。
+    """
+    context = EvalContext(df)
+    return pd.DataFrame({name: rule.evaluate(context) for name, rule in rules.items()}, index=df.index)
+
+
+def apply_definitions(df: pd.DataFrame, config: dict = None) -> pd.DataFrame:
+    """
+    按配置文件中的全部形态给 df 添加标识列（列名即形态名，如 BullTrendBar / BearTrendBar）。
+    """
+    flags = evaluate_rules(df, compile_definitions(config))
+    df = df.copy()
+    for name in flags.columns:
+        df[name] = flags[name].to_numpy()
+    return df
@@ -0,0 +1,125 @@
+# logic/trend_bar_engine.py
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def prior_mean(values: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    每根K线之前 lookback 根K线 values 的平均值（不含当前K线）。
+    前 lookback 根K线数据不足，结果为 NaN。
+    与原实现 df.loc[idx-LOOKBACK:idx-1] 的 .mean() 一致（NaN 跳过）。
+    """
+    avg = pd.Series(values).rolling(lookback, min_periods=1).mean().shift(1).to_numpy(copy=True)
+    avg[:lookback] = np.nan
+    return avg
+
+
+def prior_range_mean(high: np.ndarray, low: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    每根K线之前 lookback 根K线 (high - low) 的平均值（不含当前K线），见 prior_mean。
+    """
+    return prior_mean(high - low, lookback)
+
+
+def compute_trend_bar_flags(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    bull_body_ratio: float,
+    bear_body_ratio: float,
+    bull_lookback: int,
+    bear_lookback: int,
+):
+    """
+    单次向量化计算 Bull / Bear Trend Bar 标识，返回 (bull, bear) 两个 bool 数组。
+
+    Bull: close > open 且 |close - open| / (high - low) >= bull_body_ratio
+          且 (high - low) > 前 N 根K线平均振幅
+    Bear: close < open 且 |open - close| / (high - low) >= bear_body_ratio
+          且 (high - low) > 前 N 根K线平均振幅
+    振幅为 0 的K线不判定为趋势柱。
+    """
+    open_ = np.asarray(open_, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    total_range = high - low
+    body = close - open_
+    valid = total_range != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        body_ratio = np.abs(body) / total_range
+
+    bull_avg = prior_range_mean(high, low, bull_lookback)
+    bear_avg = bull_avg if bear_lookback == bull_lookback else prior_range_mean(high, low, bear_lookback)
+
+    bull = valid & (body > 0) & (body_ratio >= bull_body_ratio) & (total_range > bull_avg)
+    bear = valid & (body < 0) & (body_ratio >= bear_body_ratio) & (total_range > bear_avg)
+    return bull, bear
+
+
+def apply_trend_bars(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+    """
+    按 definitions.json 的 BullTrendBar / BearTrendBar 配置，一次性添加两列标识。
+    """
+    bull_cond = config["BullTrendBar"]["conditions"]
+    bear_cond = config["BearTrendBar"]["conditions"]
+    bull, bear = compute_trend_bar_flags(
+        df["open"].to_numpy(), df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy(),
+        bull_body_ratio=bull_cond["body_ratio"]["value"],
+        bear_body_ratio=bear_cond["body_ratio"]["value"],
+        bull_lookback=bull_cond["total_range_comparison"]["lookback_period"],
+        bear_lookback=bear_cond["total_range_comparison"]["lookback_period"],
+    )
+    df = df.copy()
+    df["BullTrendBar"] = bull
+    df["BearTrendBar"] = bear
+    return df
+
+
+class RangeWindow:
+    """
+    实时检测用的定长环形缓冲区：保存最近 lookback 根K线的振幅和滚动和，每根K线 O(1)。
+    每写满一轮用 math.fsum 重算一次滚动和，消除长时间运行的浮点累积误差（均摊仍为 O(1)）。
+    """
+    __slots__ = ("lookback", "_ring", "_pos", "_count", "_sum", "_valid")
+
+    def __init__(self, lookback: int):
+        self.lookback = lookback
+        self._ring = [math.nan] * lookback
+        self._pos = 0
+        self._count = 0     # 累计写入的K线数量
+        self._sum = 0.0     # 环内有效振幅之和
+        self._valid = 0     # 环内有效（非 NaN）振幅个数
+
+    def mean(self) -> float:
+        """
+        前 lookback 根K线的平均振幅；数据不足 lookback 根时返回 NaN。
+        """
+        if self._count < self.lookback or self._valid == 0:
+            return math.nan
+        return self._sum / self._valid
+
+    def push(self, total_range: float):
+        old = self._ring[self._pos]
+        if old == old:          # 非 NaN
+            self._sum -= old
+            self._valid -= 1
+        if total_range == total_range:
+            self._sum += total_range
+            self._valid += 1
+        self._ring[self._pos] = total_range
+        self._pos += 1
+        self._count += 1
+        if self._pos == self.lookback:
+            self._pos = 0
+            self._sum = math.fsum(v for v in self._ring if v == v)
+
+    def reset(self):
+        self._ring = [math.nan] * self.lookback
+        self._pos = self._count = self._valid = 0
+        self._sum = 0.0
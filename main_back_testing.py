@@ -22,3 +22,17 @@ print(df.tail())
 
 #next: 根据 strike 和 trade date 获取期权在某日的日内数据数据
 # learn copilot
+
+################################################################
+# 趋势柱信号回测（向量化引擎）
+from IBKR_Data import fetch_stock_data
+from logic import apply_bull_trend_bar, apply_bear_trend_bar
+from backtest import run_backtest
+
+spy = fetch_stock_data("SPY", duration="10 Y", bar_size="1 day")
+if not spy.empty:
+    signals = apply_bear_trend_bar(apply_bull_trend_bar(spy))
+    result = run_backtest(signals, direction="both", entry="next_open", stop="signal_extreme", hold_bars=5)
+    print(result.trades.tail())
+    for name, value in result.stats.items():
+        print(f"{name:>15}: {value:.4f}" if isinstance(value, float) else f"{name:>15}: {value}")
@@ -4,6 +4,8 @@ from typing import List, Dict, Optional
 import time
 from datetime import datetime
 import traceback
+from options.chain_table import assemble_option_chain
+from options.market_data_window import WindowedMarketDataFetcher
 
 def format_value(value, format_str='8.2f'):
     """格式化数值，处理None值"""
@@ -98,57 +100,15 @@ def get_option_chain(symbol: str = "SPY", strike_buffer: float = 10) -> None:
 
             # 8. 批量获取所有合约的行情和希腊值
             print(f"\n📊 正在获取行情和希腊值 (这可能需要一些时间)...")
-            tickers = []
-            batch_size = 50  # 每次请求的合约数量
-            for i in range(0, len(all_contracts), batch_size):
-                batch = all_contracts[i:i + batch_size]
-                print(f"正在处理批次 {i//batch_size + 1}/{(len(all_contracts) + batch_size - 1)//batch_size}...")
-                
-                # 请求市场数据和希腊值
-                for contract in batch:
-                    ib.reqMktData(contract, genericTickList="106", snapshot=False, regulatorySnapshot=False)
-                
-                # 等待IB服务器响应
-                ib.sleep(2) # 等待时间可以根据网络状况调整
-
-                # 获取已更新的ticker
-                for contract in batch:
-                    tickers.append(ib.ticker(contract))
-
-            # 取消所有市场数据订阅
-            for contract in all_contracts:
-                ib.cancelMktData(contract)
+            # 窗口式拉取：合约数据一到齐即退订并补入下一个，窗口大小自适应账户行情线路上限
+            fetcher = WindowedMarketDataFetcher(ib, generic_ticks="106")
+            tickers = fetcher.fetch(all_contracts)
 
             print(f"✅ 完成行情获取，共收到 {len(tickers)} 个ticker")
 
             # 9. 处理结果并构建期权链数据结构
-            option_chain_data = {}
-            
-            for ticker in tickers:
-                # 过滤掉没有有效报价或希腊值的合约
-                if not (ticker and ticker.modelGreeks and ticker.modelGreeks.delta is not None and (ticker.bid > 0 or ticker.ask > 0)):
-                    continue
-
-                g = ticker.modelGreeks
-                strike = ticker.contract.strike
-                right = ticker.contract.right
-                
-                option_data = {
-                    "strike": strike,
-                    "bid": ticker.bid,
-                    "ask": ticker.ask,
-                    "delta": g.delta,
-                    "gamma": g.gamma,
-                    "theta": g.theta,
-                    "vega": g.vega,
-                    "iv": g.impliedVol
-                }
-
-                if strike not in option_chain_data:
-                    option_chain_data[strike] = {'C': None, 'P': None}
-                
-                option_chain_data[strike][right] = option_data
-            
+            option_chain_data = assemble_option_chain(tickers)
+
             if not option_chain_data:
                 print("❌ 没有找到任何有有效市场数据的期权合约。")
                 return
@@ -0,0 +1,199 @@
+# options/chain_archive.py
+
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ✅ 默认归档目录：data/chain_archive/<标的>/<YYYYMMDD>.chain（记录） + .idx（索引）
+DEFAULT_ARCHIVE_DIR = Path(__file__).resolve().parents[1] / "data" / "chain_archive"
+
+# ✅ 每个期权合约在一次快照中的一行记录（定长，可直接 memmap）
+CHAIN_DTYPE = np.dtype([
+    ("ts", np.int64),           # 快照时间，epoch 毫秒
+    ("conId", np.int64),
+    ("expiry", np.int32),       # YYYYMMDD
+    ("strike", np.float64),
+    ("right", "S1"),
+    ("bid", np.float64),
+    ("ask", np.float64),
+    ("iv", np.float64),
+    ("delta", np.float64),
+    ("gamma", np.float64),
+    ("vega", np.float64),
+    ("theta", np.float64),
+    ("und_price", np.float64),
+])
+
+# ✅ 索引：每次快照一行 (时间, 起始行号, 行数)
+INDEX_DTYPE = np.dtype([("ts", np.int64), ("start", np.int64), ("nrows", np.int64)])
+
+
+def _paths(root: Path, symbol: str, day: str):
+    base = Path(root) / symbol.upper()
+    return base / f"{day}.chain", base / f"{day}.idx"
+
+
+def _day_of(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000).strftime("%Y%m%d")
+
+
+def snapshot_from_greeks_store(store, ts_ms: int = None, mask: np.ndarray = None) -> np.ndarray:
+    """
+    把 GreeksStore 的当前状态转成一次快照（CHAIN_DTYPE 数组），mask 可选，用于只保存部分合约。
+    """
+    ts_ms = int(time.time() * 1000) if ts_ms is None else ts_ms
+    rows = np.arange(len(store)) if mask is None else np.flatnonzero(mask)
+    snapshot = np.empty(len(rows), dtype=CHAIN_DTYPE)
+    snapshot["ts"] = ts_ms
+    snapshot["conId"] = store.column("con_id")[rows]
+    snapshot["expiry"] = store.column("expiry")[rows]
+    snapshot["strike"] = store.column("strike")[rows]
+    snapshot["right"] = store.column("right")[rows]
+    for name in ("bid", "ask", "iv", "delta", "gamma", "vega", "theta", "und_price"):
+        snapshot[name] = store.column(name)[rows]
+    return snapshot
+
+
+class ChainArchiveWriter:
+    """
+    只追加写入的期权链快照文件（每个标的每天一个）。
+    先写记录再写索引：进程中途退出时，未写入索引的残留记录在下次打开时被截掉。
+    """
+    def __init__(self, symbol: str, day: str = None, root: Path = DEFAULT_ARCHIVE_DIR):
+        self.symbol = symbol.upper()
+        self.day = day or datetime.now().strftime("%Y%m%d")
+        self.data_path, self.index_path = _paths(root, self.symbol, self.day)
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._rows = self._recover()
+
+    def _recover(self) -> int:
+        index = np.fromfile(self.index_path, dtype=INDEX_DTYPE) if self.index_path.exists() else \
+            np.empty(0, dtype=INDEX_DTYPE)
+        rows = int(index["start"][-1] + index["nrows"][-1]) if len(index) else 0
+        with open(self.data_path, "ab") as f:
+            f.truncate(rows * CHAIN_DTYPE.itemsize)
+        # 索引文件末尾可能有半条记录
+        with open(self.index_path, "ab") as f:
+            f.truncate(len(index) * INDEX_DTYPE.itemsize)
+        return rows
+
+    def append(self, snapshot: np.ndarray, ts_ms: int = None):
+        """
+        追加一次快照（CHAIN_DTYPE 数组）；ts_ms 默认取快照中的 ts 字段。
+        """
+        snapshot = np.ascontiguousarray(snapshot, dtype=CHAIN_DTYPE)
+        if ts_ms is None:
+            ts_ms = int(snapshot["ts"][0]) if len(snapshot) else int(time.time() * 1000)
+        with self._lock:
+            with open(self.data_path, "ab") as f:
+                f.write(snapshot.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            entry = np.array([(ts_ms, self._rows, len(snapshot))], dtype=INDEX_DTYPE)
+            with open(self.index_path, "ab") as f:
+                f.write(entry.tobytes())
+            self._rows += len(snapshot)
+
+
+class ChainArchiveReader:
+    """
+    通过 np.memmap 读取快照文件：按时间二分查找索引，返回的快照是文件映射上的零拷贝切片，
+    不把整天的数据读入内存。文件仍在写入时调用 refresh() 重新映射新增部分。
+    """
+    def __init__(self, symbol: str, day: str, root: Path = DEFAULT_ARCHIVE_DIR):
+        self.data_path, self.index_path = _paths(root, symbol, day)
+        self.refresh()
+
+    def refresh(self):
+        self.index = np.fromfile(self.index_path, dtype=INDEX_DTYPE) if self.index_path.exists() else \
+            np.empty(0, dtype=INDEX_DTYPE)
+        rows = int(self.index["start"][-1] + self.index["nrows"][-1]) if len(self.index) else 0
+        self._data = np.memmap(self.data_path, dtype=CHAIN_DTYPE, mode="r", shape=(rows,)) if rows else \
+            np.empty(0, dtype=CHAIN_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.index["ts"]
+
+    def snapshot(self, i: int) -> np.ndarray:
+        start, nrows = self.index["start"][i], self.index["nrows"][i]
+        return self._data[start:start + nrows]
+
+    def snapshot_at(self, ts_ms: int) -> np.ndarray | None:
+        """
+        ts_ms 时刻（含）之前最近的一次快照；早于第一次快照时返回 None。
+        """
+        i = np.searchsorted(self.index["ts"], ts_ms, side="right") - 1
+        return self.snapshot(i) if i >= 0 else None
+
+    def between(self, start_ms: int, end_ms: int) -> np.ndarray:
+        """
+        [start_ms, end_ms] 内所有快照的记录（文件中连续，零拷贝），按 ts 字段区分各次快照。
+        """
+        lo = np.searchsorted(self.index["ts"], start_ms, side="left")
+        hi = np.searchsorted(self.index["ts"], end_ms, side="right")
+        if lo >= hi:
+            return self._data[0:0]
+        first, last = self.index[lo], self.index[hi - 1]
+        return self._data[first["start"]:last["start"] + last["nrows"]]
+
+    def to_dataframe(self, records: np.ndarray) -> pd.DataFrame:
+        df = pd.DataFrame({name: records[name] for name in CHAIN_DTYPE.names})
+        df["right"] = df["right"].str.decode("ascii")
+        df["ts"] = pd.to_datetime(df["ts"], unit="ms")
+        return df
+
+
+class ChainRecorder:
+    """
+    按固定节奏（interval 秒）把 GreeksStore 中的期权链写入归档；跨天自动切换到新的文件。
+    节奏按绝对时间对齐（start + k * interval），单次写入耗时不会累积漂移。
+    """
+    def __init__(self, store, symbol: str, interval: float = 60.0, root: Path = DEFAULT_ARCHIVE_DIR, select=None):
+        self.store = store
+        self.symbol = symbol
+        self.interval = interval
+        self.root = root
+        self.select = select            # 可选：select(store) -> bool 掩码，只记录部分合约
+        self._writer = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record_once(self, ts_ms: int = None):
+        ts_ms = int(time.time() * 1000) if ts_ms is None else ts_ms
+        day = _day_of(ts_ms)
+        if self._writer is None or self._writer.day != day:
+            self._writer = ChainArchiveWriter(self.symbol, day, self.root)
+        mask = self.select(self.store) if self.select else None
+        self._writer.append(snapshot_from_greeks_store(self.store, ts_ms, mask), ts_ms)
+
+    def _run(self):
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.record_once()
+            except Exception as e:
+                print(f"❌ 期权链快照写入失败: {e}")
+            next_at += self.interval
+            self._stop.wait(max(0.0, next_at - time.monotonic()))
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,35 @@
+# options/chain_table.py
+
+from options.market_data_window import ticker_complete
+
+
+def assemble_option_chain(tickers: list, is_valid=ticker_complete) -> dict:
+    """
+    把 ticker 列表整理成 {strike: {'C': data, 'P': data}}（纯函数，不依赖连接，便于测试和基准测试）。
+    没有有效报价或 greeks 的合约被跳过。
+    """
+    option_chain_data = {}
+    for ticker in tickers:
+        if not (ticker and is_valid(ticker)):
+            continue
+
+        g = ticker.modelGreeks
+        strike = ticker.contract.strike
+        right = ticker.contract.right
+
+        option_data = {
+            "strike": strike,
+            "bid": ticker.bid,
+            "ask": ticker.ask,
+            "delta": g.delta,
+            "gamma": g.gamma,
+            "theta": g.theta,
+            "vega": g.vega,
+            "iv": g.impliedVol
+        }
+
+        if strike not in option_chain_data:
+            option_chain_data[strike] = {'C': None, 'P': None}
+
+        option_chain_data[strike][right] = option_data
+    return option_chain_data
@@ -0,0 +1,97 @@
+# options/expiry_index.py
+
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from options.option_chain_utils import request_all_option_chain_params
+
+
+class ExpiryIndex:
+    """
+    期权到期日索引：每个标的只发一次 reqSecDefOptParams，
+    按 (标的, tradingClass) 存成升序 int 数组（YYYYMMDD），每个交易日（会话）刷新一次。
+    查询最近有效到期日只需一次二分查找，不再逐日 reqContractDetails 试探。
+    """
+    def __init__(self, loader=request_all_option_chain_params):
+        self._loader = loader
+        self._index = {}        # (symbol, tradingClass) -> np.ndarray[int64]
+        self._all = {}          # symbol -> 所有 tradingClass 合并后的 np.ndarray[int64]
+        self._session = {}      # symbol -> 加载日期
+        self._lock = threading.Lock()           # 只保护索引字典的读写，不跨网络请求持有
+        self._symbol_locks = {}                 # symbol -> Lock，同一标的的并发加载只请求一次
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._symbol_locks.setdefault(symbol, threading.Lock())
+
+    def load(self, symbol: str, sec_type: str = "STK", exchange: str = "SMART", force: bool = False):
+        """
+        加载（或在新的一天刷新）某个标的的到期日索引。
+        请求期间只锁住该标的，其它标的的加载和查询不受影响；
+        空结果（超时、断线）不覆盖已有索引，也不标记为已加载，下次调用会重试。
+        """
+        with self._symbol_lock(symbol):
+            if not force and self._session.get(symbol) == date.today():
+                return
+            chains = self._loader(symbol, sec_type=sec_type, exchange=exchange)
+            if not chains:
+                print(f"⚠️ 未获取到 {symbol} 的期权到期日，稍后重试")
+                return
+            self.build(symbol, chains)
+
+    def build(self, symbol: str, chains: list):
+        """
+        由 reqSecDefOptParams 的结果构建索引（同一 tradingClass 的多个交易所合并去重）。
+        chains 为空时只清空索引，不标记为已加载。
+        """
+        per_class = {}
+        for chain in chains:
+            per_class.setdefault(chain["tradingClass"], set()).update(chain["expirations"])
+
+        merged = set().union(*per_class.values()) if per_class else set()
+        with self._lock:
+            for key in [k for k in self._index if k[0] == symbol]:
+                del self._index[key]
+            for trading_class, expirations in per_class.items():
+                self._index[(symbol, trading_class)] = np.array(sorted(int(e) for e in expirations), dtype=np.int64)
+            self._all[symbol] = np.array(sorted(int(e) for e in merged), dtype=np.int64)
+            if chains:
+                self._session[symbol] = date.today()
+            else:
+                self._session.pop(symbol, None)
+
+    def expirations(self, symbol: str, trading_class: str = None) -> np.ndarray:
+        if trading_class is None:
+            return self._all.get(symbol, np.empty(0, dtype=np.int64))
+        return self._index.get((symbol, trading_class), np.empty(0, dtype=np.int64))
+
+    def trading_classes(self, symbol: str) -> list:
+        with self._lock:
+            return sorted(tc for (s, tc) in self._index if s == symbol)
+
+    def nearest(self, symbol: str, target_expiry: str, trading_class: str = None,
+                max_days_forward: int = None) -> str | None:
+        """
+        返回 >= target_expiry 的最近到期日（YYYYMMDD）；超出 max_days_forward 或不存在时返回 None。
+        target_expiry 支持 'YYYY-MM-DD' 或 'YYYYMMDD'。
+        """
+        expirations = self.expirations(symbol, trading_class)
+        target = datetime.strptime(target_expiry.replace("-", ""), "%Y%m%d")
+        pos = np.searchsorted(expirations, int(target.strftime("%Y%m%d")), side="left")
+        if pos >= len(expirations):
+            return None
+        found = str(expirations[pos])
+        if max_days_forward is not None:
+            limit = target + timedelta(days=max_days_forward)
+            if datetime.strptime(found, "%Y%m%d") > limit:
+                return None
+        return found
+
+
+# ✅ 全局索引实例（整个进程共享）
+_expiry_index = ExpiryIndex()
+
+def get_expiry_index() -> ExpiryIndex:
+    return _expiry_index
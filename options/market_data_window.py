@@ -0,0 +1,127 @@
+# options/market_data_window.py
+
+import math
+import time
+from collections import deque
+
+# IB 错误 101：超过账户同时订阅的行情线路上限
+MAX_TICKERS_ERROR = 101
+
+
+def _positive(value) -> bool:
+    return value is not None and not math.isnan(value) and value > 0
+
+
+def ticker_complete(ticker) -> bool:
+    """
+    默认的完成判定：有买价或卖价，且 modelGreeks.delta 已到达。
+    """
+    greeks = getattr(ticker, "modelGreeks", None)
+    has_quote = _positive(getattr(ticker, "bid", None)) or _positive(getattr(ticker, "ask", None))
+    return has_quote and greeks is not None and greeks.delta is not None
+
+
+class AdaptiveWindow:
+    """
+    AIMD 窗口：每完成一整个窗口的合约，窗口 +1（加性增）；
+    收到 error 101（行情线路已满）时窗口减半（乘性减），并以当时在途数量作为上限。
+    最终窗口稳定在账户行情线路上限附近。
+    """
+    def __init__(self, initial: int = 50, minimum: int = 5, maximum: int = 200):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self._completed = 0
+
+    def on_complete(self):
+        self._completed += 1
+        if self._completed >= self.size:
+            self._completed = 0
+            self.size = min(self.maximum, self.size + 1)
+
+    def on_limit(self, in_flight: int):
+        # 线路上限不会超过出错时已占用的数量
+        self.maximum = max(self.minimum, min(self.maximum, in_flight - 1))
+        self.size = max(self.minimum, min(self.size // 2, self.maximum))
+        self._completed = 0
+
+
+class WindowedMarketDataFetcher:
+    """
+    完成驱动的窗口式行情拉取（ib_insync.IB）：
+    - 最多保持 window.size 个订阅在途，合约一旦 bid/ask 与 greeks 到齐（或超过单合约截止时间）立即退订，
+      并马上补入下一个合约，不再按固定批次盲等；
+    - error 101 时缩小窗口，被拒绝的合约重新排队；
+    - 每完成 report_every 个合约打印一次吞吐量。
+    """
+    def __init__(self, ib, generic_ticks: str = "106", deadline: float = 4.0, window: AdaptiveWindow = None,
+                 is_complete=ticker_complete, report_every: int = 50, poll_interval: float = 0.05):
+        self.ib = ib
+        self.generic_ticks = generic_ticks
+        self.deadline = deadline
+        self.window = window or AdaptiveWindow()
+        self.is_complete = is_complete
+        self.report_every = report_every
+        self.poll_interval = poll_interval
+        self._rejected = []
+
+    def _on_error(self, req_id, error_code, error_string, contract=None, *_):
+        if error_code == MAX_TICKERS_ERROR and contract is not None:
+            self._rejected.append(contract)
+
+    def fetch(self, contracts: list) -> list:
+        """
+        拉取所有合约的行情，返回与 contracts 对齐的 ticker 列表（超时的合约保留已收到的部分数据）。
+        """
+        pending = deque(range(len(contracts)))
+        results = [None] * len(contracts)
+        in_flight = {}          # conId -> (index, ticker, 截止时间)
+        timed_out = 0
+        done = 0
+        batch_start = start = time.perf_counter()
+
+        self.ib.errorEvent += self._on_error
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < self.window.size:
+                    i = pending.popleft()
+                    ticker = self.ib.reqMktData(contracts[i], self.generic_ticks, False, False)
+                    in_flight[contracts[i].conId] = (i, ticker, time.monotonic() + self.deadline)
+
+                self.ib.waitOnUpdate(timeout=self.poll_interval)
+
+                if self._rejected:
+                    rejected, self._rejected = self._rejected, []
+                    self.window.on_limit(len(in_flight))
+                    for contract in rejected:
+                        entry = in_flight.pop(contract.conId, None)
+                        if entry is not None:
+                            self.ib.cancelMktData(contract)
+                            pending.appendleft(entry[0])
+                    print(f"⚠️ 行情线路已满，窗口调整为 {self.window.size}")
+
+                now = time.monotonic()
+                for con_id, (i, ticker, expires) in list(in_flight.items()):
+                    complete = self.is_complete(ticker)
+                    if not complete and now < expires:
+                        continue
+                    del in_flight[con_id]
+                    self.ib.cancelMktData(contracts[i])
+                    results[i] = ticker
+                    timed_out += not complete
+                    done += 1
+                    self.window.on_complete()
+                    if done % self.report_every == 0:
+                        elapsed = time.perf_counter() - batch_start
+                        print(f"📊 已完成 {done}/{len(contracts)}，本批 {self.report_every / elapsed:.1f} 合约/秒，"
+                              f"窗口 {self.window.size}")
+                        batch_start = time.perf_counter()
+        finally:
+            self.ib.errorEvent -= self._on_error
+            for i, _, _ in in_flight.values():
+                self.ib.cancelMktData(contracts[i])
+
+        total = time.perf_counter() - start
+        rate = len(contracts) / total if total > 0 else float("inf")
+        print(f"✅ 行情拉取完成：{len(contracts)} 个合约，用时 {total:.1f}s（{rate:.1f} 合约/秒），超时 {timed_out} 个")
+        return results
@@ -1,53 +1,64 @@
 # options/option_chain_utils.py
 
 from ibapi.contract import Contract
-from IBKR_Connection import connect_ibkr, fetch_contract_details
+from IBKR_Connection import fetch_contract_details, get_ib
 import time
 
 
-def request_option_chain_params(symbol: str):
+def request_all_option_chain_params(symbol: str, sec_type: str = "STK", exchange: str = "SMART",
+                                    currency: str = "USD") -> list:
     """
-    使用 IBKR 官方 API 获取 option chain 元数据（如 strikes、expiry、tradingClass 等）。
+    使用 IBKR 官方 API 获取标的全部 option chain 元数据（每个 exchange / tradingClass 一条）。
     """
 
-    ib = connect_ibkr()
+    ib = get_ib("secDef")
     if ib is None:
         raise RuntimeError("❌ 无法连接 IBKR")
 
     # ✅ 获取 conId 和 exchange
-    stock = Contract()
-    stock.symbol = symbol
-    stock.secType = "STK"
-    stock.currency = "USD"
-    stock.exchange = "SMART"
+    underlying = Contract()
+    underlying.symbol = symbol
+    underlying.secType = sec_type
+    underlying.currency = currency
+    underlying.exchange = exchange
 
-    details = fetch_contract_details(stock)
+    details = fetch_contract_details(underlying)
     if not details:
         raise RuntimeError(f"❌ 获取 {symbol} 合约详情失败")
 
     conId = details[0].contract.conId
-    exchange = details[0].contract.exchange or "SMART"
     secType = details[0].contract.secType
 
     # ✅ 申请参数
-    req_id = ib.dispatcher.next_id()
-    ib.dispatcher.register(req_id)
+    def send(conn, wire_id):
+        conn.reqSecDefOptParams(
+            reqId=wire_id,
+            underlyingSymbol=symbol,
+            futFopExchange='',
+            underlyingSecType=secType,
+            underlyingConId=conId
+        )
 
-    ib.reqSecDefOptParams(
-        reqId=req_id,
-        underlyingSymbol=symbol,
-        # futFopExchange=exchange,
-        futFopExchange='',
-        underlyingSecType=secType,
-        underlyingConId=conId
-    )
+    req_id = ib.dispatcher.next_id()
+    ib.dispatcher.register(req_id, kind="secDef", resend=send)   # 断线重连后自动以新的 reqId 重发
+    send(ib, req_id)
 
     result = ib.dispatcher.wait(req_id, timeout=5)
     ib.dispatcher.clear(req_id)
 
     if not result:
         print("⚠️ 未收到 option chain 响应")
+        return []
+    return list(result)
+
+
+def request_option_chain_params(symbol: str):
+    """
+    使用 IBKR 官方 API 获取 option chain 元数据（如 strikes、expiry、tradingClass 等）。
+    """
+    result = request_all_option_chain_params(symbol)
+    if not result:
         return None
 
     # ✅ 返回第一个 OptionChain（一般就是唯一的）
-    return result[0] if isinstance(result, list) else result
+    return result[0]
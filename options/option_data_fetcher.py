@@ -0,0 +1,115 @@
+# options/option_data_fetcher.py
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from IBKR_Connection import fetch_historical_data, fetch_historical_many
+from options.option_chain_utils import request_all_option_chain_params
+from utils.contracts import create_option_contract, create_stock_contract
+
+
+def _trade_date_end(trade_date: str) -> str:
+    # 交易日收盘后的时间点，保证同一交易日的请求区间固定，重复回测可以完全命中本地缓存
+    return trade_date.replace("-", "") + " 23:59:59"
+
+
+def get_underlying_close(symbol: str, trade_date: str) -> float | None:
+    """
+    标的在 trade_date（含）之前最近一个交易日的收盘价（经本地K线缓存）。
+    """
+    df = fetch_historical_data(create_stock_contract(symbol), _trade_date_end(trade_date), "7 D", "1 day",
+                               use_cache=True)
+    if df.empty:
+        return None
+    return float(df["close"].iloc[-1])
+
+
+def historical_option_contract(symbol: str, expiry: str, strike: float, right: str):
+    """
+    构造用于查询历史数据的期权合约：已到期的期权必须设置 includeExpired，
+    否则 TWS 一律返回 200 "No security definition"。
+    """
+    contract = create_option_contract(symbol, expiry, strike, right)
+    if contract.lastTradeDateOrContractMonth < date.today().strftime("%Y%m%d"):
+        contract.includeExpired = True
+    return contract
+
+
+def candidate_strikes(atm: float, strike_range: float, strike_step: float) -> np.ndarray:
+    """
+    ATM 附近 ±strike_range 内、按 strike_step 对齐的执行价网格。
+    已到期的期权无法通过 reqSecDefOptParams 查询执行价；不存在的执行价在 includeExpired 下返回的 200
+    是确定的结果，以空区间写入K线缓存，重复回测不再请求。
+    """
+    center = round(atm / strike_step) * strike_step
+    count = int(strike_range // strike_step)
+    return center + strike_step * np.arange(-count, count + 1)
+
+
+def fetch_option_data(symbol: str, trade_date: str, expiry: str, strike_range: float = 10,
+                      strike_step: float = 1.0, rights: tuple = ("C", "P"), bar_size: str = "5 mins",
+                      duration: str = "1 D", what_to_show: str = "TRADES") -> pd.DataFrame:
+    """
+    批量获取某交易日 ATM 附近所有执行价期权的历史K线。
+
+    - ATM 取标的在 trade_date 的收盘价；
+    - 所有 (strike, right) 合约通过 fetch_historical_many 并发拉取（受限速调度器控制）；
+    - 结果写入本地K线缓存，相同日期的重复回测不再访问 TWS。
+
+    返回长表：index 为 date，列为 strike / right / open / high / low / close / volume；
+    没有数据（或不存在）的合约不出现在结果中。
+    """
+    atm = get_underlying_close(symbol, trade_date)
+    if atm is None:
+        print(f"❌ 无法获取 {symbol} 在 {trade_date} 的收盘价")
+        return pd.DataFrame()
+
+    strikes = candidate_strikes(atm, strike_range, strike_step)
+    keys = [(float(strike), right) for strike in strikes for right in rights]
+    contracts = [historical_option_contract(symbol, expiry, strike, right) for strike, right in keys]
+    print(f"[INFO] {symbol} ATM {atm:.2f}，请求 {len(contracts)} 个期权合约 ({expiry})")
+
+    frames = fetch_historical_many(contracts, _trade_date_end(trade_date), duration, bar_size, what_to_show,
+                                   use_cache=True)
+    parts = []
+    for (strike, right), df in zip(keys, frames):
+        if df.empty:
+            continue
+        df = df.copy()
+        df.insert(0, "right", right)
+        df.insert(0, "strike", strike)
+        parts.append(df)
+    if not parts:
+        print("❌ 没有获取到任何期权数据")
+        return pd.DataFrame()
+    return pd.concat(parts).sort_index(kind="stable")
+
+
+def get_available_option_strikes(symbol: str, expiry: str = None) -> pd.DataFrame:
+    """
+    当前可交易期权的到期日与执行价（reqSecDefOptParams，只能查到未到期的期权）。
+    返回列：expiry / strike / tradingClass，按 expiry、strike 排序。
+    """
+    chains = [c for c in request_all_option_chain_params(symbol) if c["exchange"] == "SMART"]
+    rows = [
+        (exp, strike, chain["tradingClass"])
+        for chain in chains
+        for exp in chain["expirations"]
+        for strike in chain["strikes"]
+    ]
+    df = pd.DataFrame(rows, columns=["expiry", "strike", "tradingClass"])
+    if expiry is not None:
+        df = df[df["expiry"] == expiry.replace("-", "")]
+    return df.drop_duplicates().sort_values(["expiry", "strike"]).reset_index(drop=True)
+
+
+def get_single_option_data(symbol: str, expiry: str, strike: float, right: str, duration: str = "60 D",
+                           bar_size: str = "1 day", end_datetime: str = "", what_to_show: str = "TRADES",
+                           use_cache: bool = True) -> pd.DataFrame:
+    """
+    获取单个期权合约的历史K线（默认经过本地K线缓存）。
+    """
+    contract = historical_option_contract(symbol, expiry, strike, right)
+    return fetch_historical_data(contract, end_datetime, duration, bar_size, what_to_show, use_cache=use_cache)
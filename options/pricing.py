@@ -0,0 +1,219 @@
+# options/pricing.py
+
+from datetime import date
+
+import numpy as np
+
+# ✅ 本地期权定价：全部函数对 NumPy 数组向量化，可一次计算整条期权链
+# - SPY 等股票/ETF 期权：Black-Scholes（连续股息率 q）
+# - VIX 期权：以对应月份 VX 期货价格为标的的 Black-76
+# Greeks 与 IB modelGreeks 口径一致：vega 为波动率变化 1 个百分点的价格变化，theta 为每自然日的价格变化。
+
+_SQRT_2PI = 2.506628274631000502
+
+
+def norm_cdf(x):
+    """
+    标准正态分布函数，Hart (1968) 双精度算法（West 2005 版本），绝对误差约 1e-15，不依赖 scipy。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    ax = np.abs(x)
+    e = np.exp(-0.5 * ax * ax)
+
+    # |x| < 7.07：有理函数逼近
+    num = 3.52624965998911e-02 * ax + 0.700383064443688
+    num = num * ax + 6.37396220353165
+    num = num * ax + 33.912866078383
+    num = num * ax + 112.079291497871
+    num = num * ax + 221.213596169931
+    num = num * ax + 220.206867912376
+    den = 8.83883476483184e-02 * ax + 1.75566716318264
+    den = den * ax + 16.064177579207
+    den = den * ax + 86.7807322029461
+    den = den * ax + 296.564248779674
+    den = den * ax + 637.333633378831
+    den = den * ax + 793.826512519948
+    den = den * ax + 440.413735824752
+    near = e * num / den
+
+    # |x| >= 7.07：连分式展开
+    with np.errstate(divide="ignore"):
+        frac = ax + 0.65
+        frac = ax + 4.0 / frac
+        frac = ax + 3.0 / frac
+        frac = ax + 2.0 / frac
+        frac = ax + 1.0 / frac
+        far = e / frac / _SQRT_2PI
+
+    tail = np.where(ax < 7.07106781186547, near, far)
+    tail = np.where(ax > 37.0, 0.0, tail)
+    return np.where(x > 0, 1.0 - tail, tail)
+
+
+def norm_pdf(x):
+    x = np.asarray(x, dtype=np.float64)
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def _is_call(right) -> np.ndarray:
+    right = np.asarray(right)
+    if right.dtype == bool:
+        return right
+    return np.char.upper(right.astype(str)) == "C"
+
+
+def years_to_expiry(expiry, as_of: date = None) -> np.ndarray:
+    """
+    到期日（YYYYMMDD 整数或字符串，可为数组）距 as_of（默认今天）的年数（自然日 / 365）。
+    当天到期按半天计，避免 T = 0。
+    """
+    as_of = as_of or date.today()
+    # 整条期权链一次性解析：取前 8 位转为整数，再按 年 → 月 → 日 组合成 datetime64[D]，不逐个 strptime
+    ymd = np.atleast_1d(np.asarray(expiry)).astype("U8").astype(np.int64)
+    months = (ymd // 10000 - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (ymd // 100 % 100 - 1)
+    expiry_days = months.astype("datetime64[D]") + (ymd % 100 - 1)
+    days = (expiry_days - np.datetime64(as_of, "D")).astype(np.float64)
+    return np.maximum(days, 0.5) / 365.0
+
+
+def _d1_d2(forward, strike, t, sigma):
+    vol_t = sigma * np.sqrt(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(forward / strike) + 0.5 * vol_t * vol_t) / vol_t
+    return d1, d1 - vol_t
+
+
+def _black(forward, strike, t, sigma, is_call):
+    """
+    未贴现的 Black 公式：看涨 F·N(d1) - K·N(d2)，看跌 K·N(-d2) - F·N(-d1)。
+    """
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    call = forward * norm_cdf(d1) - strike * norm_cdf(d2)
+    put = strike * norm_cdf(-d2) - forward * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def _broadcast(*arrays):
+    return np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in arrays))
+
+
+def bs_price(spot, strike, t, rate, sigma, right, dividend_yield=0.0):
+    """
+    Black-Scholes 期权价格（连续股息率 dividend_yield）。right 为 'C' / 'P'（或 bool 数组，True 为看涨）。
+    """
+    spot, strike, t, rate, sigma, q = _broadcast(spot, strike, t, rate, sigma, dividend_yield)
+    forward = spot * np.exp((rate - q) * t)
+    return np.exp(-rate * t) * _black(forward, strike, t, sigma, _is_call(right))
+
+
+def black76_price(forward, strike, t, rate, sigma, right):
+    """
+    Black-76 期货期权价格（VIX 期权以同月 VX 期货价格作为 forward）。
+    """
+    forward, strike, t, rate, sigma = _broadcast(forward, strike, t, rate, sigma)
+    return np.exp(-rate * t) * _black(forward, strike, t, sigma, _is_call(right))
+
+
+def _greeks(forward, strike, t, rate, sigma, is_call, carry_discount, spot_scale):
+    """
+    通用 Greeks：carry_discount 为 delta 的折现因子（BS 为 e^{-qT}，Black-76 为 e^{-rT}），
+    spot_scale 为标的价格（BS 为现价 S，Black-76 为期货价 F）。
+    """
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    discount = np.exp(-rate * t)
+    pdf = norm_pdf(d1)
+    sqrt_t = np.sqrt(t)
+
+    price = discount * _black(forward, strike, t, sigma, is_call)
+    delta = np.where(is_call, carry_discount * norm_cdf(d1), -carry_discount * norm_cdf(-d1))
+    gamma = carry_discount * pdf / (spot_scale * sigma * sqrt_t)
+    vega = carry_discount * spot_scale * pdf * sqrt_t
+    # dV/dT：期权时间价值衰减 + 贴现项
+    decay = carry_discount * spot_scale * pdf * sigma / (2 * sqrt_t)
+    return price, delta, gamma, vega, decay, d1, d2, discount
+
+
+def bs_greeks(spot, strike, t, rate, sigma, right, dividend_yield=0.0) -> dict:
+    """
+    Black-Scholes 价格与 Greeks，返回 {"price", "delta", "gamma", "vega", "theta"}（均为数组）。
+    """
+    spot, strike, t, rate, sigma, q = _broadcast(spot, strike, t, rate, sigma, dividend_yield)
+    is_call = _is_call(right)
+    carry = np.exp(-q * t)
+    forward = spot * np.exp((rate - q) * t)
+    price, delta, gamma, vega, decay, d1, d2, discount = _greeks(forward, strike, t, rate, sigma, is_call, carry, spot)
+    call_theta = -decay + q * spot * carry * norm_cdf(d1) - rate * strike * discount * norm_cdf(d2)
+    put_theta = -decay - q * spot * carry * norm_cdf(-d1) + rate * strike * discount * norm_cdf(-d2)
+    theta = np.where(is_call, call_theta, put_theta)
+    return {"price": price, "delta": delta, "gamma": gamma, "vega": vega / 100, "theta": theta / 365}
+
+
+def black76_greeks(forward, strike, t, rate, sigma, right) -> dict:
+    """
+    Black-76 价格与 Greeks（delta / gamma 相对期货价格）。
+    """
+    forward, strike, t, rate, sigma = _broadcast(forward, strike, t, rate, sigma)
+    is_call = _is_call(right)
+    discount = np.exp(-rate * t)
+    price, delta, gamma, vega, decay, *_ = _greeks(forward, strike, t, rate, sigma, is_call, discount, forward)
+    theta = -decay + rate * price
+    return {"price": price, "delta": delta, "gamma": gamma, "vega": vega / 100, "theta": theta / 365}
+
+
+def implied_vol(price, underlying, strike, t, rate, right, dividend_yield=0.0, model: str = "bs",
+                tol: float = 1e-8, max_iter: int = 100, low: float = 1e-4, high: float = 5.0):
+    """
+    向量化隐含波动率求解：Newton 迭代 + 二分保护。
+    每一步维护包含根的区间 [lo, hi]，Newton 步落在区间外或 vega 过小时改用二分，保证收敛。
+    model="bs" 时 underlying 为现价（含股息率），model="black76" 时为期货价格。
+    价格超出无套利区间（低于内在价值或高于上限）的合约返回 NaN。
+    """
+    price, underlying, strike, t, rate, q = _broadcast(price, underlying, strike, t, rate, dividend_yield)
+    is_call = np.broadcast_to(_is_call(right), price.shape)
+    if model == "black76":
+        q = rate
+    elif model != "bs":
+        raise ValueError(f"未知的定价模型: {model}")
+
+    forward = underlying * np.exp((rate - q) * t)
+    discount = np.exp(-rate * t)
+    target = price / discount     # 转换到未贴现的 Black 价格空间
+    intrinsic = np.where(is_call, np.maximum(forward - strike, 0.0), np.maximum(strike - forward, 0.0))
+    upper = np.where(is_call, forward, strike)
+    valid = (target > intrinsic) & (target < upper) & (t > 0)
+
+    lo = np.full(price.shape, low)
+    hi = np.full(price.shape, high)
+    sigma = np.full(price.shape, 0.3)
+    done = ~valid
+    sqrt_t = np.sqrt(t)
+    for _ in range(max_iter):
+        model_price = _black(forward, strike, t, sigma, is_call)
+        diff = model_price - target
+        d1, _ = _d1_d2(forward, strike, t, sigma)
+        vega = forward * norm_pdf(d1) * sqrt_t
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = sigma - diff / vega
+        # 收敛：下一步 Newton 修正量小于 tol，或价格已在浮点精度内相等
+        done |= (np.abs(sigma - newton) < tol) | (np.abs(diff) <= 4 * np.finfo(float).eps * target)
+        if done.all():
+            break
+        # 价格随 sigma 单调递增：据此收缩区间
+        lo = np.where(diff < 0, sigma, lo)
+        hi = np.where(diff > 0, sigma, hi)
+        use_newton = (vega > 1e-12) & (newton > lo) & (newton < hi)
+        step = np.where(use_newton, newton, 0.5 * (lo + hi))
+        sigma = np.where(done, sigma, step)
+
+    return np.where(valid & done, sigma, np.nan)
+
+
+def delta_window_mask(delta, low: float, high: float, absolute: bool = True) -> np.ndarray:
+    """
+    delta 落在 [low, high] 的布尔掩码，用于在订阅行情前从本地计算结果中挑选候选合约。
+    """
+    delta = np.asarray(delta, dtype=np.float64)
+    if absolute:
+        delta = np.abs(delta)
+    with np.errstate(invalid="ignore"):
+        return (delta >= low) & (delta <= high)
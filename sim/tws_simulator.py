@@ -0,0 +1,682 @@
+# sim/tws_simulator.py
+"""
+本地 TWS 协议模拟器：不需要真实 TWS / IB Gateway，即可端到端运行 IBApi、IBKRDispatcher 与期权扫描代码，
+测量请求吞吐量并做性能回归测试。
+
+实现的协议（按已安装 ibapi 的 server version 157 编码）：
+- 握手："API\\0" + "v100..157" → 返回 server version 与连接时间；startApi 后推送 managedAccounts / nextValidId
+- reqContractDetails → contractDetails* + contractDetailsEnd
+- reqSecDefOptParams → securityDefinitionOptionParameter + End
+- reqHistoricalData → historicalData（keepUpToDate=True 时之后按 tick_interval 推送 historicalDataUpdate）
+- reqMktData → tickPrice / tickSize（期权另有 tickOptionComputation），snapshot 以 tickSnapshotEnd 结束，
+  流式订阅按 tick_interval 持续推送随机游走报价，cancelMktData / cancelHistoricalData 停止推送
+- 未知合约返回 error 200，区间内没有K线返回 error 162
+
+数据来自 SyntheticFixtures：默认按合约确定性合成（同一合约、同一时间点的K线在任意请求区间内一致，
+本地K线缓存的合并逻辑可以直接验证），也可以用 add_bars 注入录制好的 DataFrame。
+
+用法：
+    python sim/tws_simulator.py --port 7497 --latency 0.02
+    connect_ibkr(host="127.0.0.1", port=7497, client_id=1)
+"""
+import argparse
+import heapq
+import itertools
+import math
+import socket
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from ibapi.comm import read_fields, read_msg
+from ibapi.contract import Contract
+from ibapi.message import IN, OUT
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from options.pricing import bs_greeks, years_to_expiry
+
+# ✅ 模拟的服务端版本（与 ibapi 9.81 的 MAX_CLIENT_VER 一致，所有消息按此版本编码）
+SERVER_VERSION = 157
+
+# ✅ 默认标的价格（其余标的按名称哈希出一个确定的价格）
+DEFAULT_PRICES = {"SPY": 500.0, "QQQ": 430.0, "IWM": 200.0, "SPX": 5000.0, "VIX": 18.0, "VX": 19.0}
+
+# 错误码：合约不存在 / 历史数据为空
+NO_SECURITY_DEFINITION = 200
+HMDS_NO_DATA = 162
+
+_BAR_UNITS = {"sec": 1, "secs": 1, "min": 60, "mins": 60, "hour": 3600, "hours": 3600,
+              "day": 86400, "days": 86400, "week": 7 * 86400, "weeks": 7 * 86400, "month": 30 * 86400}
+_DURATION_UNITS = {"S": 1, "D": 86400, "W": 7 * 86400, "M": 30 * 86400, "Y": 365 * 86400}
+_SESSION_OPEN = timedelta(hours=9, minutes=30)
+_SESSION_SECONDS = 390 * 60
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32("|".join(map(str, parts)).encode())
+
+
+def _encode(*fields) -> bytes:
+    # 与 ibapi.comm.make_field / make_msg 相同的编码（字段以 \0 结尾，整条消息带 4 字节长度前缀）
+    text = "".join(f"{int(f) if isinstance(f, bool) else f}\0" for f in fields).encode()
+    return struct.pack("!I", len(text)) + text
+
+
+def _read_contract(fields, start: int) -> Contract:
+    """
+    reqMktData / reqContractDetails / reqHistoricalData 在 reqId 之后的 12 个合约字段布局相同。
+    """
+    contract = Contract()
+    (con_id, contract.symbol, contract.secType, contract.lastTradeDateOrContractMonth, strike, contract.right,
+     contract.multiplier, contract.exchange, contract.primaryExchange, contract.currency, contract.localSymbol,
+     contract.tradingClass) = fields[start:start + 12]
+    contract.conId = int(con_id or 0)
+    contract.strike = float(strike or 0.0)
+    return contract
+
+
+def _parse_end(end_datetime: str) -> datetime:
+    if not end_datetime:
+        return datetime.now()
+    parts = end_datetime.replace("-", " ").split()
+    return datetime.strptime(" ".join(parts[:2]), "%Y%m%d %H:%M:%S")
+
+
+def _format_bar_time(ts: pd.Timestamp, daily: bool, format_date: int) -> str:
+    if daily:
+        return ts.strftime("%Y%m%d")
+    if format_date == 2:
+        return str(int(ts.timestamp()))
+    return ts.strftime("%Y%m%d  %H:%M:%S")
+
+
+class SyntheticFixtures:
+    """
+    模拟器的数据源。所有数据都由合约字段确定性地生成，相同输入永远得到相同输出：
+    - 标的价格：DEFAULT_PRICES / prices 覆盖，未列出的标的按名称哈希到 20~500；
+    - 期权链：今天之后的 expiries 个周五，执行价覆盖现价 ±strike_width；
+    - 期权报价与 Greeks：Black-Scholes（波动率带简单微笑）；
+    - 历史K线：价格是时间戳的确定性函数（正弦趋势 + 哈希噪声），只生成常规交易时段（日K为工作日）。
+    known 不为空时，只有其中的标的被视为存在，其余返回 error 200。
+    """
+    def __init__(self, prices: dict = None, known=None, volatility: float = 0.2, rate: float = 0.04,
+                 expiries: int = 6, strike_width: float = 0.2, max_bars: int = 20000):
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self.known = {s.upper() for s in known} if known else None
+        self.volatility = volatility
+        self.rate = rate
+        self.expiries = expiries
+        self.strike_width = strike_width
+        self.max_bars = max_bars
+        self._recorded = {}         # (symbol, secType, bar_size) -> DataFrame
+
+    def add_bars(self, symbol: str, bar_size: str, df: pd.DataFrame, sec_type: str = "STK"):
+        """
+        注入录制的K线（index 为时间，列 open/high/low/close/volume），之后同一标的、同一周期的请求按区间切片返回。
+        """
+        self._recorded[(symbol.upper(), sec_type, bar_size)] = df.sort_index()
+
+    def is_known(self, symbol: str) -> bool:
+        return self.known is None or symbol.upper() in self.known
+
+    def con_id(self, contract: Contract) -> int:
+        if contract.secType == "OPT":
+            return _seed(contract.symbol, contract.lastTradeDateOrContractMonth[:8], float(contract.strike),
+                         contract.right[:1]) & 0x7FFFFFFF
+        return _seed(contract.symbol, contract.secType) & 0x7FFFFFFF
+
+    def spot(self, symbol: str) -> float:
+        symbol = symbol.upper()
+        return self.prices.get(symbol, 20.0 + _seed(symbol) % 48000 / 100.0)
+
+    def expirations(self, symbol: str) -> list:
+        today = date.today()
+        first = today + timedelta(days=(4 - today.weekday()) % 7 or 7)
+        return [(first + timedelta(weeks=i)).strftime("%Y%m%d") for i in range(self.expiries)]
+
+    def strikes(self, symbol: str) -> list:
+        spot = self.spot(symbol)
+        step = 1.0 if spot < 200 else 5.0
+        low = math.floor(spot * (1 - self.strike_width) / step) * step
+        high = math.ceil(spot * (1 + self.strike_width) / step) * step
+        return [float(k) for k in np.arange(low, high + step / 2, step)]
+
+    def contract_details(self, contract: Contract) -> list:
+        """
+        与请求匹配的合约列表。期权请求未指定到期日 / 执行价 / 方向时枚举整条链（与 TWS 行为一致）。
+        """
+        if not self.is_known(contract.symbol):
+            return []
+        if contract.secType != "OPT":
+            return [self._describe(contract)]
+        expiry = contract.lastTradeDateOrContractMonth[:8]
+        expiries = [e for e in self.expirations(contract.symbol) if not expiry or e.startswith(expiry)]
+        strikes = [k for k in self.strikes(contract.symbol) if not contract.strike or k == contract.strike]
+        rights = [contract.right[:1].upper()] if contract.right else ["C", "P"]
+        details = []
+        for e, k, r in itertools.product(expiries, strikes, rights):
+            option = Contract()
+            option.symbol, option.secType, option.lastTradeDateOrContractMonth = contract.symbol, "OPT", e
+            option.strike, option.right, option.multiplier = k, r, "100"
+            option.exchange, option.currency = contract.exchange or "SMART", contract.currency or "USD"
+            details.append(self._describe(option))
+        return details
+
+    def _describe(self, contract: Contract) -> Contract:
+        described = Contract()
+        described.__dict__.update(contract.__dict__)
+        described.symbol = contract.symbol.upper()
+        described.conId = self.con_id(described)
+        described.exchange = contract.exchange or "SMART"
+        described.currency = contract.currency or "USD"
+        described.tradingClass = contract.tradingClass or described.symbol
+        if described.secType == "OPT":
+            described.multiplier = "100"
+            described.localSymbol = (f"{described.symbol:<6}{described.lastTradeDateOrContractMonth[2:8]}"
+                                     f"{described.right}{int(round(described.strike * 1000)):08d}")
+        else:
+            described.localSymbol = contract.localSymbol or described.symbol
+        return described
+
+    def option_params(self, symbol: str) -> list:
+        if not self.is_known(symbol):
+            return []
+        symbol = symbol.upper()
+        con_id = _seed(symbol, "STK") & 0x7FFFFFFF
+        return [(exchange, con_id, symbol, "100", self.expirations(symbol), self.strikes(symbol))
+                for exchange in ("SMART", "CBOE")]
+
+    def option_model(self, contract: Contract, spot: float = None) -> dict:
+        """
+        期权理论价与 Greeks：{"iv", "price", "delta", "gamma", "vega", "theta", "und_price"}。
+        """
+        spot = self.spot(contract.symbol) if spot is None else spot
+        iv = self.volatility + 0.3 * abs(math.log(contract.strike / spot))
+        t = years_to_expiry(contract.lastTradeDateOrContractMonth)
+        greeks = bs_greeks(spot, contract.strike, t, self.rate, iv, contract.right[:1])
+        model = {name: float(value[0]) for name, value in greeks.items()}
+        model.update(iv=iv, und_price=spot)
+        return model
+
+    def reference_price(self, contract: Contract) -> float:
+        if contract.secType == "OPT":
+            return max(0.05, self.option_model(contract)["price"])
+        return self.spot(contract.symbol)
+
+    def quote(self, contract: Contract, mid: float) -> dict:
+        """
+        以 mid 为中间价的一档报价：价差为价格的万分之二（期权为 2%），最小一个价位。
+        """
+        spread = max(0.01, mid * (0.02 if contract.secType == "OPT" else 0.0002))
+        bid = max(0.01, round(mid - spread / 2, 2))
+        ask = round(bid + max(0.01, round(spread, 2)), 2)
+        size = 1 + _seed(contract.symbol, round(mid, 2)) % 50
+        return {"bid": bid, "ask": ask, "last": round(mid, 2), "close": round(self.reference_price(contract), 2),
+                "bid_size": size * 100, "ask_size": (51 - size) * 100, "last_size": 100}
+
+    def bars(self, contract: Contract, end_datetime: str, duration: str, bar_size: str) -> pd.DataFrame:
+        """
+        [end - duration, end] 内的K线（index 为时间，列 open/high/low/close/volume）。
+        """
+        end = _parse_end(end_datetime)
+        count, unit = duration.split()
+        unit = unit.upper()[0]
+        if unit == "D":
+            # "N D" 为截至 end 的 N 个交易日（与 TWS 一致，周末不计入）
+            start = datetime.combine(pd.bdate_range(end=end.date(), periods=int(count))[0].date(), datetime.min.time())
+        else:
+            start = end - timedelta(seconds=int(count) * _DURATION_UNITS[unit])
+        recorded = self._recorded.get((contract.symbol.upper(), contract.secType, bar_size))
+        if recorded is not None:
+            return recorded.loc[(recorded.index >= start) & (recorded.index <= end)]
+
+        amount, unit = bar_size.split()
+        step = int(amount) * _BAR_UNITS[unit]
+        days = pd.bdate_range(start.date(), end.date())
+        if step >= 86400:
+            times = days[(days >= pd.Timestamp(start.date())) & (days <= pd.Timestamp(end))][::max(1, step // 86400)]
+        else:
+            offsets = pd.to_timedelta(np.arange(0, _SESSION_SECONDS, step), unit="s") + _SESSION_OPEN
+            times = pd.DatetimeIndex((days.values[:, None] + offsets.values[None, :]).ravel())
+            times = times[(times >= pd.Timestamp(start)) & (times + pd.Timedelta(seconds=step) <= pd.Timestamp(end))]
+        times = times[-self.max_bars:]
+
+        seconds = np.asarray((times - pd.Timestamp(0)).total_seconds(), dtype=np.float64)
+        seed = _seed(self.con_id(contract))
+        base = self.reference_price(contract)
+        open_ = self._path(base, seed, seconds)
+        close = self._path(base, seed, seconds + min(step, _SESSION_SECONDS))
+        wiggle = base * 0.001 * (1 + self._noise(seed + 1, seconds))
+        volume = (1000 + 5000 * (self._noise(seed + 2, seconds) + 0.5)).astype(np.int64)
+        return pd.DataFrame({
+            "open": open_.round(2),
+            "high": (np.maximum(open_, close) + wiggle).round(2),
+            "low": np.maximum(0.01, np.minimum(open_, close) - wiggle).round(2),
+            "close": close.round(2),
+            "volume": volume,
+        }, index=times)
+
+    @staticmethod
+    def _noise(seed: int, seconds: np.ndarray) -> np.ndarray:
+        # 时间戳的确定性伪随机数，范围 [-0.5, 0.5)
+        return (np.sin(seconds * 12.9898 + seed % 10007) * 43758.5453) % 1.0 - 0.5
+
+    @classmethod
+    def _path(cls, base: float, seed: int, seconds: np.ndarray) -> np.ndarray:
+        phase = seed % 1000 / 1000 * 2 * math.pi
+        trend = 0.04 * np.sin(2 * math.pi * seconds / (30 * 86400) + phase) \
+            + 0.01 * np.sin(2 * math.pi * seconds / (3.3 * 86400) + 2 * phase)
+        return base * (1 + trend + 0.002 * cls._noise(seed, seconds))
+
+
+class _Outbox:
+    """
+    一个连接的发送队列：每条消息在 due 时刻之后发出（模拟延迟），max_msg_rate > 0 时按每秒条数限速。
+    同一时刻到期的消息合并为一次 sendall。
+    """
+    def __init__(self, sock: socket.socket, max_msg_rate: float, on_sent):
+        self.sock = sock
+        self.max_msg_rate = max_msg_rate
+        self.on_sent = on_sent
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, messages: list, delay: float = 0.0):
+        due = time.monotonic() + delay
+        with self._cond:
+            for message in messages:
+                heapq.heappush(self._heap, (due, next(self._seq), message))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        next_allowed = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._closed:
+                    return
+                now = time.monotonic()
+                batch = []
+                while self._heap and self._heap[0][0] <= now:
+                    batch.append(heapq.heappop(self._heap)[2])
+                    if self.max_msg_rate > 0:
+                        break
+            if self.max_msg_rate > 0:
+                next_allowed = max(next_allowed, time.monotonic()) + 1.0 / self.max_msg_rate
+            try:
+                self.sock.sendall(b"".join(batch))
+            except OSError:
+                return
+            self.on_sent(len(batch))
+            if self.max_msg_rate > 0:
+                time.sleep(max(0.0, next_allowed - time.monotonic()))
+
+
+class _Session:
+    """
+    一个客户端连接：读线程解析请求并生成回复，流式订阅由 TWSSimulator 的推送线程统一更新。
+    """
+    def __init__(self, sim: "TWSSimulator", sock: socket.socket):
+        self.sim = sim
+        self.sock = sock
+        self.client_id = None
+        self.outbox = None
+        self.lock = threading.Lock()
+        self.quotes = {}            # reqId -> [contract, 当前中间价]
+        self.bar_streams = {}       # reqId -> [contract, bar_size, 最后一根K线 dict]
+        self._handlers = {
+            OUT.START_API: self._start_api,
+            OUT.REQ_CONTRACT_DATA: self._contract_details,
+            OUT.REQ_SEC_DEF_OPT_PARAMS: self._sec_def_opt_params,
+            OUT.REQ_HISTORICAL_DATA: self._historical_data,
+            OUT.CANCEL_HISTORICAL_DATA: self._cancel_historical_data,
+            OUT.REQ_MKT_DATA: self._market_data,
+            OUT.CANCEL_MKT_DATA: self._cancel_market_data,
+        }
+
+    # ---------- 连接与消息循环 ----------
+    def serve(self):
+        try:
+            buf = self._handshake()
+            while True:
+                size, text, buf = read_msg(buf)
+                while text:
+                    self._handle([f.decode() for f in read_fields(text)])
+                    size, text, buf = read_msg(buf)
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    return
+                buf += chunk
+        except OSError:
+            return
+        finally:
+            if self.outbox is not None:
+                self.outbox.close()
+            self.sock.close()
+            self.sim._remove(self)
+
+    def _recv_exact(self, n: int, buf: bytes) -> bytes:
+        while len(buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise OSError("客户端在握手阶段断开")
+            buf += chunk
+        return buf
+
+    def _handshake(self) -> bytes:
+        buf = self._recv_exact(8, b"")
+        if buf[:4] != b"API\0":
+            raise OSError("不是 TWS API 握手")
+        size = struct.unpack("!I", buf[4:8])[0]
+        buf = self._recv_exact(8 + size, buf)
+        versions = buf[8:8 + size].decode().split()[0]
+        low, high = (int(v) for v in versions.lstrip("v").split(".."))
+        if not low <= SERVER_VERSION <= high:
+            raise OSError(f"客户端版本范围 {versions} 不包含 {SERVER_VERSION}")
+        self.sock.sendall(_encode(SERVER_VERSION, datetime.now().strftime("%Y%m%d %H:%M:%S EST")))
+        self.outbox = _Outbox(self.sock, self.sim.max_msg_rate, self.sim._count_sent)
+        return buf[8 + size:]
+
+    def _handle(self, fields: list):
+        msg_id = int(fields[0])
+        self.sim._count_request(msg_id)
+        handler = self._handlers.get(msg_id)
+        if handler is not None:
+            handler(fields)
+
+    def send(self, messages: list, delay: float = None):
+        self.outbox.put(messages, self.sim.latency if delay is None else delay)
+
+    def _error(self, req_id: int, code: int, text: str) -> bytes:
+        return _encode(IN.ERR_MSG, 2, req_id, code, text)
+
+    # ---------- 请求处理 ----------
+    def _start_api(self, fields):
+        self.client_id = int(fields[2])
+        self.send([
+            _encode(IN.MANAGED_ACCTS, 1, self.sim.accounts),
+            _encode(IN.NEXT_VALID_ID, 1, self.sim.next_order_id),
+            self._error(-1, 2104, "Market data farm connection is OK:usfarm"),
+        ], delay=0.0)
+
+    def _contract_details(self, fields):
+        req_id = int(fields[2])
+        details = self.sim.fixtures.contract_details(_read_contract(fields, 3))
+        if not details:
+            self.send([self._error(req_id, NO_SECURITY_DEFINITION,
+                                   "No security definition has been found for the request")])
+            return
+        self.send([self._contract_data(req_id, c) for c in details] + [_encode(IN.CONTRACT_DATA_END, 1, req_id)])
+
+    @staticmethod
+    def _contract_data(req_id: int, c: Contract) -> bytes:
+        # CONTRACT_DATA version 8（字段顺序见 ibapi.decoder.processContractDataMsg）
+        under_con_id = _seed(c.symbol, "STK") & 0x7FFFFFFF if c.secType == "OPT" else 0
+        return _encode(
+            IN.CONTRACT_DATA, 8, req_id, c.symbol, c.secType, c.lastTradeDateOrContractMonth, c.strike, c.right,
+            c.exchange, c.currency, c.localSymbol, c.tradingClass, c.tradingClass, c.conId, 0.01, 1,
+            c.multiplier, "LMT,MKT", "SMART,CBOE", 1, under_con_id, c.symbol, c.primaryExchange,
+            c.lastTradeDateOrContractMonth[:6], "", "", "", "US/Eastern", "", "", "", 0, 0, 1,
+            c.symbol if c.secType == "OPT" else "", "STK" if c.secType == "OPT" else "", "26",
+            c.lastTradeDateOrContractMonth, "COMMON" if c.secType == "STK" else "",
+        )
+
+    def _sec_def_opt_params(self, fields):
+        req_id = int(fields[1])
+        messages = [
+            _encode(IN.SECURITY_DEFINITION_OPTION_PARAMETER, req_id, exchange, con_id, trading_class, multiplier,
+                    len(expirations), *expirations, len(strikes), *strikes)
+            for exchange, con_id, trading_class, multiplier, expirations, strikes
+            in self.sim.fixtures.option_params(fields[2])
+        ]
+        self.send(messages + [_encode(IN.SECURITY_DEFINITION_OPTION_PARAMETER_END, req_id)])
+
+    def _historical_data(self, fields):
+        # reqId, 12 个合约字段, includeExpired, endDateTime, barSize, duration, useRTH, whatToShow, formatDate, keepUpToDate
+        req_id = int(fields[1])
+        contract = _read_contract(fields, 2)
+        end_datetime, bar_size, duration = fields[15], fields[16], fields[17]
+        format_date, keep_up_to_date = int(fields[20]), fields[21] == "1"
+        if not self.sim.fixtures.is_known(contract.symbol):
+            self.send([self._error(req_id, NO_SECURITY_DEFINITION,
+                                   "No security definition has been found for the request")])
+            return
+        df = self.sim.fixtures.bars(contract, end_datetime, duration, bar_size)
+        if df.empty:
+            self.send([self._error(req_id, HMDS_NO_DATA,
+                                   "Historical Market Data Service error message:HMDS query returned no data")])
+            return
+        daily = bar_size.split()[1].startswith(("day", "week", "month"))
+        values = []
+        for ts, o, h, l, c, v in zip(df.index, df["open"], df["high"], df["low"], df["close"], df["volume"]):
+            values += [_format_bar_time(ts, daily, format_date), o, h, l, c, int(v), round((o + c) / 2, 4), 1]
+        start = df.index[0].strftime("%Y%m%d  %H:%M:%S")
+        end = df.index[-1].strftime("%Y%m%d  %H:%M:%S")
+        self.send([_encode(IN.HISTORICAL_DATA, req_id, start, end, len(df), *values)])
+        if keep_up_to_date:
+            last = df.iloc[-1]
+            with self.lock:
+                self.bar_streams[req_id] = [contract, _format_bar_time(df.index[-1], daily, format_date),
+                                            dict(last)]
+
+    def _cancel_historical_data(self, fields):
+        with self.lock:
+            self.bar_streams.pop(int(fields[2]), None)
+
+    def _market_data(self, fields):
+        # reqId, 12 个合约字段, [BAG 腿], deltaNeutral 标志(+3), genericTickList, snapshot, regulatorySnapshot, options
+        req_id = int(fields[2])
+        contract = _read_contract(fields, 3)
+        i = 15
+        if contract.secType == "BAG":
+            i += 1 + 4 * int(fields[i])
+        i += 4 if fields[i] == "1" else 1
+        snapshot = fields[i + 1] == "1"
+        if not self.sim.fixtures.is_known(contract.symbol):
+            self.send([self._error(req_id, NO_SECURITY_DEFINITION,
+                                   "No security definition has been found for the request")])
+            return
+        mid = self.sim.fixtures.reference_price(contract)
+        messages = self._ticks(req_id, contract, mid)
+        if snapshot:
+            self.send(messages + [_encode(IN.TICK_SNAPSHOT_END, 1, req_id)])
+            return
+        with self.lock:
+            self.quotes[req_id] = [contract, mid]
+        self.send(messages)
+
+    def _cancel_market_data(self, fields):
+        with self.lock:
+            self.quotes.pop(int(fields[2]), None)
+
+    def _ticks(self, req_id: int, contract: Contract, mid: float) -> list:
+        quote = self.sim.fixtures.quote(contract, mid)
+        messages = []
+        if contract.secType != "IND":
+            messages += [
+                _encode(IN.TICK_PRICE, 6, req_id, 1, quote["bid"], quote["bid_size"], 0),
+                _encode(IN.TICK_PRICE, 6, req_id, 2, quote["ask"], quote["ask_size"], 0),
+            ]
+        messages += [
+            _encode(IN.TICK_PRICE, 6, req_id, 4, quote["last"], quote["last_size"], 0),
+            _encode(IN.TICK_PRICE, 6, req_id, 9, quote["close"], 0, 0),
+        ]
+        if contract.secType == "OPT":
+            model = self.sim.fixtures.option_model(contract)
+            # tickOptionComputation（server version >= 156 带 tickAttrib，无版本字段）
+            messages.append(_encode(IN.TICK_OPTION_COMPUTATION, req_id, 13, 0, model["iv"], model["delta"],
+                                    model["price"], 0.0, model["gamma"], model["vega"], model["theta"],
+                                    model["und_price"]))
+        return messages
+
+    # ---------- 流式推送 ----------
+    def stream_once(self, rng: np.random.Generator):
+        with self.lock:
+            quotes = list(self.quotes.items())
+            bar_streams = list(self.bar_streams.items())
+        messages = []
+        for req_id, state in quotes:
+            contract, mid = state
+            state[1] = mid = max(0.01, mid * math.exp(0.0005 * rng.standard_normal()))
+            messages += self._ticks(req_id, contract, mid)
+        for req_id, (contract, bar_date, bar) in bar_streams:
+            bar["close"] = round(max(0.01, bar["close"] * math.exp(0.0005 * rng.standard_normal())), 2)
+            bar["high"] = max(bar["high"], bar["close"])
+            bar["low"] = min(bar["low"], bar["close"])
+            bar["volume"] += 100
+            messages.append(_encode(IN.HISTORICAL_DATA_UPDATE, req_id, 1, bar_date, bar["open"], bar["close"],
+                                    bar["high"], bar["low"], round((bar["open"] + bar["close"]) / 2, 4),
+                                    int(bar["volume"])))
+        if messages:
+            self.send(messages, delay=0.0)
+
+
+class TWSSimulator:
+    """
+    本地 TWS 模拟服务器（每个客户端连接一个线程）。
+
+    参数:
+        fixtures: 数据源，默认 SyntheticFixtures()
+        port: 0 表示由系统分配空闲端口，启动后通过 .port 读取
+        latency: 每个请求的回复延迟（秒）
+        max_msg_rate: 每个连接每秒最多发送的消息条数，0 不限
+        tick_interval: 流式行情 / keepUpToDate K线的推送间隔（秒）
+    stats 记录各类请求的数量与已发送消息总数，可用于计算吞吐量。
+    """
+    def __init__(self, fixtures: SyntheticFixtures = None, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, max_msg_rate: float = 0.0, tick_interval: float = 0.25,
+                 accounts: str = "DU0000000", next_order_id: int = 1, seed: int = 0):
+        self.fixtures = fixtures or SyntheticFixtures()
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.max_msg_rate = max_msg_rate
+        self.tick_interval = tick_interval
+        self.accounts = accounts
+        self.next_order_id = next_order_id
+        self.requests = Counter()
+        self.messages_sent = 0
+        self._rng = np.random.default_rng(seed)
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def start(self) -> "TWSSimulator":
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._accept_loop, daemon=True),
+                         threading.Thread(target=self._stream_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        self.drop_connections()
+        for t in self._threads:
+            t.join(timeout=2)
+
+    def drop_connections(self) -> int:
+        """
+        断开当前所有客户端连接（模拟 TWS 重启或网络中断），服务器继续接受新连接。返回断开的连接数。
+        """
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            try:
+                session.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return len(sessions)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {"connections": len(self._sessions), "requests": dict(self.requests),
+                    "messages_sent": self.messages_sent}
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _Session(self, sock)
+            with self._lock:
+                self._sessions.append(session)
+            threading.Thread(target=session.serve, daemon=True).start()
+
+    def _stream_loop(self):
+        while not self._stop.wait(self.tick_interval):
+            with self._lock:
+                sessions = list(self._sessions)
+            for session in sessions:
+                if session.outbox is not None:
+                    session.stream_once(self._rng)
+
+    def _remove(self, session: _Session):
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+
+    def _count_request(self, msg_id: int):
+        with self._lock:
+            self.requests[msg_id] += 1
+
+    def _count_sent(self, n: int):
+        with self._lock:
+            self.messages_sent += n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 TWS 协议模拟器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7497)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的回复延迟（秒）")
+    parser.add_argument("--max-msg-rate", type=float, default=0.0, help="每个连接每秒最多发送的消息数，0 不限")
+    parser.add_argument("--tick-interval", type=float, default=0.25, help="流式行情推送间隔（秒）")
+    args = parser.parse_args()
+
+    sim = TWSSimulator(host=args.host, port=args.port, latency=args.latency, max_msg_rate=args.max_msg_rate,
+                       tick_interval=args.tick_interval).start()
+    print(f"✅ TWS 模拟器已启动 {args.host}:{sim.port}（server version {SERVER_VERSION}），Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"📊 {sim.stats}")
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,10 @@ import argparse
 from datetime import datetime
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.volatility_data import get_realtime_vix_and_vx, calculate_hv
-from utils.contracts import create_stock_contract,create_option_contract,fetch_contract_details
+from utils.volatility_data import calculate_hv
+from utils.contracts import create_stock_contract,create_option_contract,fetch_contract_details,get_vix_contract,create_vx_contract
 from IBKR_Data import fetch_stock_data, fetch_index_data
-from IBKR_Connection import connect_ibkr, get_ibkr_price
+from IBKR_Connection import connect_ibkr, get_ibkr_prices
 from utils.date_utils import get_monthly_vix_expiry_date, find_valid_spy_expiry
 
 def parse_args():
@@ -49,8 +49,9 @@ if __name__ == "__main__":
     print(f"🚀 Mode: {mode}")
     print(f"🎯 Target Delta: {target_delta}")
 
-    # ✅ 获取实时价格
-    vix_price, vx_price = get_realtime_vix_and_vx()
+    # ✅ 获取实时价格（VIX、VX、SPY 一次性批量请求）
+    spy_contract = create_stock_contract("SPY")
+    vix_price, vx_price, spy_price = get_ibkr_prices([get_vix_contract(), create_vx_contract(), spy_contract])
 
     # ✅ 检查触发条件
     premium = vix_price - vx_price
@@ -60,9 +61,6 @@ if __name__ == "__main__":
         print("❌ No trade setup: VIX premium over VX is not enough (> 3 required).")
         # exit() # Uncomment this line to exit if the condition is not met
 
-    spy_contract = create_stock_contract("SPY")
-    spy_price = get_ibkr_price(spy_contract)
-
     if spy_price == -1 or vix_price == -1:
         print("❌ 无法获取实时价格，退出。")
         exit()
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import run_backtest
+
+
+def _frame(rows, bull=(), bear=()):
+    df = pd.DataFrame(rows, columns=["open", "high", "low", "close"],
+                      index=pd.date_range("2024-01-02 09:30", periods=len(rows), freq="min"))
+    df["BullTrendBar"] = [i in bull for i in range(len(rows))]
+    df["BearTrendBar"] = [i in bear for i in range(len(rows))]
+    return df
+
+
+def _reference(df, direction, entry, stop, hold_bars, quantity, commission):
+    """
+    逐K线循环的参考实现，用于校验向量化结果。
+    """
+    o, h, l, c = (df[col].to_numpy() for col in ("open", "high", "low", "close"))
+    n = len(df)
+    trades = []
+    i = 0
+    while i < n - 1:
+        side = 0
+        if direction in ("long", "both") and df["BullTrendBar"].iloc[i]:
+            side = 1
+        elif direction in ("short", "both") and df["BearTrendBar"].iloc[i]:
+            side = -1
+        if not side:
+            i += 1
+            continue
+        entry_price = o[i + 1] if entry == "next_open" else c[i]
+        stop_price = l[i] if side > 0 else h[i]
+        exit_bar, exit_price = None, None
+        for k in range(i + 1, min(i + 1 + hold_bars, n)):
+            if stop and (l[k] <= stop_price if side > 0 else h[k] >= stop_price):
+                exit_bar = k
+                exit_price = min(o[k], stop_price) if side > 0 else max(o[k], stop_price)
+                break
+        if exit_bar is None:
+            exit_bar = min(i + hold_bars, n - 1)
+            exit_price = c[exit_bar]
+        trades.append(side * (exit_price - entry_price) * quantity - 2 * commission)
+        i = exit_bar if entry == "next_open" else exit_bar + 1
+    return trades
+
+
+@pytest.mark.parametrize("direction", ["long", "short", "both"])
+@pytest.mark.parametrize("entry", ["next_open", "signal_close"])
+@pytest.mark.parametrize("stop", [None, "signal_extreme"])
+def test_matches_bar_by_bar_reference(direction, entry, stop):
+    rng = np.random.default_rng(7)
+    n = 3000
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    open_ = np.r_[close[0], close[:-1]] + rng.normal(0, 0.1, n)
+    high = np.maximum(open_, close) + rng.random(n) * 0.2
+    low = np.minimum(open_, close) - rng.random(n) * 0.2
+    df = _frame(np.column_stack([open_, high, low, close]))
+    df["BullTrendBar"] = rng.random(n) < 0.08
+    df["BearTrendBar"] = ~df["BullTrendBar"] & (rng.random(n) < 0.08)
+
+    result = run_backtest(df, direction=direction, entry=entry, stop=stop, hold_bars=4, quantity=10, commission=1.0)
+    expected = _reference(df, direction, entry, stop, 4, 10, 1.0)
+    assert np.allclose(result.trades["pnl"].to_numpy(), expected)
+    assert result.equity.iloc[-1] == pytest.approx(100000 + sum(expected))
+    assert result.position.abs().max() <= 1
+
+
+def test_stop_gap_fill_and_statistics():
+    rows = [
+        [10.0, 11.0, 9.5, 10.9],    # 0 多头信号，止损 9.5
+        [11.0, 11.5, 10.8, 11.2],   # 1 开盘入场 11.0
+        [9.0, 9.2, 8.8, 9.1],       # 2 跳空低于止损，按开盘价 9.0 出场
+        [9.1, 9.3, 9.0, 9.2],
+    ]
+    result = run_backtest(_frame(rows, bull={0}), hold_bars=3, quantity=100, commission=1.0)
+    trade = result.trades.iloc[0]
+    assert (trade["entry_price"], trade["exit_price"], trade["exit_reason"]) == (11.0, 9.0, "stop")
+    assert trade["pnl"] == pytest.approx(-202.0)
+    assert result.position.tolist() == [0, 1, 1, 0]
+    assert result.stats["trades"] == 1 and result.stats["win_rate"] == 0.0
+    assert result.stats["max_drawdown"] == pytest.approx(-202.0 / 100000)
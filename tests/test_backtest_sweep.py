@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import run_backtest, run_sweep
+from logic import apply_bear_trend_bar, apply_bull_trend_bar
+
+
+def _bars(seed, n=2000):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.3, n))
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.random(n) * 0.2,
+        "low": np.minimum(open_, close) - rng.random(n) * 0.2,
+        "close": close,
+    }, index=pd.date_range("2024-01-02 09:30", periods=n, freq="min"))
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_sweep_matches_direct_backtest(processes):
+    frames = {"SPY": _bars(1), "QQQ": _bars(2)}
+    results = run_sweep(frames, body_ratios=[0.5, 0.7], lookbacks=[5, 10], processes=processes,
+                        direction="both", hold_bars=3)
+
+    assert len(results) == 2 * 2 * 2
+    assert list(results.columns[:3]) == ["symbol", "body_ratio", "lookback"]
+
+    row = results[(results["symbol"] == "QQQ") & (results["body_ratio"] == 0.7) & (results["lookback"] == 10)].iloc[0]
+    signals = apply_bear_trend_bar(apply_bull_trend_bar(frames["QQQ"], body_ratio=0.7, lookback=10),
+                                   body_ratio=0.7, lookback=10)
+    expected = run_backtest(signals, direction="both", hold_bars=3).stats
+    assert row["trades"] == expected["trades"]
+    assert row["total_pnl"] == pytest.approx(expected["total_pnl"])
@@ -0,0 +1,92 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd
+
+from core.bar_cache import BarCache, duration_for, merge_bars, requested_window
+
+
+def _bars(start: str, periods: int, value: float = 1.0) -> pd.DataFrame:
+    index = pd.date_range(start, periods=periods, freq="D", name="date")
+    return pd.DataFrame({"open": value, "high": value, "low": value, "close": value, "volume": 10.0}, index=index)
+
+
+def test_requested_window_and_duration():
+    start, end = requested_window("20240131 16:00:00", "30 D")
+    assert end == datetime(2024, 1, 31, 16)
+    assert start == datetime(2024, 1, 1, 16)
+    assert duration_for(start, end) == "31 D"
+    assert duration_for(end - timedelta(hours=1), end) == "3600 S"
+    # 日线及以上周期的短缺口按整天请求
+    assert duration_for(end - timedelta(hours=1), end, "1 day") == "1 D"
+    assert duration_for(end - timedelta(seconds=30), end, "1 week") == "1 D"
+    assert duration_for(end - timedelta(hours=1), end, "5 mins") == "3600 S"
+    assert duration_for(start, end, "1 day") == "31 D"
+
+
+def test_store_load_round_trip(tmp_path):
+    cache = BarCache(root=tmp_path)
+    key = ("SPY", "1 day", "TRADES", 1)
+    df = _bars("2024-01-01", 10)
+    cache.store(key, df, datetime(2024, 1, 1), datetime(2024, 1, 10, 23))
+
+    loaded, cov_start, cov_end = cache.load(key)
+    assert loaded.index.equals(df.index)
+    assert (loaded.to_numpy() == df.to_numpy()).all()
+    assert (cov_start, cov_end) == (datetime(2024, 1, 1), datetime(2024, 1, 10, 23))
+
+
+def test_missing_ranges_head_and_tail(tmp_path):
+    cache = BarCache(root=tmp_path)
+    entry = (_bars("2024-01-05", 5), datetime(2024, 1, 5), datetime(2024, 1, 9, 23))
+
+    assert cache.missing_ranges(entry, datetime(2024, 1, 6), datetime(2024, 1, 8)) == []
+    gaps = cache.missing_ranges(entry, datetime(2024, 1, 1), datetime(2024, 1, 12))
+    # 尾部缺口从最后一根缓存K线开始，确保未收盘K线被刷新
+    assert gaps == [(datetime(2024, 1, 1), datetime(2024, 1, 5)), (datetime(2024, 1, 9), datetime(2024, 1, 12))]
+    assert cache.stats()["hits"] == 1 and cache.stats()["partial_hits"] == 1
+
+
+def test_merge_prefers_fresh_bars():
+    merged = merge_bars(_bars("2024-01-01", 3, 1.0), [_bars("2024-01-03", 2, 2.0)])
+    assert list(merged["close"]) == [1.0, 1.0, 2.0, 2.0]
+
+
+def test_eviction_keeps_size_bounded(tmp_path):
+    cache = BarCache(root=tmp_path, max_bytes=1)
+    cache.store(("A",), _bars("2024-01-01", 50), datetime(2024, 1, 1), datetime(2024, 2, 19))
+    cache.store(("B",), _bars("2024-01-01", 50), datetime(2024, 1, 1), datetime(2024, 2, 19))
+
+    assert cache.load(("A",)) is None
+    assert cache.load(("B",)) is not None
+
+
+def test_end_datetime_time_zones_are_normalised_to_local_time():
+    from dateutil.tz import tzlocal
+    from core.bar_cache import parse_end_datetime
+
+    utc = datetime(2024, 1, 31, 21, tzinfo=timezone.utc)
+    local = utc.astimezone(tzlocal()).replace(tzinfo=None)
+    assert parse_end_datetime("20240131-21:00:00") == local
+    assert parse_end_datetime("20240131 16:00:00 US/Eastern") == local
+    assert parse_end_datetime("20240131 16:00:00") == datetime(2024, 1, 31, 16)
+
+    index = pd.DatetimeIndex([utc], name="date")
+    aware = pd.DataFrame({"open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}, index=index)
+    assert merge_bars(None, [aware]).index[0].to_pydatetime() == local
+
+
+def test_coverage_never_extends_past_now(tmp_path):
+    import IBKR_Connection
+
+    cache = BarCache(root=tmp_path)
+    now = datetime.now()
+    start, end = now - timedelta(days=2), now.replace(hour=23, minute=59, second=59) + timedelta(days=1)
+    IBKR_Connection._store_window(cache, ("SPY",), None, [_bars(start.strftime("%Y-%m-%d"), 2)], start, end)
+
+    _, cov_start, cov_end = cache.load(("SPY",))
+    assert cov_start == start and now <= cov_end < end
+    # 之后再请求同一区间时尾部仍有缺口
+    assert cache.missing_ranges(cache.load(("SPY",)), start, end)
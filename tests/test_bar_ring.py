@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from core.bar_ring import BarRingBuffer, bar_time
+
+
+def test_view_is_contiguous_zero_copy_after_wrap():
+    ring = BarRingBuffer(capacity=4)
+    for t in range(1, 8):
+        ring.upsert(t, t, t, t, t, 1)
+
+    view = ring.view()
+    assert list(view["time"]) == [4, 5, 6, 7]
+    assert np.shares_memory(view, ring._data)
+    assert list(ring.view(2)["close"]) == [6.0, 7.0]
+
+
+def test_same_timestamp_updates_last_bar_in_place():
+    ring = BarRingBuffer(capacity=3)
+    ring.upsert(60, 1, 2, 0.5, 1.5, 10)
+    ring.upsert(60, 1, 3, 0.5, 2.5, 20)
+
+    assert len(ring) == 1
+    assert ring.last()["high"] == 3.0
+    assert ring.to_dataframe()["close"].tolist() == [2.5]
+
+
+def test_bar_time_formats():
+    assert bar_time("1704205800") == 1704205800
+    assert bar_time("20240102") == 1704153600
+
+
+def test_replayed_backfill_does_not_duplicate_bars():
+    ring = BarRingBuffer(capacity=10)
+    for t in (60, 120, 180):
+        ring.upsert(t, 1, 1, 1, 1, 1)
+    # 断线重连后同一订阅重新回补：旧K线忽略，最后一根原地更新，新K线追加
+    written = [ring.upsert(t, 2, 2, 2, 2, 2) for t in (60, 120, 180, 240)]
+
+    assert written == [False, False, True, True]
+    assert list(ring.view()["time"]) == [60, 120, 180, 240]
+    assert list(ring.view()["close"]) == [1.0, 1.0, 2.0, 2.0]
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import pytest
+from ibapi.common import BarData
+
+import IBKR_Connection
+from core.ibkr_dispatcher import IBKRDispatcher
+from utils.contracts import create_stock_contract
+
+
+class RecordingIB(IBKR_Connection.IBApi):
+    """
+    不连接 TWS 的 IBApi：记录发出的请求，回调（historicalData / historicalDataEnd）由测试直接调用。
+    """
+    def __init__(self):
+        super().__init__(IBKRDispatcher())
+        self.requests = []
+        self.cancelled = []
+
+    def reqHistoricalData(self, reqId, contract, **kwargs):
+        self.requests.append((reqId, contract.symbol, kwargs["keepUpToDate"]))
+
+    def cancelHistoricalData(self, reqId):
+        self.cancelled.append(reqId)
+
+
+@pytest.fixture
+def ib(monkeypatch):
+    ib = RecordingIB()
+    monkeypatch.setattr(IBKR_Connection, "get_ib", lambda kind="other": ib)
+    monkeypatch.setattr(IBKR_Connection, "_bar_subscriptions", {})
+    return ib
+
+
+def bar(epoch, close):
+    b = BarData()
+    b.date, b.open, b.high, b.low, b.close, b.volume = str(epoch), close, close, close, close, 10
+    return b
+
+
+def test_same_key_shares_one_subscription(ib):
+    spy = create_stock_contract("SPY")
+    first = IBKR_Connection.subscribe_bars(spy, "5 secs")
+    second = IBKR_Connection.subscribe_bars(spy, "5 secs")
+    other = IBKR_Connection.subscribe_bars(spy, "1 min")
+
+    assert first is second and first.refcount == 2
+    assert other is not first
+    assert [(symbol, keep) for _, symbol, keep in ib.requests] == [("SPY", True), ("SPY", True)]
+
+
+def test_cancel_only_on_last_unsubscribe(ib):
+    spy = create_stock_contract("SPY")
+    subscription = IBKR_Connection.subscribe_bars(spy, "5 secs")
+    IBKR_Connection.subscribe_bars(spy, "5 secs")
+
+    IBKR_Connection.unsubscribe_bars(subscription)
+    assert ib.cancelled == []
+    IBKR_Connection.unsubscribe_bars(subscription)
+    assert ib.cancelled == [subscription.req_id]
+    assert ib.dispatcher.pending_count() == 0
+
+    # 退订后相同的 key 重新打开新的订阅
+    again = IBKR_Connection.subscribe_bars(spy, "5 secs")
+    assert again is not subscription and len(ib.requests) == 2
+
+
+def test_ready_on_historical_data_end_and_updates_flow_into_buffer(ib):
+    subscription = IBKR_Connection.subscribe_bars(create_stock_contract("SPY"), "5 secs")
+    seen = []
+    subscription.add_listener(seen.append)
+    req_id = subscription.req_id
+
+    ib.historicalData(req_id, bar(60, 1.0))
+    ib.historicalData(req_id, bar(65, 2.0))
+    assert not subscription.ready.is_set()
+    ib.historicalDataEnd(req_id, "", "")
+    assert subscription.ready.is_set()
+
+    # 回补结束后 keepUpToDate 的增量更新：同一时间原地更新，新时间追加
+    ib.historicalDataUpdate(req_id, bar(65, 2.5))
+    ib.historicalDataUpdate(req_id, bar(70, 3.0))
+    assert list(subscription.buffer.view()["time"]) == [60, 65, 70]
+    assert list(subscription.buffer.view()["close"]) == [1.0, 2.5, 3.0]
+    assert len(seen) == 4
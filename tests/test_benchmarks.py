@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import json
+
+import numpy as np
+
+from benchmarks.run_benchmarks import compare, main, synthetic_chain, synthetic_ohlc
+
+
+def test_synthetic_inputs_are_deterministic():
+    a, b = synthetic_ohlc(1000), synthetic_ohlc(1000)
+    assert a.equals(b)
+    assert (a["low"] > 0).all() and (a["high"] >= a[["open", "close"]].max(axis=1)).all()
+    assert [t.bid for t in synthetic_chain(4, 20)[2]] == [t.bid for t in synthetic_chain(4, 20)[2]]
+
+
+def test_suite_writes_json_and_flags_regressions(tmp_path):
+    output = tmp_path / "run.json"
+    assert main(["--output", str(output), "--only", "option_chain", "calculate_hv"]) == 0
+    report = json.loads(output.read_text())
+    assert {"option_chain.400", "option_chain.2000", "calculate_hv.1260"} <= set(report["results"])
+    assert all(np.isfinite(r["median_s"]) and r["median_s"] > 0 for r in report["results"].values())
+
+    # 基线快 10 倍 → 全部判定为退化，退出码非 0
+    fast = {"results": {name: {**r, "median_s": r["median_s"] / 10} for name, r in report["results"].items()}}
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps(fast))
+    assert all(row[4] for row in compare(report, fast, threshold=0.2))
+    assert main(["--output", str(output), "--only", "option_chain", "--baseline", str(baseline)]) == 1
+
+    # 同一份结果与自身比较不退化；基线中没有的项目不参与比较
+    assert not any(row[4] for row in compare(report, report))
+    assert compare(report, {"results": {}}) == []
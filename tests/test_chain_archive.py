@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from ibapi.contract import Contract
+
+from core.greeks_store import GreeksStore
+from options.chain_archive import CHAIN_DTYPE, ChainArchiveReader, ChainArchiveWriter, ChainRecorder
+
+
+def _store(n=4):
+    store = GreeksStore()
+    for i in range(n):
+        contract = Contract()
+        contract.conId = 100 + i
+        contract.lastTradeDateOrContractMonth = "20250117"
+        contract.strike = 500 + i
+        contract.right = "CP"[i % 2]
+        store.add(contract)
+        store.bind(i, contract.conId)
+        store.update_computation(i, 13, 0.2, 0.5 - 0.1 * i, 1.0, 0.01, 0.1, -0.05, 500.0)
+    return store
+
+
+def test_recorder_appends_snapshots_and_reader_slices_zero_copy(tmp_path):
+    store = _store()
+    recorder = ChainRecorder(store, "spy", root=tmp_path)
+    base = 1_736_900_000_000
+    for k in range(3):
+        store.columns["bid"][:] = k
+        recorder.record_once(base + k * 60_000)
+
+    reader = ChainArchiveReader("SPY", recorder._writer.day, root=tmp_path)
+    assert len(reader) == 3
+    snap = reader.snapshot_at(base + 90_000)
+    assert isinstance(snap.base, np.memmap) or isinstance(snap, np.memmap)
+    assert snap["bid"].tolist() == [1.0] * 4
+    assert snap["right"].tolist() == [b"C", b"P", b"C", b"P"]
+    assert reader.snapshot_at(base - 1) is None
+
+    window = reader.between(base + 60_000, base + 120_000)
+    assert len(window) == 8 and set(window["ts"].tolist()) == {base + 60_000, base + 120_000}
+    df = reader.to_dataframe(snap)
+    assert df["conId"].tolist() == [100, 101, 102, 103]
+
+
+def test_writer_truncates_unindexed_tail(tmp_path):
+    writer = ChainArchiveWriter("SPY", "20250115", root=tmp_path)
+    snapshot = np.zeros(2, dtype=CHAIN_DTYPE)
+    snapshot["ts"] = 1
+    writer.append(snapshot)
+    with open(writer.data_path, "ab") as f:
+        f.write(b"\x00" * 17)           # 模拟写到一半退出
+
+    ChainArchiveWriter("SPY", "20250115", root=tmp_path).append(snapshot, ts_ms=2)
+    reader = ChainArchiveReader("SPY", "20250115", root=tmp_path)
+    assert reader.timestamps.tolist() == [1, 2]
+    assert writer.data_path.stat().st_size == 4 * CHAIN_DTYPE.itemsize
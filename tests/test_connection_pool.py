@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import IBKR_Connection
+from core.connection_pool import ConnectionPool
+from sim.tws_simulator import SyntheticFixtures, TWSSimulator
+from utils.contracts import create_stock_contract
+
+
+class FakeConnection:
+    def __init__(self, index):
+        self.index = index
+        self.connected = True
+
+    def isConnected(self):
+        return self.connected
+
+    def disconnect(self):
+        self.connected = False
+
+
+def make_pool(size, fail=()):
+    opened = []
+
+    def connect(index):
+        if index in fail:
+            return None
+        opened.append(index)
+        return FakeConnection(index)
+
+    return ConnectionPool(connect, size), opened
+
+
+def test_live_kinds_pinned_and_bulk_round_robin():
+    pool, _ = make_pool(3)
+    assert {pool.get("tick").index, pool.get("order").index, pool.get("bars").index} == {0}
+    assert [pool.get("historical").index for _ in range(4)] == [1, 2, 1, 2]
+    assert pool.get("contractDetails").index in (1, 2)
+
+
+def test_fallback_and_lazy_reconnect():
+    pool, opened = make_pool(3, fail={1})
+    assert [pool.get("historical").index for _ in range(3)] == [2, 2, 2]
+
+    single, _ = make_pool(1)
+    assert single.get("historical").index == 0
+
+    pool.connection(2).disconnect()
+    assert pool.get("secDef").index == 2
+    assert opened.count(2) == 2
+
+    primary = pool.connection(0)
+    pool.close(include_primary=False)
+    assert pool.connections() == [primary] and primary.isConnected()
+
+
+def test_pool_against_simulator():
+    fixtures = SyntheticFixtures(known={"SPY"})
+    with TWSSimulator(fixtures, latency=0.001) as sim:
+        pool = IBKR_Connection.start_connection_pool(3, timeout=5, host="127.0.0.1", port=sim.port, client_id=50)
+        try:
+            primary = IBKR_Connection.get_ib("tick")
+            workers = {IBKR_Connection.get_ib("historical") for _ in range(2)}
+            assert primary is IBKR_Connection.connect_ibkr()
+            assert primary not in workers and len(workers) == 2
+            assert sorted(ib.clientId for ib in pool.connections()) == [50, 51, 52]
+            # 每个连接有自己的 dispatcher 和互不重叠的 reqId 区间
+            assert len({ib.dispatcher for ib in pool.connections()}) == 3
+            assert len({ib.dispatcher.next_id() // 100_000_000 for ib in pool.connections()}) == 3
+
+            spy = create_stock_contract("SPY")
+            futures = [IBKR_Connection.fetch_historical_data_future(spy, "20260305 16:00:00", "1 D", "5 mins")
+                       for _ in range(4)]
+            assert all(len(f.result(timeout=5)) == 78 for f in futures)
+            assert IBKR_Connection.get_request_telemetry().snapshot()["kinds"]["historical"]["outcomes"]["ok"] >= 4
+        finally:
+            IBKR_Connection.disconnect_ibkr()
+        assert IBKR_Connection.get_connection_pool() is None
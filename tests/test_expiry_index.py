@@ -0,0 +1,113 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from options.expiry_index import ExpiryIndex
+
+CHAINS = [
+    {"exchange": "SMART", "tradingClass": "VIX", "expirations": ["20250416", "20250521"]},
+    {"exchange": "CBOE", "tradingClass": "VIX", "expirations": ["20250416", "20250618"]},
+    {"exchange": "SMART", "tradingClass": "VIXW", "expirations": ["20250423", "20250430"]},
+]
+
+
+def _index():
+    calls = []
+
+    def loader(symbol, sec_type, exchange):
+        calls.append(symbol)
+        return CHAINS
+
+    index = ExpiryIndex(loader=loader)
+    index.load("VIX", sec_type="IND", exchange="CBOE")
+    index.load("VIX", sec_type="IND", exchange="CBOE")   # 同一交易日不重复请求
+    return index, calls
+
+
+def test_index_loads_once_per_session():
+    index, calls = _index()
+    assert calls == ["VIX"]
+    assert index.trading_classes("VIX") == ["VIX", "VIXW"]
+    assert list(index.expirations("VIX", "VIX")) == [20250416, 20250521, 20250618]
+
+
+def test_nearest_expiry_bisect():
+    index, _ = _index()
+    assert index.nearest("VIX", "2025-04-17") == "20250423"
+    assert index.nearest("VIX", "2025-04-17", trading_class="VIX") == "20250521"
+    assert index.nearest("VIX", "20250416") == "20250416"
+    assert index.nearest("VIX", "2025-04-24", trading_class="VIX", max_days_forward=7) is None
+    assert index.nearest("VIX", "2025-07-01") is None
+
+
+def test_empty_result_is_retried_and_keeps_previous_index():
+    results = [[], CHAINS, []]
+
+    def loader(symbol, sec_type, exchange):
+        return results.pop(0)
+
+    index = ExpiryIndex(loader=loader)
+    index.load("VIX")                       # 超时 / 断线返回空：不标记为已加载
+    index.load("VIX")
+    assert index.nearest("VIX", "2025-04-17") == "20250423"
+    index.load("VIX", force=True)           # 刷新失败时保留原索引
+    assert index.nearest("VIX", "2025-04-17") == "20250423"
+    assert results == []
+
+
+def test_slow_symbol_does_not_block_other_symbols():
+    import threading
+
+    release, started = threading.Event(), threading.Event()
+
+    def loader(symbol, sec_type, exchange):
+        if symbol == "SLOW":
+            started.set()
+            release.wait(5)
+        return CHAINS
+
+    index = ExpiryIndex(loader=loader)
+    slow = threading.Thread(target=index.load, args=("SLOW",))
+    slow.start()
+    assert started.wait(2)
+    index.load("VIX")                       # SLOW 的请求未返回时其它标的照常加载
+    assert index.nearest("VIX", "2025-04-17") == "20250423"
+    release.set()
+    slow.join()
+
+
+def test_index_is_filled_through_ibapi_secdef_callbacks(monkeypatch):
+    # reqSecDefOptParams 的回复经 ibapi Decoder 分发：只有名字正确的 securityDefinitionOptionParameter(End)
+    # 回调才会被调用，否则请求一直等到超时，索引为空
+    from types import SimpleNamespace
+
+    from ibapi.decoder import Decoder
+    from ibapi.message import IN
+
+    import IBKR_Connection
+    from core.ibkr_dispatcher import IBKRDispatcher
+    from options import option_chain_utils
+
+    class ReplyingIB(IBKR_Connection.IBApi):
+        def __init__(self):
+            super().__init__(IBKRDispatcher())
+            self.decoder = Decoder(self, 157)
+
+        def reqSecDefOptParams(self, reqId, **_):
+            for chain in CHAINS:
+                expirations = chain["expirations"]
+                self.decoder.interpret([str(IN.SECURITY_DEFINITION_OPTION_PARAMETER), str(reqId), chain["exchange"],
+                                        "13455763", chain["tradingClass"], "100", str(len(expirations)),
+                                        *expirations, "1", "20.0"])
+            self.decoder.interpret([str(IN.SECURITY_DEFINITION_OPTION_PARAMETER_END), str(reqId)])
+
+    ib = ReplyingIB()
+    underlying = SimpleNamespace(contract=SimpleNamespace(conId=13455763, secType="IND"))
+    monkeypatch.setattr(option_chain_utils, "get_ib", lambda kind="other": ib)
+    monkeypatch.setattr(option_chain_utils, "fetch_contract_details", lambda contract: [underlying])
+
+    index = ExpiryIndex()
+    index.load("VIX", sec_type="IND", exchange="CBOE")
+    assert index.trading_classes("VIX") == ["VIX", "VIXW"]
+    assert index.nearest("VIX", "2025-04-17") == "20250423"
+    assert ib.dispatcher.pending_count() == 0
@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from ibapi.contract import Contract
+
+from core.greeks_store import GreeksStore
+
+
+def _option(con_id, strike, right):
+    contract = Contract()
+    contract.conId = con_id
+    contract.symbol = "SPY"
+    contract.secType = "OPT"
+    contract.lastTradeDateOrContractMonth = "20250117"
+    contract.strike = strike
+    contract.right = right
+    return contract
+
+
+def test_rows_grow_by_doubling_and_keep_data():
+    store = GreeksStore(capacity=2)
+    for i in range(5):
+        store.add(_option(100 + i, 500 + i, "C"))
+        store.bind(i, 100 + i)
+        store.update_computation(i, 13, 0.2, 0.1 * i, 1.0, 0.01, 0.1, -0.05, 500.0)
+
+    assert len(store) == 5
+    assert store.add(_option(102, 502, "C")) == 2       # 重复登记返回原行号
+    assert np.allclose(store.column("delta"), [0.0, 0.1, 0.2, 0.3, 0.4])
+    assert store.column("expiry")[0] == 20250117
+
+
+def test_delta_mask_is_vectorized_over_calls_and_puts():
+    store = GreeksStore()
+    deltas = {1: ("C", 0.65), 2: ("C", 0.9), 3: ("P", -0.7), 4: ("P", -0.3), 5: ("C", None)}
+    for con_id, (right, delta) in deltas.items():
+        store.add(_option(con_id, 500, right))
+        store.bind(con_id, con_id)
+        if delta is not None:
+            store.update_computation(con_id, 13, 0.2, delta, 1.0, 0.01, 0.1, -0.05, 500.0)
+
+    assert store.delta_mask(0.6, 0.8).tolist() == [True, False, True, False, False]
+    assert store.delta_mask(0.6, 0.8, right="P").tolist() == [False, False, True, False, False]
+    assert store.to_dataframe(store.delta_mask(0.6, 0.8))["conId"].tolist() == [1, 3]
+
+
+def test_sentinels_become_nan_and_bid_ask_are_recorded():
+    store = GreeksStore()
+    store.add(_option(7, 500, "C"))
+    store.bind(42, 7)
+    store.update_computation(42, 13, -1.0, -2.0, 1.7976931348623157e308, -2.0, -2.0, -2.0, 501.0)
+    store.update_computation(42, 10, 0.2, 0.5, 3.1, None, None, None, 501.0)
+    store.update_price(42, 2, 3.3)
+
+    row = store.row_of(7)
+    assert np.isnan(store.columns["iv"][row]) and np.isnan(store.columns["delta"][row])
+    assert store.columns["und_price"][row] == 501.0
+    assert store.columns["bid"][row] == 3.1 and store.columns["ask"][row] == 3.3
+    assert not store.update_price(99, 1, 1.0)
+
+
+def test_ibapi_routes_option_computation_into_store():
+    import IBKR_Connection
+
+    api = IBKR_Connection.IBApi()
+    api.greeks = store = GreeksStore()
+    store.add(_option(9, 500, "P"))
+    store.bind(77, 9)
+    # ibapi 9.81 签名：reqId, tickType, tickAttrib, impliedVol, delta, optPrice, pvDividend, gamma, vega, theta, undPrice
+    api.tickOptionComputation(77, 13, 0, 0.25, -0.4, 2.0, 0.0, 0.02, 0.3, -0.1, 499.0)
+    # 旧签名（无 tickAttrib）
+    api.tickOptionComputation(77, 11, 0.26, -0.41, 2.1, 0.0, 0.02, 0.3, -0.1, 499.0)
+
+    row = store.row_of(9)
+    assert store.columns["delta"][row] == -0.4
+    assert store.columns["ask"][row] == 2.1
+
+
+def test_tick_written_during_grow_is_not_lost(monkeypatch):
+    import threading
+    from core import greeks_store
+
+    store = GreeksStore(capacity=1)
+    store.add(_option(1, 500, "C"))
+    store.bind(1, 1)
+    reader = threading.Thread(target=store.update_price, args=(1, 1, 3.5))
+    calls = []
+
+    class NumpyDuringGrow:
+        # 扩容时 bid 列复制完成之后，reader 线程写入一个 tick
+        def __getattr__(self, name):
+            return getattr(np, name)
+
+        def full(self, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 7:
+                reader.start()
+                reader.join(0.2)
+            return np.full(*args, **kwargs)
+
+    monkeypatch.setattr(greeks_store, "np", NumpyDuringGrow())
+    store.add(_option(2, 501, "C"))
+    reader.join()
+    assert store.column("bid")[0] == 3.5
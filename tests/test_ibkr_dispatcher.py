@@ -0,0 +1,144 @@
+import sys
+import threading
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.ibkr_dispatcher import IBKRDispatcher, chain_future
+from tests.test_helpers import patch_dispatcher_for_testing
+
+
+def test_next_id_unique_across_threads():
+    dispatcher = IBKRDispatcher()
+    ids = []
+    lock = threading.Lock()
+
+    def worker():
+        local = [dispatcher.next_id() for _ in range(5000)]
+        with lock:
+            ids.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(ids) == len(set(ids)) == 8 * 5000
+
+
+def test_results_not_lost_under_concurrency():
+    dispatcher = IBKRDispatcher()
+    errors = []
+
+    def worker():
+        for i in range(500):
+            req_id = dispatcher.next_id()
+            dispatcher.register(req_id)
+            filler = threading.Thread(target=lambda: (
+                dispatcher.set_result(req_id, i),
+                dispatcher.signal_done(req_id),
+            ))
+            filler.start()
+            result = dispatcher.wait(req_id, timeout=5)
+            filler.join()
+            dispatcher.clear(req_id)
+            if result != [i]:
+                errors.append((req_id, result))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert dispatcher.pending_count() == 0
+
+
+def test_late_results_after_clear_are_dropped():
+    dispatcher = IBKRDispatcher()
+    patch_dispatcher_for_testing(IBKRDispatcher)
+
+    req_id = dispatcher.next_id()
+    dispatcher.register(req_id)
+    dispatcher.set_result(req_id, 1.0)
+    dispatcher.clear(req_id)
+    dispatcher.set_result(req_id, 2.0)
+
+    assert dispatcher.get_all_results() == {}
+    assert dispatcher.wait(req_id, timeout=0) == []
+
+
+def test_dispatch_calls_registered_handler():
+    dispatcher = IBKRDispatcher()
+    received = []
+
+    req_id = dispatcher.next_id()
+    dispatcher.register(req_id, handler=lambda *args: received.append(args), use_event=False)
+    dispatcher.dispatch(req_id, "bar", 1)
+
+    assert received == [("bar", 1)]
+    assert dispatcher.wait(req_id, timeout=10) == []
+
+
+def test_submit_resolves_future_on_signal_done():
+    dispatcher = IBKRDispatcher()
+
+    req_id = dispatcher.next_id()
+    future = dispatcher.submit(req_id, timeout=5, transform=sum)
+    threading.Thread(target=lambda: (
+        dispatcher.set_result(req_id, 1),
+        dispatcher.set_result(req_id, 2),
+        dispatcher.signal_done(req_id),
+    )).start()
+
+    assert future.result(timeout=5) == 3
+    assert dispatcher.pending_count() == 0
+
+
+def test_submit_timeout_returns_partial_results():
+    dispatcher = IBKRDispatcher()
+
+    req_id = dispatcher.next_id()
+    future = dispatcher.submit(req_id, timeout=0.05)
+    dispatcher.set_result(req_id, "partial")
+
+    assert future.result(timeout=5) == ["partial"]
+    assert dispatcher.pending_count() == 0
+
+
+def test_cancel_on_timeout_only_for_timed_out_requests():
+    class Connection:
+        cancelled = []
+
+        def isConnected(self):
+            return True
+
+    dispatcher = IBKRDispatcher()
+    dispatcher.connection = Connection()
+    cancel = lambda conn, req_id: conn.cancelled.append(req_id)
+
+    finished_id, timed_out_id = dispatcher.next_id(), dispatcher.next_id()
+    finished = dispatcher.submit(finished_id, timeout=5, cancel_on_timeout=cancel)
+    timed_out = dispatcher.submit(timed_out_id, timeout=0.05, cancel_on_timeout=cancel)
+    dispatcher.signal_done(finished_id)
+
+    finished.result(timeout=5)
+    timed_out.result(timeout=5)
+    assert Connection.cancelled == [timed_out_id]
+
+
+def test_chain_future_unwraps_nested_future():
+    dispatcher = IBKRDispatcher()
+
+    first_id, second_id = dispatcher.next_id(), dispatcher.next_id()
+    first = dispatcher.submit(first_id, timeout=5)
+    second = dispatcher.submit(second_id, timeout=5, transform=len)
+    chained = chain_future(first, lambda results: second if not results else results[0])
+
+    dispatcher.signal_done(first_id)
+    dispatcher.set_result(second_id, "a")
+    dispatcher.set_result(second_id, "b")
+    dispatcher.signal_done(second_id)
+
+    assert chained.result(timeout=5) == 2
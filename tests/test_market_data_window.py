@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import math
+from types import SimpleNamespace
+
+from options.chain_table import assemble_option_chain
+from options.market_data_window import AdaptiveWindow, WindowedMarketDataFetcher
+
+
+class _Event(list):
+    def __iadd__(self, handler):
+        self.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.remove(handler)
+        return self
+
+
+class FakeIB:
+    """
+    每次 waitOnUpdate 让在途合约前进一步：第 2 步到齐数据；conId 为负的合约永远不返回。
+    超过 line_limit 个同时订阅时，以 error 101 拒绝。
+    """
+    def __init__(self, line_limit):
+        self.line_limit = line_limit
+        self.errorEvent = _Event()
+        self.live = {}
+        self.max_live = 0
+        self.rejected = []
+
+    def reqMktData(self, contract, generic_ticks, snapshot, regulatory):
+        ticker = SimpleNamespace(contract=contract, bid=math.nan, ask=math.nan, modelGreeks=None, steps=0)
+        if len(self.live) >= self.line_limit:
+            self.rejected.append(contract)
+        else:
+            self.live[contract.conId] = ticker
+            self.max_live = max(self.max_live, len(self.live))
+        return ticker
+
+    def cancelMktData(self, contract):
+        self.live.pop(contract.conId, None)
+
+    def waitOnUpdate(self, timeout):
+        rejected, self.rejected = self.rejected, []
+        for contract in rejected:
+            for handler in list(self.errorEvent):
+                handler(-1, 101, "Max number of tickers has been reached", contract)
+        for ticker in self.live.values():
+            ticker.steps += 1
+            if ticker.steps >= 2 and ticker.contract.conId > 0:
+                ticker.bid, ticker.ask = 1.0, 1.1
+                ticker.modelGreeks = SimpleNamespace(delta=0.5, gamma=0.01, theta=-0.1, vega=0.2, impliedVol=0.2)
+
+
+def _contracts(n):
+    return [SimpleNamespace(conId=i + 1, strike=100 + i // 2, right="CP"[i % 2]) for i in range(n)]
+
+
+def test_window_retires_completed_contracts_and_respects_line_limit():
+    ib = FakeIB(line_limit=8)
+    fetcher = WindowedMarketDataFetcher(ib, deadline=1.0, window=AdaptiveWindow(initial=10, minimum=2), poll_interval=0)
+    contracts = _contracts(40)
+    tickers = fetcher.fetch(contracts)
+
+    assert [t.contract.conId for t in tickers] == [c.conId for c in contracts]
+    assert all(t.modelGreeks is not None for t in tickers)
+    assert ib.max_live <= 8
+    assert fetcher.window.maximum <= 8
+    assert ib.live == {}
+
+
+def test_slow_contract_hits_its_deadline_without_blocking_others():
+    ib = FakeIB(line_limit=100)
+    contracts = _contracts(6)
+    contracts[2].conId = -3
+    fetcher = WindowedMarketDataFetcher(ib, deadline=0.05, poll_interval=0)
+    tickers = fetcher.fetch(contracts)
+
+    assert tickers[2].modelGreeks is None
+    chain = assemble_option_chain(tickers)
+    assert chain[101]["C"] is None and chain[101]["P"]["delta"] == 0.5
+    assert sorted(chain) == [100, 101, 102]
+
+
+def test_aimd_window():
+    window = AdaptiveWindow(initial=4, minimum=1, maximum=10)
+    for _ in range(4):
+        window.on_complete()
+    assert window.size == 5
+    window.on_limit(in_flight=6)
+    assert (window.size, window.maximum) == (2, 5)
@@ -0,0 +1,57 @@
+import sys
+import time
+from concurrent.futures import Future
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.memo import SingleFlightCache
+
+
+def test_concurrent_identical_lookups_share_one_load():
+    cache = SingleFlightCache()
+    calls = []
+    pending = Future()
+
+    def loader():
+        calls.append(1)
+        return pending
+
+    first = cache.get_or_load("SPY", loader)
+    second = cache.get_or_load("SPY", loader)
+    pending.set_result(["details"])
+
+    assert first.result(timeout=1) == second.result(timeout=1) == ["details"]
+    assert len(calls) == 1
+    assert cache.get_or_load("SPY", loader).result(timeout=1) == ["details"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "coalesced": 1, "size": 1}
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def test_negative_results_use_short_ttl():
+    cache = SingleFlightCache(ttl=60, negative_ttl=0.01)
+    cache.get_or_load("missing", lambda: _done([])).result()
+    time.sleep(0.02)
+    assert cache.get_or_load("missing", lambda: _done(["now listed"])).result() == ["now listed"]
+
+
+def test_failures_are_not_cached():
+    cache = SingleFlightCache()
+    failed = Future()
+    failed.set_exception(TimeoutError())
+
+    assert isinstance(cache.get_or_load("SPY", lambda: failed).exception(), TimeoutError)
+    assert cache.get_or_load("SPY", lambda: _done(["ok"])).result() == ["ok"]
+
+
+def test_lru_bound():
+    cache = SingleFlightCache(maxsize=2)
+    for key in ("a", "b", "c"):
+        cache.get_or_load(key, lambda: _done([key])).result()
+
+    assert cache.stats()["size"] == 2
+    assert cache.get_or_load("a", lambda: _done(["reloaded"])).result() == ["reloaded"]
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from concurrent.futures import Future
+
+import pandas as pd
+import pytest
+
+import IBKR_Connection
+from core.bar_cache import BarCache
+from core.ibkr_dispatcher import IBKRRequestError
+from core.pacing import HistoricalPacer
+from options import option_data_fetcher
+
+
+def _bars(start, periods, freq, value):
+    index = pd.date_range(start, periods=periods, freq=freq, name="date")
+    return pd.DataFrame({"open": value, "high": value, "low": value, "close": value, "volume": 1.0}, index=index)
+
+
+@pytest.fixture
+def fake_tws(tmp_path, monkeypatch):
+    monkeypatch.setattr(IBKR_Connection, "_bar_cache", BarCache(root=tmp_path))
+    monkeypatch.setattr(IBKR_Connection, "_historical_pacer", HistoricalPacer())
+    monkeypatch.setattr(IBKR_Connection, "_no_definition", {})
+    requests = []
+
+    def fake_future(contract, end_datetime, duration, bar_size, what_to_show="TRADES", timeout=15,
+                    raise_on_error=False):
+        requests.append((contract.secType, contract.strike, contract.right, contract.includeExpired))
+        future = Future()
+        if contract.secType == "STK":
+            future.set_result(_bars("2025-01-08", 3, "D", 501.3))
+        elif contract.strike % 2:       # 奇数执行价不存在
+            future.set_exception(IBKRRequestError(1, 200, "No security definition has been found"))
+        else:
+            future.set_result(_bars("2025-01-10 09:30", 78, "5min", contract.strike / 100))
+        return future
+
+    monkeypatch.setattr(IBKR_Connection, "fetch_historical_data_future", fake_future)
+    monkeypatch.setattr(IBKR_Connection, "connect_ibkr", lambda *a, **k: object())
+    return requests
+
+
+def test_bulk_fetch_then_repeat_run_is_served_from_cache(fake_tws, monkeypatch):
+    df = option_data_fetcher.fetch_option_data("SPY", "2025-01-10", "2025-01-17", strike_range=2)
+
+    assert sorted(set(df["strike"])) == [500.0, 502.0]
+    assert set(df["right"]) == {"C", "P"}
+    assert len(df) == 4 * 78
+    first_run = len(fake_tws)
+    assert first_run == 1 + 5 * 2       # 标的 + 5 个执行价 × 2
+
+    def offline(*args, **kwargs):
+        raise AssertionError("重复回测不应连接 TWS")
+
+    monkeypatch.setattr(IBKR_Connection, "connect_ibkr", offline)
+    again = option_data_fetcher.fetch_option_data("SPY", "2025-01-10", "2025-01-17", strike_range=2)
+    assert len(fake_tws) == first_run
+    pd.testing.assert_frame_equal(again, df, check_index_type=False, check_freq=False)
+
+
+def test_candidate_strikes_grid():
+    assert option_data_fetcher.candidate_strikes(501.3, 2, 1.0).tolist() == [499.0, 500.0, 501.0, 502.0, 503.0]
+    assert option_data_fetcher.candidate_strikes(501.3, 5, 2.5).tolist() == [497.5, 500.0, 502.5, 505.0, 507.5]
+
+
+def test_missing_expired_contracts_are_cached_but_live_ones_only_in_memory(fake_tws, monkeypatch):
+    option_data_fetcher.fetch_option_data("SPY", "2025-01-10", "2025-01-17", strike_range=2)
+    # 过期期权请求带 includeExpired
+    assert all(expired for sec_type, _, _, expired in fake_tws if sec_type == "OPT")
+    first_run = len(fake_tws)
+
+    # includeExpired 下的 200 是确定的结果：新进程（内存记录已清空）重复回测也不再请求
+    monkeypatch.setattr(IBKR_Connection, "_no_definition", {})
+    monkeypatch.setattr(IBKR_Connection, "_historical_pacer", HistoricalPacer())    # 跳过相同请求 15 秒间隔
+    option_data_fetcher.fetch_option_data("SPY", "2025-01-10", "2025-01-17", strike_range=2)
+    assert len(fake_tws) == first_run
+
+    # 未到期合约的 200 可能只是字段不全：只在内存中短期记住，过期后重新请求
+    option_data_fetcher.fetch_option_data("SPY", "2025-01-10", "2999-01-15", strike_range=2)
+    second_run = len(fake_tws)
+    monkeypatch.setattr(IBKR_Connection, "_no_definition", {})
+    monkeypatch.setattr(IBKR_Connection, "_historical_pacer", HistoricalPacer())
+    option_data_fetcher.fetch_option_data("SPY", "2025-01-10", "2999-01-15", strike_range=2)
+    retried = fake_tws[second_run:]
+    assert sorted(strike for sec_type, strike, _, _ in retried if sec_type == "OPT") == [499.0, 499.0, 501.0,
+                                                                                          501.0, 503.0, 503.0]
+    assert not any(expired for _, _, _, expired in retried)
+
+
+def test_single_expired_option_requests_include_expired(fake_tws):
+    df = option_data_fetcher.get_single_option_data("SPY", "2024-03-15", 560, "C", duration="1 D",
+                                                    bar_size="5 mins", end_datetime="20250110 16:00:00")
+    assert len(df) == 78
+    assert fake_tws == [("OPT", 560, "C", True)]
+    live = option_data_fetcher.historical_option_contract("SPY", "2999-01-15", 560, "C")
+    assert not live.includeExpired
@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from core.pacing import (HistoricalPacer, SlidingWindowLimiter, TokenBucket,
+                         is_pacing_violation, is_small_bar)
+
+
+def test_is_small_bar():
+    assert is_small_bar("5 secs")
+    assert is_small_bar("30 secs")
+    assert not is_small_bar("1 min")
+    assert not is_small_bar("1 day")
+
+
+def test_is_pacing_violation():
+    assert is_pacing_violation(162, "Historical Market Data Service error message:API historical data query cancelled: Pacing violation")
+    assert not is_pacing_violation(162, "HMDS query returned no data")
+    assert not is_pacing_violation(200, "pacing violation")
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(capacity=2, rate=1.0)
+    now = bucket._stamp
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) > 0.9
+    assert bucket.delay(now + 1.0) == 0.0
+
+
+def test_sliding_window_is_strict():
+    window = SlidingWindowLimiter(limit=2, window=10)
+    window.take(0.0)
+    window.take(1.0)
+    assert window.delay(5.0) == 5.0
+    assert window.delay(10.0) == 0.0
+
+
+def test_pacer_limits_open_and_identical_requests():
+    pacer = HistoricalPacer(max_open=1)
+    assert pacer.reserve("req-a", "SPY") == 0.0
+    assert pacer.reserve("req-b", "QQQ") > 0
+    pacer.release()
+    assert pacer.reserve("req-a", "SPY") > 0     # 相同请求 15 秒内不可重复
+    assert pacer.reserve("req-b", "QQQ") == 0.0
+
+
+def test_delayed_request_does_not_block_the_others(monkeypatch):
+    import time
+    from concurrent.futures import Future
+
+    import pandas as pd
+
+    import IBKR_Connection
+    from core.contract_key import contract_key
+    from utils.contracts import create_stock_contract
+
+    spy, qqq = create_stock_contract("SPY"), create_stock_contract("QQQ")
+    start, sent = time.monotonic(), {}
+
+    class Pacer:
+        # SPY 刚请求过相同数据：0.3 秒内不可发送；QQQ 随时可以发送
+        def reserve(self, request_key, key, small_bar=False):
+            if key == contract_key(spy) and time.monotonic() - start < 0.3:
+                return 0.3 - (time.monotonic() - start)
+            return 0.0
+
+        def release(self):
+            pass
+
+    def fake_future(contract, *args, **kwargs):
+        sent[contract.symbol] = time.monotonic() - start
+        future = Future()
+        future.set_result(pd.DataFrame({"close": [1.0]}))
+        return future
+
+    monkeypatch.setattr(IBKR_Connection, "fetch_historical_data_future", fake_future)
+    results = IBKR_Connection.fetch_historical_many([spy, qqq], pacer=Pacer())
+    assert sent["QQQ"] < 0.1 and 0.3 <= sent["SPY"] < 1.0
+    assert all(len(df) == 1 for df in results)
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import threading
+import time
+from concurrent.futures import Future
+
+from ibapi.contract import Contract
+
+import IBKR_Connection
+
+
+def _contract(symbol):
+    contract = Contract()
+    contract.symbol = symbol
+    contract.secType = "STK"
+    return contract
+
+
+def test_get_ibkr_prices_issues_all_requests_at_once(monkeypatch):
+    issued = []
+
+    def fake_price_future(contract, timeout, max_age, stream):
+        issued.append(contract.symbol)
+        future = Future()
+        price = {"SPY": 500.0, "QQQ": 400.0, "BAD": -1}[contract.symbol]
+        threading.Timer(0.2, future.set_result, args=(price,)).start()
+        return future
+
+    monkeypatch.setattr(IBKR_Connection, "get_ibkr_price_future", fake_price_future)
+    start = time.perf_counter()
+    prices = IBKR_Connection.get_ibkr_prices([_contract("SPY"), _contract("QQQ"), _contract("BAD"), _contract("SPY")])
+    elapsed = time.perf_counter() - start
+
+    assert prices == [500.0, 400.0, -1, 500.0]
+    assert issued == ["SPY", "QQQ", "BAD"]      # 重复合约只请求一次
+    assert elapsed < 0.5                        # 并发等待，而不是 3 × 0.2s
+
+
+def test_get_ibkr_prices_times_out_as_minus_one(monkeypatch):
+    monkeypatch.setattr(IBKR_Connection, "get_ibkr_price_future", lambda *args: Future())
+    assert IBKR_Connection.get_ibkr_prices([_contract("SPY")], timeout=0.05) == [-1]
+
+
+def test_get_ibkr_prices_shares_one_deadline(monkeypatch):
+    def fake_price_future(contract, timeout, max_age, stream):
+        future = Future()
+        if contract.symbol == "SPY":
+            future.set_result(500.0)
+        else:                                   # 实时报价失败后 fallback 仍在进行
+            threading.Timer(3 * timeout, lambda: future.cancelled() or future.set_result(400.0)).start()
+        return future
+
+    monkeypatch.setattr(IBKR_Connection, "get_ibkr_price_future", fake_price_future)
+    start = time.perf_counter()
+    prices = IBKR_Connection.get_ibkr_prices([_contract("SPY"), _contract("QQQ")], timeout=0.2)
+    assert time.perf_counter() - start < 0.4
+    assert prices == [500.0, -1]
@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import math
+from datetime import date
+
+import numpy as np
+import pytest
+
+from options.pricing import (bs_greeks, bs_price, black76_greeks, black76_price, delta_window_mask,
+                             implied_vol, norm_cdf, years_to_expiry)
+
+
+def test_norm_cdf_matches_erf_to_double_precision():
+    x = np.linspace(-38, 38, 20001)
+    expected = np.array([0.5 * math.erfc(-v / math.sqrt(2)) for v in x])
+    assert np.max(np.abs(norm_cdf(x) - expected)) < 5e-15
+    tail = (x < -5) & (x > -37)     # |x| > 37 时结果按 0 处理
+    assert np.max(np.abs(norm_cdf(x[tail]) - expected[tail]) / expected[tail]) < 1e-8      # Hart 算法在尾部的相对精度约 1e-9
+
+
+def test_put_call_parity_with_dividend_yield():
+    spot, strike, t, r, q, sigma = 500.0, np.array([450.0, 500.0, 550.0]), 0.25, 0.05, 0.013, 0.18
+    call = bs_price(spot, strike, t, r, sigma, "C", q)
+    put = bs_price(spot, strike, t, r, sigma, "P", q)
+    assert np.allclose(call - put, spot * math.exp(-q * t) - strike * math.exp(-r * t), atol=1e-10)
+
+
+def test_greeks_match_finite_differences():
+    args = dict(strike=np.array([480.0, 520.0]), t=0.3, rate=0.04, sigma=0.2, right=np.array(["C", "P"]))
+    g = bs_greeks(500.0, dividend_yield=0.01, **args)
+    h = 1e-3
+    up = bs_price(500.0 + h, dividend_yield=0.01, **args)
+    down = bs_price(500.0 - h, dividend_yield=0.01, **args)
+    assert np.allclose(g["delta"], (up - down) / (2 * h), atol=1e-6)
+    assert np.allclose(g["gamma"], (up - 2 * g["price"] + down) / h ** 2, atol=1e-4)
+    vol_up = bs_price(500.0, dividend_yield=0.01, **{**args, "sigma": 0.2 + 1e-5})
+    assert np.allclose(g["vega"], (vol_up - g["price"]) / 1e-5 / 100, atol=1e-5)
+    later = bs_price(500.0, dividend_yield=0.01, **{**args, "t": 0.3 - 1 / 365})
+    assert np.allclose(g["theta"], later - g["price"], rtol=1e-2)
+
+    f = black76_greeks(20.0, np.array([18.0, 25.0]), 0.1, 0.04, 0.9, "C")
+    up = black76_price(20.0 + h, np.array([18.0, 25.0]), 0.1, 0.04, 0.9, "C")
+    down = black76_price(20.0 - h, np.array([18.0, 25.0]), 0.1, 0.04, 0.9, "C")
+    assert np.allclose(f["delta"], (up - down) / (2 * h), atol=1e-6)
+
+
+def test_implied_vol_round_trip_over_a_chain():
+    rng = np.random.default_rng(0)
+    n = 5000
+    strike = rng.uniform(300, 700, n)
+    t = rng.uniform(1 / 365, 2.0, n)
+    sigma = rng.uniform(0.05, 2.0, n)
+    right = np.where(rng.random(n) < 0.5, "C", "P")
+    price = bs_price(500.0, strike, t, 0.05, sigma, right, 0.013)
+
+    solved = implied_vol(price, 500.0, strike, t, 0.05, right, 0.013)
+    vega = bs_greeks(500.0, strike, t, 0.05, sigma, right, 0.013)["vega"]
+    meaningful = vega > 1e-3     # vega 可忽略的深度价内/价外合约，价格对波动率不敏感，无法精确反解
+    assert np.nanmax(np.abs(solved - sigma)[meaningful]) < 1e-6
+
+    vx_price = black76_price(20.0, 22.0, 0.08, 0.04, 1.1, "C")
+    assert abs(implied_vol(vx_price, 20.0, 22.0, 0.08, 0.04, "C", model="black76") - 1.1) < 1e-8
+
+
+def test_arbitrage_violations_give_nan_and_delta_window():
+    assert np.isnan(implied_vol(0.5, 500.0, 450.0, 0.25, 0.05, "C"))   # 低于内在价值
+    assert np.isnan(implied_vol(600.0, 500.0, 450.0, 0.25, 0.05, "C"))  # 高于现价
+    assert delta_window_mask([0.7, -0.65, 0.3, np.nan], 0.6, 0.8).tolist() == [True, True, False, False]
+
+
+def test_years_to_expiry_vectorized_parse():
+    as_of = date(2024, 12, 31)
+    days = years_to_expiry(["20250117", "20241231", "20240229", "20280229"], as_of=as_of) * 365
+    assert days.tolist() == pytest.approx([17.0, 0.5, 0.5, (date(2028, 2, 29) - as_of).days])
+    assert (years_to_expiry(np.array([20250117, 20250321]), as_of=as_of) * 365).tolist() == pytest.approx([17.0, 80.0])
@@ -0,0 +1,112 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import math
+
+import pytest
+
+from core.quote_cache import QuoteCache, QuoteRecord
+
+
+def _make_cache(max_lines):
+    opened, closed = [], []
+
+    def subscribe(contract, record):
+        opened.append(contract)
+        return len(opened)
+
+    cache = QuoteCache(subscribe, lambda record: closed.append(record.key), max_lines=max_lines)
+    return cache, opened, closed
+
+
+def test_record_updates_in_place_and_prefers_last_then_mid():
+    record = QuoteRecord("SPY")
+    assert math.isnan(record.price())
+    record.on_tick("price", 1, 99.0)
+    record.on_tick("price", 2, 101.0)
+    record.on_tick("size", 0, 300)
+    assert record.price() == 100.0
+    assert record.bid_size == 300.0
+    record.on_tick("price", 4, 100.5)
+    assert record.price() == 100.5
+    assert record.age() < 1
+
+
+def test_waiter_fires_on_next_tick_or_error():
+    record = QuoteRecord("SPY")
+    fired = []
+    record.add_waiter(lambda: fired.append("tick"), record.updated)
+    record.on_tick("price", 9, 98.0)        # 收盘价不触发
+    assert fired == []
+    record.on_tick("price", 4, 100.0)
+    assert fired == ["tick"]
+
+    record.add_waiter(lambda: fired.append("stale"), 0.0)   # since 早于最近 tick：立即触发
+    assert fired == ["tick", "stale"]
+
+
+def test_repeated_acquire_reuses_one_line():
+    cache, opened, _ = _make_cache(max_lines=2)
+    first = cache.acquire("SPY", "spy-contract")
+    cache.release(first)
+    second = cache.acquire("SPY", "spy-contract")
+    assert first is second
+    assert opened == ["spy-contract"]
+
+
+def test_line_cap_evicts_idle_lru_and_never_busy_lines():
+    cache, opened, closed = _make_cache(max_lines=2)
+    a = cache.acquire("A", "a")
+    b = cache.acquire("B", "b")
+    cache.release(a)
+    cache.release(b)
+    cache.release(cache.acquire("A", "a"))  # A 变为最近使用
+
+    c = cache.acquire("C", "c")
+    assert closed == ["B"]
+    assert cache.open_lines == 2
+
+    assert cache.acquire("D", "d") is not None      # A 空闲，被淘汰
+    assert closed == ["B", "A"]
+    assert cache.acquire("E", "e") is None          # C、D 均在使用中
+    cache.release(c)
+
+
+def test_errored_line_is_resubscribed():
+    cache, opened, closed = _make_cache(max_lines=2)
+    record = cache.acquire("X", "x")
+    record.on_error("no market data permissions")
+    cache.release(record)
+
+    fresh = cache.acquire("X", "x")
+    assert fresh is not record
+    assert opened == ["x", "x"]
+    assert closed == ["X"]
+
+
+def test_close_while_subscribing_unsubscribes_once_subscription_returns():
+    closed = []
+    cache = None
+
+    def subscribe(contract, record):
+        cache.close(record.key)             # 订阅返回前被关闭（如并发的 close / LRU 淘汰）
+        assert closed == []                 # 此时还没有 req_id，不能退订
+        return 7
+
+    cache = QuoteCache(subscribe, lambda record: closed.append(record.req_id), max_lines=2)
+    record = cache.acquire("SPY", "spy-contract")
+    assert record.closed and closed == [7]
+    assert cache.open_lines == 0
+    cache.close_all()
+    assert closed == [7]                    # 只退订一次
+
+
+def test_failed_subscribe_does_not_leave_a_pending_record():
+    def subscribe(contract, record):
+        raise ConnectionError("IBKR 未连接")
+
+    cache = QuoteCache(subscribe, lambda record: None, max_lines=2)
+    with pytest.raises(ConnectionError):
+        cache.acquire("SPY", "spy-contract")
+    assert cache.open_lines == 0
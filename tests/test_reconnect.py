@@ -0,0 +1,135 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import threading
+import time
+
+import pytest
+
+import IBKR_Connection
+from core.ibkr_dispatcher import CONNECTION_LOST_CODE, IBKRDispatcher
+from core.reconnect import ReconnectSupervisor
+from sim.tws_simulator import SyntheticFixtures, TWSSimulator
+from utils.contracts import create_stock_contract
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+        self.cancelled = []
+
+    def isConnected(self):
+        return True
+
+    def cancel(self, conn, wire_id):
+        self.cancelled.append(wire_id)
+
+
+def test_replay_resends_under_fresh_ids_and_aborts_the_rest():
+    dispatcher = IBKRDispatcher()
+    old, new = FakeConnection(), FakeConnection()
+    dispatcher.connection = old
+
+    req_id = dispatcher.next_id()
+    future = dispatcher.submit(req_id, resend=lambda conn, wire_id: conn.sent.append(wire_id), cancel=new.cancel)
+    dispatcher.set_result(req_id, "partial")
+    stream_id = dispatcher.next_id()
+    ticks = []
+    dispatcher.register(stream_id, handler=ticks.append, use_event=False, kind="tick")
+
+    assert dispatcher.abort_unreplayable() == 1
+    assert dispatcher.error_of(stream_id).error_code == CONNECTION_LOST_CODE
+
+    assert dispatcher.replay(new) == 1
+    wire_id = dispatcher.wire_id(req_id)
+    assert new.sent == [wire_id] and wire_id != req_id
+
+    # 新 reqId 的回调落到原请求上，部分结果已丢弃；结束后按新 reqId 取消
+    dispatcher.set_result(wire_id, "fresh")
+    dispatcher.signal_done(wire_id)
+    assert future.result(timeout=1) == ["fresh"]
+    assert new.cancelled == [wire_id]
+    dispatcher.clear(stream_id)
+    assert dispatcher.pending_count() == 0
+    assert dispatcher._slot(wire_id) is None
+
+
+def test_supervisor_backs_off_until_connect_succeeds():
+    attempts, reconnected = [], threading.Event()
+    lost = []
+
+    def connect():
+        attempts.append(time.monotonic())
+        return object() if len(attempts) >= 3 else None
+
+    supervisor = ReconnectSupervisor(connect, on_lost=lost.append, on_reconnected=lambda _: reconnected.set(),
+                                     delays=(0.0, 0.05))
+    conn = object()
+    supervisor.watch(conn)
+    supervisor.connection_lost(object())          # 不是当前连接：忽略
+    assert not supervisor.reconnecting
+    supervisor.connection_lost(conn, "test")
+    supervisor.connection_lost(conn, "test")      # 重复通知只触发一次
+    assert reconnected.wait(2)
+    supervisor.stop()
+    assert lost == [conn]
+    assert len(attempts) == 3 and attempts[2] - attempts[1] >= 0.04
+    assert supervisor.stats["reconnects"] == 1 and supervisor.stats["disconnects"] == 1
+
+
+def test_reconnect_replays_in_flight_requests_and_quotes():
+    fixtures = SyntheticFixtures(known={"SPY"})
+    with TWSSimulator(fixtures, latency=0.001, tick_interval=0.05) as sim:
+        ib = IBKR_Connection.connect_ibkr(timeout=5, host="127.0.0.1", port=sim.port, client_id=77)
+        assert ib is not None
+        supervisor = IBKR_Connection.start_auto_reconnect(delays=(0.05, 0.2))
+        try:
+            spy = create_stock_contract("SPY")
+            assert IBKR_Connection.get_ibkr_price(spy) > 0
+
+            # 回复延迟较大时断线：请求仍在途
+            sim.latency = 0.3
+            future = IBKR_Connection.fetch_historical_data_future(spy, "20260305 16:00:00", "1 D", "5 mins",
+                                                                  raise_on_error=True)
+            start = time.monotonic()
+            assert sim.drop_connections() == 1
+            assert len(future.result(timeout=5)) == 78
+            assert time.monotonic() - start < 3
+            assert supervisor.stats["reconnects"] == 1
+            assert IBKR_Connection.connect_ibkr() is not ib
+            sim.latency = 0.001
+
+            # 实时报价线路已在新连接上重新订阅：max_age=0 必须等到新的 tick
+            assert [len(session.quotes) for session in sim._sessions] == [1]
+            price = IBKR_Connection.get_ibkr_price(spy, timeout=2, max_age=0.0)
+            assert price == pytest.approx(fixtures.spot("SPY"), rel=0.05)
+        finally:
+            IBKR_Connection.disconnect_ibkr()
+
+
+def test_reconnect_replays_bar_subscription_without_duplicates():
+    fixtures = SyntheticFixtures(known={"SPY"})
+    with TWSSimulator(fixtures, latency=0.001, tick_interval=0.05) as sim:
+        IBKR_Connection.connect_ibkr(timeout=5, host="127.0.0.1", port=sim.port, client_id=78)
+        supervisor = IBKR_Connection.start_auto_reconnect(delays=(0.05, 0.2))
+        spy = create_stock_contract("SPY")
+        subscription = IBKR_Connection.subscribe_bars(spy, bar_size="5 mins", duration="5 D")
+        try:
+            assert subscription.ready.wait(5)
+            before = subscription.buffer.view()["time"].copy()
+            assert len(before) > 0
+
+            assert sim.drop_connections() == 1
+            deadline = time.monotonic() + 5
+            while not (supervisor.stats["reconnects"] == 1 and [len(s.bar_streams) for s in sim._sessions] == [1]):
+                assert time.monotonic() < deadline
+                time.sleep(0.02)
+            time.sleep(0.2)         # 等待重新回补的K线写入
+
+            after = subscription.buffer.view()["time"]
+            assert (after[1:] > after[:-1]).all()
+            assert list(after[:len(before)]) == list(before)
+        finally:
+            IBKR_Connection.unsubscribe_bars(subscription)
+            IBKR_Connection.disconnect_ibkr()
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+
+from logic.rule_compiler import EvalContext, compile_definitions, evaluate_rules
+from logic.trend_bar_engine import apply_trend_bars
+from utils.definitions import load_definitions
+
+
+def _bars(n: int = 800, seed: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 50 + np.round(np.cumsum(rng.normal(0, 0.3, n)), 2)
+    open_ = np.round(close + rng.normal(0, 0.3, n), 2)
+    high = np.maximum(open_, close) + np.round(rng.exponential(0.1, n), 2)
+    low = np.minimum(open_, close) - np.round(rng.exponential(0.1, n), 2)
+    high[10] = low[10] = open_[10] = close[10]
+    index = pd.date_range("2024-01-02", periods=n, freq="5min", name="date")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": 1.0}, index=index)
+
+
+def test_compiled_definitions_match_engine():
+    df = _bars()
+    config = load_definitions()
+    flags = evaluate_rules(df, compile_definitions(config))
+    expected = apply_trend_bars(df, config)
+
+    assert (flags["BullTrendBar"] == expected["BullTrendBar"]).all()
+    assert (flags["BearTrendBar"] == expected["BearTrendBar"]).all()
+
+
+def test_shared_subexpressions_computed_once():
+    df = _bars()
+    context = EvalContext(df)
+    for rule in compile_definitions().values():
+        rule.evaluate(context)
+
+    cached = [key for key in context.cache if key[0].startswith("BinOp(left=Name(id='high'")]
+    assert len(cached) == 1     # high - low 在两个形态、多个条件中只计算一次
+
+
+def test_new_pattern_is_config_only():
+    config = {
+        "WideDoji": {
+            "conditions": {
+                "body_ratio": {"formula": "abs(close - open) / (high - low)", "operator": "<=", "value": 0.1},
+                "total_range_comparison": {
+                    "formula": "(high - low) > 2 * avg_total_range_last_N_bars",
+                    "operator": ">",
+                    "lookback_period": 5,
+                },
+            }
+        }
+    }
+    df = _bars()
+    flags = evaluate_rules(df, compile_definitions(config))["WideDoji"].to_numpy()
+
+    rng = (df["high"] - df["low"]).to_numpy()
+    avg = pd.Series(rng).rolling(5).mean().shift(1).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = (np.abs(df["close"] - df["open"]).to_numpy() / rng <= 0.1) & (rng > 2 * avg)
+    expected[rng == 0] = False
+    assert (flags == expected).all()
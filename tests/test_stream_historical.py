@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import pytest
+
+import IBKR_Connection
+from core.ibkr_dispatcher import STREAM_OVERFLOW_CODE, IBKRDispatcher, IBKRRequestError
+from utils.contracts import create_stock_contract
+
+
+class FakeIB:
+    """
+    reqHistoricalData 时同步执行 script(dispatcher, req_id)，模拟 reader 线程推送K线 / 错误。
+    """
+    def __init__(self, script):
+        self.dispatcher = IBKRDispatcher()
+        self.script = script
+        self.cancelled = []
+
+    def reqHistoricalData(self, reqId, **_):
+        self.script(self.dispatcher, reqId)
+
+    def cancelHistoricalData(self, req_id):
+        self.cancelled.append(req_id)
+
+
+def bar(i):
+    return {"date": f"20260305 09:{30 + i:02d}:00", "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1}
+
+
+def stream(monkeypatch, script, **kwargs):
+    ib = FakeIB(script)
+    monkeypatch.setattr(IBKR_Connection, "get_ib", lambda kind="other": ib)
+    gen = IBKR_Connection.stream_historical_data(create_stock_contract("SPY"), "", "1 D", "1 min", timeout=1, **kwargs)
+    return ib, gen
+
+
+def test_early_break_cancels_and_late_bars_are_dropped(monkeypatch):
+    sent = []
+
+    def script(dispatcher, req_id):
+        sent.append(req_id)
+        for i in range(3):
+            dispatcher.dispatch(req_id, bar(i))
+
+    ib, gen = stream(monkeypatch, script)
+    assert next(gen)["date"].endswith("09:30:00")
+    gen.close()
+    assert ib.cancelled == sent
+    # 取消后迟到的K线直接丢弃，reader 线程不会阻塞
+    assert ib.dispatcher.dispatch(sent[0], bar(3)) is False
+    assert ib.dispatcher.pending_count() == 0
+
+
+def test_full_buffer_cancels_without_blocking_reader(monkeypatch):
+    def script(dispatcher, req_id):
+        for i in range(10):
+            dispatcher.dispatch(req_id, bar(i))     # 消费者尚未读取：超过上限时不能阻塞
+        dispatcher.signal_done(req_id)
+
+    ib, gen = stream(monkeypatch, script, max_buffered=3)
+    received = []
+    with pytest.raises(IBKRRequestError) as error:
+        for item in gen:
+            received.append(item)
+    assert error.value.error_code == STREAM_OVERFLOW_CODE
+    assert len(received) == 3
+    assert len(ib.cancelled) == 1
+
+
+def test_error_mid_stream_is_raised_after_received_bars(monkeypatch):
+    def script(dispatcher, req_id):
+        dispatcher.dispatch(req_id, bar(0))
+        dispatcher.dispatch(req_id, bar(1))
+        dispatcher.set_error(req_id, 162, "Historical Market Data Service error message")
+
+    ib, gen = stream(monkeypatch, script, chunk_size=10)
+    chunks = []
+    with pytest.raises(IBKRRequestError) as error:
+        for chunk in gen:
+            chunks.append(chunk)
+    assert error.value.error_code == 162
+    assert [len(c) for c in chunks] == [2]
+    assert ib.cancelled == []
@@ -0,0 +1,124 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import json
+import time
+
+import pytest
+
+from core.ibkr_dispatcher import IBKRDispatcher
+from core.telemetry import LATENCY_BOUNDS, LatencyHistogram, RequestTelemetry, TelemetryDumper
+
+
+def test_histogram_buckets_and_quantiles():
+    hist = LatencyHistogram()
+    for seconds in [0.0005] * 50 + [0.02] * 40 + [3.0] * 10:
+        hist.observe(seconds)
+    assert hist.count == 100 and sum(hist.counts) == 100
+    assert hist.quantile(0.5) == LATENCY_BOUNDS[0]
+    assert 0.02 <= hist.quantile(0.9) < 0.02 * 1.5
+    assert hist.quantile(0.99) == 3.0           # 不超过观测到的最大值
+    hist.observe(1000.0)                        # 超出最大桶 → +Inf 桶
+    assert hist.counts[-1] == 1 and hist.quantile(1.0) == 1000.0
+
+
+def test_dispatcher_records_latency_and_outcomes():
+    dispatcher = IBKRDispatcher()
+
+    ok = dispatcher.next_id()
+    dispatcher.register(ok, kind="historical")
+    time.sleep(0.01)
+    dispatcher.set_result(ok, {"close": 1})
+    dispatcher.set_result(ok, {"close": 2})
+    dispatcher.signal_done(ok)
+    assert dispatcher.wait(ok, timeout=1)
+    dispatcher.clear(ok)
+
+    empty = dispatcher.next_id()
+    dispatcher.register(empty, kind="historical")
+    dispatcher.signal_done(empty)
+    assert dispatcher.wait(empty, timeout=1) == []
+    dispatcher.clear(empty)
+
+    timed_out = dispatcher.next_id()
+    dispatcher.register(timed_out, kind="contractDetails")
+    assert dispatcher.wait(timed_out, timeout=0.01) == []
+    dispatcher.signal_done(timed_out)           # 迟到的结束不会再统计一次
+    dispatcher.clear(timed_out)
+
+    failed_id = dispatcher.next_id()
+    failed = dispatcher.submit(failed_id, timeout=5, kind="contractDetails")
+    dispatcher.set_error(failed_id, 200, "No security definition")
+    assert failed.result(timeout=1) == []
+
+    expired = dispatcher.submit(dispatcher.next_id(), timeout=0.01, kind="secDef")
+    assert expired.result(timeout=1) == []
+
+    stream = dispatcher.next_id()
+    dispatcher.register(stream, handler=lambda *_: None, use_event=False, kind="tick")
+    dispatcher.dispatch(stream, "price", 1, 500.0)
+    dispatcher.clear(stream)
+
+    untracked_id = dispatcher.next_id()
+    untracked = dispatcher.submit(untracked_id, timeout=5, kind=None)
+    dispatcher.signal_done(untracked_id)
+    assert untracked.result(timeout=1) == []
+
+    pending = dispatcher.next_id()
+    dispatcher.register(pending, kind="historical")
+    assert dispatcher.telemetry.snapshot()["kinds"]["historical"]["in_flight"] == 1
+    dispatcher.clear(pending)
+
+    kinds = dispatcher.telemetry.snapshot()["kinds"]
+    assert set(kinds) == {"historical", "contractDetails", "secDef", "tick"}
+    historical = kinds["historical"]
+    assert historical["in_flight"] == 0
+    assert historical["outcomes"]["ok"] == 1 and historical["outcomes"]["empty"] == 1
+    assert historical["outcomes"]["closed"] == 1
+    assert historical["first_result"]["count"] == 1 and historical["first_result"]["max"] >= 0.01
+    assert historical["done"]["count"] == 2
+    assert kinds["contractDetails"]["outcomes"]["timeout"] == 1
+    assert kinds["contractDetails"]["outcomes"]["error"] == 1
+    assert kinds["secDef"]["outcomes"]["timeout"] == 1 and kinds["secDef"]["done"]["count"] == 0
+    assert kinds["tick"]["outcomes"]["closed"] == 1 and kinds["tick"]["first_result"]["count"] == 1
+
+
+def test_json_and_prometheus_dump(tmp_path):
+    telemetry = RequestTelemetry()
+    telemetry.on_outcome("tick", "ok", 0.004, first_latency=0.004)
+
+    dumper = TelemetryDumper(telemetry, interval=60, json_path=tmp_path / "t.json", prom_path=tmp_path / "t.prom")
+    dumper.start()
+    dumper.stop()                               # stop 时写出最终结果
+
+    snapshot = json.loads((tmp_path / "t.json").read_text())
+    assert snapshot["kinds"]["tick"]["outcomes"]["ok"] == 1
+    prom = (tmp_path / "t.prom").read_text()
+    assert 'ibkr_requests_total{kind="tick",outcome="ok"} 1' in prom
+    assert 'ibkr_request_latency_seconds_bucket{kind="tick",stage="done",le="+Inf"} 1' in prom
+    assert 'ibkr_request_latency_seconds_bucket{kind="tick",stage="done",le="0.00282843"} 0' in prom
+    assert 'ibkr_request_latency_seconds_bucket{kind="tick",stage="done",le="0.004"} 1' in prom
+    assert 'ibkr_request_latency_seconds_count{kind="tick",stage="first_result"} 1' in prom
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_per_shard_counters_merge_across_dispatchers():
+    telemetry = RequestTelemetry()
+    first, second = IBKRDispatcher(telemetry), IBKRDispatcher(telemetry, first_id=100_001_001)
+
+    for dispatcher in (first, second):
+        for _ in range(40):                     # 覆盖所有分片
+            req_id = dispatcher.next_id()
+            dispatcher.register(req_id, kind="historical")
+            dispatcher.set_result(req_id, {"close": 1})
+            dispatcher.signal_done(req_id)
+            dispatcher.clear(req_id)
+    assert telemetry.snapshot()["kinds"]["historical"]["outcomes"]["ok"] == 80
+    assert telemetry.snapshot()["kinds"]["historical"]["done"]["count"] == 80
+
+    # 移除的 dispatcher 留下的统计仍计入合并结果
+    second.detach_telemetry()
+    assert telemetry.snapshot()["kinds"]["historical"]["outcomes"]["ok"] == 80
+    telemetry.reset()
+    assert telemetry.snapshot()["kinds"] == {}
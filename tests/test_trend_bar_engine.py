@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+
+from logic import apply_bear_trend_bar, apply_bull_trend_bar
+from logic.trend_bar_engine import apply_trend_bars
+from utils.definitions import load_definitions
+
+LOOKBACK = 20
+RATIO = 0.6
+
+
+def _bars(n: int = 600, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.round(np.cumsum(rng.normal(0, 0.5, n)), 2)
+    open_ = np.round(close + rng.normal(0, 0.4, n), 2)
+    high = np.maximum(open_, close) + np.round(rng.exponential(0.2, n), 2)
+    low = np.minimum(open_, close) - np.round(rng.exponential(0.2, n), 2)
+    # 加入振幅为 0 和平盘的K线
+    high[50] = low[50] = open_[50] = close[50]
+    open_[60] = close[60]
+    index = pd.date_range("2024-01-02 09:30", periods=n, freq="min", name="date")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": 1.0}, index=index)
+
+
+def _reference(df: pd.DataFrame, bullish: bool) -> list:
+    """
+    原 iterrows 实现，作为定义基准。
+    """
+    df = df.reset_index(drop=False)
+    flags = []
+    for idx, row in df.iterrows():
+        if idx < LOOKBACK:
+            flags.append(False)
+            continue
+        body = row["close"] - row["open"]
+        total_range = row["high"] - row["low"]
+        if total_range == 0:
+            flags.append(False)
+            continue
+        avg = (df.loc[idx - LOOKBACK:idx - 1, "high"] - df.loc[idx - LOOKBACK:idx - 1, "low"]).mean()
+        direction = body > 0 if bullish else body < 0
+        flags.append(bool(direction and abs(body) / total_range >= RATIO and total_range > avg))
+    return flags
+
+
+def test_vectorized_flags_match_reference():
+    df = _bars()
+    bull = apply_bull_trend_bar(df)
+    bear = apply_bear_trend_bar(df)
+
+    assert list(bull["BullTrendBar"]) == _reference(df, bullish=True)
+    assert list(bear["BearTrendBar"]) == _reference(df, bullish=False)
+    assert bull.index.equals(df.index)
+    assert "BullTrendBar" not in df.columns
+
+
+def test_apply_trend_bars_single_pass_matches_separate_calls():
+    df = _bars(seed=11)
+    both = apply_trend_bars(df, load_definitions())
+
+    assert (both["BullTrendBar"] == apply_bull_trend_bar(df)["BullTrendBar"]).all()
+    assert (both["BearTrendBar"] == apply_bear_trend_bar(df)["BearTrendBar"]).all()
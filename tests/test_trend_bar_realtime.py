@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+
+from logic import (BearTrendBarDetector, BullTrendBarDetector,
+                   apply_bear_trend_bar, apply_bull_trend_bar)
+
+
+def _bars(n: int = 5000, seed: int = 21) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 200 + np.round(np.cumsum(rng.normal(0, 0.4, n)), 2)
+    open_ = np.round(close + rng.normal(0, 0.3, n), 2)
+    high = np.maximum(open_, close) + np.round(rng.exponential(0.15, n), 2)
+    low = np.minimum(open_, close) - np.round(rng.exponential(0.15, n), 2)
+    high[100] = low[100] = open_[100] = close[100]
+    index = pd.date_range("2024-01-02 09:30", periods=n, freq="5s", name="date")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": 1.0}, index=index)
+
+
+def test_realtime_replay_matches_static():
+    df = _bars()
+    bull_detector, bear_detector = BullTrendBarDetector(), BearTrendBarDetector()
+    bull, bear = [], []
+    for o, h, l, c in df[["open", "high", "low", "close"]].itertuples(index=False):
+        bull.append(bull_detector.update(o, h, l, c))
+        bear.append(bear_detector.update(o, h, l, c))
+
+    assert bull == list(apply_bull_trend_bar(df)["BullTrendBar"])
+    assert bear == list(apply_bear_trend_bar(df)["BearTrendBar"])
+
+
+def test_custom_parameters_and_reset():
+    df = _bars(n=500, seed=5)
+    detector = BullTrendBarDetector(body_ratio=0.5, lookback=10)
+    rows = list(df[["open", "high", "low", "close"]].itertuples(index=False))
+    first = [detector.update(*row) for row in rows]
+    detector.reset()
+    second = [detector.update(*row) for row in rows]
+
+    assert first == second == list(apply_bull_trend_bar(df, body_ratio=0.5, lookback=10)["BullTrendBar"])
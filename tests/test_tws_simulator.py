@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import time
+
+import pandas as pd
+import pytest
+
+import IBKR_Connection
+from options.option_chain_utils import request_all_option_chain_params
+from sim.tws_simulator import SyntheticFixtures, TWSSimulator
+from utils.contracts import create_option_contract, create_stock_contract
+
+
+@pytest.fixture(scope="module")
+def sim():
+    fixtures = SyntheticFixtures(known={"SPY", "QQQ"})
+    simulator = TWSSimulator(fixtures, latency=0.001, tick_interval=0.05).start()
+    ib = IBKR_Connection.connect_ibkr(timeout=5, host="127.0.0.1", port=simulator.port, client_id=99)
+    assert ib is not None and ib.isConnected()
+    yield simulator
+    IBKR_Connection.disconnect_ibkr()
+    simulator.stop()
+
+
+def test_contract_details_and_option_params(sim):
+    details = IBKR_Connection.fetch_contract_details(create_stock_contract("SPY"), use_cache=False)
+    assert len(details) == 1
+    assert details[0].contract.conId == sim.fixtures.con_id(create_stock_contract("SPY"))
+
+    # 不存在的标的：error 200 立即结束请求，而不是等到超时
+    start = time.perf_counter()
+    assert IBKR_Connection.fetch_contract_details(create_stock_contract("ZZZZ"), use_cache=False) == []
+    assert time.perf_counter() - start < 1
+
+    chains = request_all_option_chain_params("SPY")
+    smart = [c for c in chains if c["exchange"] == "SMART"][0]
+    assert sorted(smart["expirations"]) == sim.fixtures.expirations("SPY")
+    assert sorted(smart["strikes"]) == sim.fixtures.strikes("SPY")
+
+
+def test_historical_bars_are_consistent_across_windows(sim):
+    spy = create_stock_contract("SPY")
+    two_days = IBKR_Connection.fetch_historical_data(spy, "20260305 16:00:00", "2 D", "5 mins")
+    one_day = IBKR_Connection.fetch_historical_data(spy, "20260305 16:00:00", "1 D", "5 mins")
+
+    assert len(two_days) == 2 * 78
+    assert (two_days["high"] >= two_days[["open", "close"]].max(axis=1)).all()
+    pd.testing.assert_frame_equal(two_days.loc[one_day.index], one_day)
+
+    daily = IBKR_Connection.fetch_historical_data(spy, "20260306 16:00:00", "1 M", "1 day")
+    assert len(daily) > 15
+    assert (daily.index.dayofweek < 5).all()
+
+
+def test_market_data_snapshot_stream_and_greeks(sim):
+    spy = create_stock_contract("SPY")
+    quote = sim.fixtures.quote(spy, sim.fixtures.spot("SPY"))
+    assert quote["bid"] <= IBKR_Connection.get_ibkr_price(spy, stream=False) <= quote["ask"]
+    assert IBKR_Connection.get_ibkr_price(spy) == pytest.approx(quote["last"], rel=0.01)
+
+    expiry = sim.fixtures.expirations("SPY")[0]
+    option = create_option_contract("SPY", expiry, 500.0, "C")
+    option.conId = IBKR_Connection.fetch_contract_details(option, use_cache=False)[0].contract.conId
+    req_ids = IBKR_Connection.subscribe_option_greeks([option])
+    try:
+        store = IBKR_Connection.get_greeks_store()
+        deadline = time.monotonic() + 2
+        row = store.row_of(option.conId)
+        while store.column("delta")[row] != store.column("delta")[row] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        model = sim.fixtures.option_model(option)
+        assert store.column("delta")[row] == pytest.approx(model["delta"])
+        assert store.column("iv")[row] == pytest.approx(model["iv"])
+    finally:
+        IBKR_Connection.unsubscribe_option_greeks(req_ids)
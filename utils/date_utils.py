@@ -1,7 +1,7 @@
 # utils/date_utils.py
 
 from datetime import datetime, timedelta
-from utils.contracts import Contract, fetch_contract_details
+from options.expiry_index import get_expiry_index
 
 def get_monthly_vix_expiry_date(reference_date=None) -> str:
     """
@@ -26,30 +26,27 @@ def get_monthly_vix_expiry_date(reference_date=None) -> str:
     else:
         raise ValueError("无法找到当月第三个星期三")
 
-def find_valid_spy_expiry(target_expiry: str, max_days_forward=30) -> str:
+def find_valid_expiry(symbol: str, target_expiry: str, max_days_forward=30,
+                      sec_type: str = "STK", exchange: str = "SMART", trading_class: str = None) -> str:
     """
-    给定一个目标 expiry (YYYY-MM-DD)，智能寻找最近的 SPY 有效到期日。
+    给定一个目标 expiry (YYYY-MM-DD)，从到期日索引中二分查找最近的有效到期日（YYYYMMDD）。
+    索引由一次 reqSecDefOptParams 构建，每个交易日刷新一次。
     如果找不到，抛出异常。
     """
+    index = get_expiry_index()
+    index.load(symbol, sec_type=sec_type, exchange=exchange)
 
-    base_date = datetime.strptime(target_expiry, "%Y-%m-%d")
-
-    for i in range(max_days_forward + 1):
-        check_date = base_date + timedelta(days=i)
-        expiry_str = check_date.strftime("%Y%m%d")
-
-        # 构建 contract
-        contract = Contract()
-        contract.symbol = "SPY"
-        contract.secType = "OPT"
-        contract.exchange = "SMART"
-        contract.currency = "USD"
-        contract.lastTradeDateOrContractMonth = expiry_str
-
-        details = fetch_contract_details(contract)
+    expiry_str = index.nearest(symbol, target_expiry, trading_class=trading_class,
+                               max_days_forward=max_days_forward)
+    if expiry_str is None:
+        raise ValueError(f"找不到合适的 {symbol} expiry，起始日期: {target_expiry}")
 
-        if details:
-            print(f"✅ 找到有效 SPY expiry: {expiry_str}")
-            return expiry_str
+    print(f"✅ 找到有效 {symbol} expiry: {expiry_str}")
+    return expiry_str
 
-    raise ValueError(f"找不到合适的 SPY expiry，起始日期: {target_expiry}")
\ No newline at end of file
+def find_valid_spy_expiry(target_expiry: str, max_days_forward=30) -> str:
+    """
+    给定一个目标 expiry (YYYY-MM-DD)，智能寻找最近的 SPY 有效到期日。
+    如果找不到，抛出异常。
+    """
+    return find_valid_expiry("SPY", target_expiry, max_days_forward)
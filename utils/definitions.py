@@ -1,7 +1,7 @@
 import json
 import os
-# 当前Python脚本的目录
-current_dir = os.path.dirname(os.path.abspath(__file__))
+# 项目根目录（当前脚本位于 utils/ 下）
+current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # 配置文件的相对路径
 CONFIG_FILE = os.path.join(current_dir, "config", "definitions.json")
@@ -2,7 +2,7 @@ import time
 import numpy as np
 import pandas as pd
 from datetime import datetime
-from IBKR_Connection import get_ibkr_price
+from IBKR_Connection import get_ibkr_price, get_ibkr_prices
 from utils.contracts import get_vix_contract, create_vx_contract
 from config.constants import TRADING_DAYS_PER_YEAR
 
@@ -22,10 +22,9 @@ def get_realtime_vx(expiry: str = None) -> float:
 
 def get_realtime_vix_and_vx(front_month: str = None):
     """
-    同时获取 VIX 与 VX 当前快照价格。
+    同时获取 VIX 与 VX 当前快照价格（两个请求并发发出，只等待一次）。
     """
-    vix_price = get_realtime_vix()
-    vx_price = get_realtime_vx(front_month)
+    vix_price, vx_price = get_ibkr_prices([get_vix_contract(), create_vx_contract(front_month)])
     return vix_price, vx_price
 
 def calculate_hv(df, period=20):